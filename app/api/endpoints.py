@@ -1,11 +1,11 @@
-from typing import List, Dict
+from typing import Dict
 
-import httpx
 from fastapi import APIRouter, HTTPException
 
-from app.core.config import settings
 from app.services.algorithm import AlgorithmService
 from app.services.database import DatabaseService
+from app.services.maintenance import MaintenanceService
+from app.services.site_import import apply_site_info
 from app.utils.logger import logger
 
 router = APIRouter()
@@ -15,11 +15,12 @@ class HTTPService:
     def __init__(
             self,
             db_service: DatabaseService,
-            algorithm_service: AlgorithmService
+            algorithm_service: AlgorithmService,
+            maintenance_service: MaintenanceService
     ):
         self.db_service = db_service
         self.algorithm_service = algorithm_service
-        self.previous_demands = {}  # 存储历史demand值
+        self.maintenance_service = maintenance_service
 
     @router.post("/sites/info")
     async def handle_site_info(self, request: Dict):
@@ -28,44 +29,21 @@ class HTTPService:
             # 请求验证
             self._validate_request(request)
 
-            site_no = request.get('site_no')
-            current_demand = request.get('demand')
+            site_no, saved = await apply_site_info(self.db_service, self.algorithm_service, request)
 
-            # 检查demand变化
-            if site_no in self.previous_demands:
-                if self.previous_demands[site_no] != current_demand:
-                    logger.info(f"场站 {site_no} 的demand值发生变化，触发功率重新分配")
-                    await self.algorithm_service.trigger_power_optimization(site_no)
-
-            # 更新历史demand值
-            self.previous_demands[site_no] = current_demand
-
-            # 存储场站信息
-            site = await self.db_service.save_site_info(request)
-
-            # 通知运维平台
-            await self.notify_maintenance([pile['pile_sn'] for pile in request.get('piles', [])])
+            # 拓扑有变化时通知运维平台
+            if saved:
+                await self.maintenance_service.notify_maintenance(
+                    site_no,
+                    [pile['pile_sn'] for pile in request.get('piles', [])]
+                )
 
-            return {"status": "success", "site_id": site.site_no}
+            return {"status": "success", "site_id": site_no}
 
         except Exception as e:
             logger.error(f"处理场站信息失败: {str(e)}")
             raise HTTPException(status_code=500, detail=str(e))
 
-    async def notify_maintenance(self, piles: List[str]):
-        """通知运维平台"""
-        try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    f"{settings.MAINTENANCE_API_URL}/notify",
-                    json={"pile_sns": piles}
-                )
-                response.raise_for_status()
-                return response.json()
-        except Exception as e:
-            logger.error(f"通知运维平台失败: {str(e)}")
-            raise
-
     def _validate_request(self, request: Dict) -> bool:
         """验证请求数据"""
         required_fields = ['site_no', 'demand', 'total_power_limit']
@@ -84,7 +62,7 @@ class HTTPService:
             site = await self.db_service.get_site_info(site_no)
             if not site:
                 raise HTTPException(status_code=404, detail="场站不存在")
-            return site
+            return site.model_dump()
         except Exception as e:
             logger.error(f"获取场站信息失败: {str(e)}")
             raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
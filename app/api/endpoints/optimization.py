@@ -1,4 +1,4 @@
-from fastapi import APIRouter, HTTPException, BackgroundTasks
+from fastapi import APIRouter, HTTPException
 
 from app.models.schemas import OptimizationRequest, OptimizationResponse
 from app.services.algorithm import AlgorithmService
@@ -18,11 +18,7 @@ class OptimizationEndpoints:
         self.db_service = db_service
 
     @router.post("/tasks", response_model=OptimizationResponse)
-    async def create_optimization_task(
-            self,
-            request: OptimizationRequest,
-            background_tasks: BackgroundTasks
-    ):
+    async def create_optimization_task(self, request: OptimizationRequest):
         """创建优化任务"""
         try:
             # 获取场站信息
@@ -30,20 +26,17 @@ class OptimizationEndpoints:
             if not site:
                 raise HTTPException(status_code=404, detail="场站不存在")
 
-            # 获取充电枪状态
-            charger_states = await self.db_service.get_charger_states(request.site_no)
-
-            # 在后台执行优化
-            background_tasks.add_task(
-                self.algorithm_service.trigger_power_optimization,
-                site,
-                charger_states
+            # 提交优化执行器，执行时读取场站最新状态
+            task_id = await self.algorithm_service.trigger_power_optimization(
+                request.site_no,
+                request.task_type
             )
 
             return OptimizationResponse(
                 status="success",
                 message="优化任务已创建",
-                site_no=request.site_no
+                site_no=request.site_no,
+                task_id=task_id
             )
 
         except Exception as e:
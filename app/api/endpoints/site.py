@@ -1,9 +1,16 @@
-from fastapi import APIRouter, HTTPException, BackgroundTasks
+import json
+from typing import List
 
-from app.models.schemas import SiteInfoRequest, SiteResponse
+from fastapi import APIRouter, HTTPException, BackgroundTasks, Request
+from pydantic import ValidationError
+
+from app.models.schemas import SiteInfoRequest, SiteResponse, SiteBulkResult, SiteBulkResponse
 from app.services.algorithm import AlgorithmService
 from app.services.database import DatabaseService
 from app.services.maintenance import MaintenanceService
+from app.services.site_import import (
+    STATUS_CREATED, STATUS_UPDATED, STATUS_UNCHANGED, STATUS_FAILED, apply_site_info
+)
 from app.utils.logger import logger
 
 router = APIRouter(prefix="/sites", tags=["sites"])
@@ -28,33 +35,93 @@ class SiteEndpoints:
     ):
         """处理场站信息接口"""
         try:
-            # 1. 获取历史场站信息
-            old_site = await self.db_service.get_site_info(request.site_no)
-
-            # 2. 存储新的场站信息
-            site = await self.db_service.save_site_info(request.dict())
+            site_no, saved = await apply_site_info(self.db_service, self.algorithm_service, request.model_dump())
 
-            # 3. 检查demand变化并触发功率重新分配
-            if old_site and old_site.demand != request.demand:
-                logger.info(f"场站 {request.site_no} 的demand值发生变化")
+            # 拓扑有变化时通知运维平台（异步执行）
+            if saved:
                 background_tasks.add_task(
-                    self.algorithm_service.trigger_power_optimization,
-                    request.site_no
+                    self.maintenance_service.notify_maintenance,
+                    site_no,
+                    [pile.pile_sn for pile in request.piles]
                 )
 
-            # 4. 通知运维平台（异步执行）
-            pile_sns = [pile.pile_sn for pile in request.piles]
-            background_tasks.add_task(
-                self.maintenance_service.notify_maintenance,
-                request.site_no,
-                pile_sns
-            )
-
-            return SiteResponse(
-                status="success",
-                site_id=site.site_no
-            )
+            return SiteResponse(status="success", site_id=site_no)
 
         except Exception as e:
             logger.error(f"处理场站信息失败: {str(e)}")
-            raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+            raise HTTPException(status_code=500, detail=str(e))
+
+    @router.post("/bulk", response_model=SiteBulkResponse)
+    async def handle_site_info_bulk(self, request: Request):
+        """批量导入场站信息接口：请求体为场站信息JSON数组，或NDJSON（每行一个场站）"""
+        try:
+            items = self._parse_bulk_body(await request.body(), request.headers.get('content-type', ''))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        try:
+            # 逐条校验，格式错误的场站单独报告
+            results: List[SiteBulkResult] = []
+            sites: List[SiteInfoRequest] = []
+            for item in items:
+                if isinstance(item, ValueError):
+                    results.append(SiteBulkResult(status=STATUS_FAILED, error=str(item)))
+                    continue
+                try:
+                    sites.append(SiteInfoRequest.model_validate(item))
+                    results.append(None)
+                except ValidationError as e:
+                    site_no = item.get('site_no') if isinstance(item, dict) else None
+                    results.append(SiteBulkResult(site_no=site_no, status=STATUS_FAILED, error=str(e)))
+
+            saved = iter(await self.db_service.save_sites_bulk([site.model_dump() for site in sites]))
+            valid = iter(sites)
+            for i, result in enumerate(results):
+                if result is not None:
+                    continue
+                site = next(valid)
+                results[i] = result = SiteBulkResult(**next(saved))
+                if result.demand_changed:
+                    await self.algorithm_service.update_site_demand(
+                        site.site_no,
+                        site.demand,
+                        site.total_power_limit
+                    )
+                if result.status in (STATUS_CREATED, STATUS_UPDATED):
+                    await self.maintenance_service.notify_maintenance(
+                        site.site_no,
+                        [pile.pile_sn for pile in site.piles]
+                    )
+
+            counts = {status: 0 for status in (STATUS_CREATED, STATUS_UPDATED, STATUS_UNCHANGED, STATUS_FAILED)}
+            for result in results:
+                if result.status in counts:
+                    counts[result.status] += 1
+            logger.info(f"批量导入场站完成: {counts}")
+            return SiteBulkResponse(total=len(results), results=results, **counts)
+
+        except Exception as e:
+            logger.error(f"批量导入场站失败: {str(e)}")
+            raise HTTPException(status_code=500, detail=str(e))
+
+    @staticmethod
+    def _parse_bulk_body(body: bytes, content_type: str) -> List:
+        """解析批量请求体，返回场站信息列表"""
+        if 'ndjson' in content_type:
+            items = []
+            for line_no, line in enumerate(body.splitlines(), 1):
+                if not line.strip():
+                    continue
+                try:
+                    items.append(json.loads(line))
+                except json.JSONDecodeError as e:
+                    # 单行错误只影响该行，在结果中报告
+                    items.append(ValueError(f"第{line_no}行不是合法的JSON: {str(e)}"))
+            return items
+        try:
+            items = json.loads(body)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"请求体不是合法的JSON: {str(e)}")
+        if not isinstance(items, list):
+            raise ValueError("请求体应为场站信息数组")
+        return items
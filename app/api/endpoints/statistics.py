@@ -3,6 +3,7 @@ from typing import Dict
 
 from fastapi import APIRouter, HTTPException
 
+from app.models.monitoring import PowerStatistics
 from app.services.database import DatabaseService
 from app.utils.logger import logger
 
@@ -17,7 +18,7 @@ class StatisticsEndpoints:
         self,
         site_no: str,
         period: str = "day"
-    ) -> Dict:
+    ) -> PowerStatistics:
         """获取场站功率统计"""
         try:
             end_time = datetime.utcnow()
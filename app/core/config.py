@@ -1,6 +1,7 @@
 from functools import lru_cache
-from typing import Dict, List
+from typing import Dict, List, Optional
 
+from pydantic import model_validator
 from pydantic_settings import BaseSettings
 
 
@@ -9,6 +10,15 @@ class Settings(BaseSettings):
     PROJECT_NAME: str = "充电桩功率调度系统"
     API_V1_STR: str = "/api/v1"
     DEBUG: bool = True
+    WORKERS: int = 1  # uvicorn工作进程数，大于1时启用场站分片
+
+    # 场站分片配置（多进程/多节点部署）
+    SHARD_ENABLED: bool = False  # 启用场站分片，WORKERS大于1时自动启用
+    SHARD_MAX_NODES: int = 64  # 节点编号上限
+    SHARD_VIRTUAL_NODES: int = 160  # 每个节点在哈希环上的虚拟节点数
+    SHARD_HEARTBEAT_INTERVAL: float = 5  # 节点心跳及刷新存活节点的间隔(秒)
+    SHARD_NODE_TTL: float = 15  # 超过该时间未心跳的节点视为离开
+    SHARD_TASK_POLL_INTERVAL: float = 2  # 领取其他节点转交的优化任务的间隔(秒)
 
     # 数据库配置
     DB_HOST: str = "localhost"
@@ -18,6 +28,18 @@ class Settings(BaseSettings):
     DB_NAME: str = "charging_system"
     DB_POOL_SIZE: int = 20
     DB_POOL_RECYCLE: int = 3600
+    DB_IN_CHUNK_SIZE: int = 1000  # 批量查询时IN条件的最大元素数
+    SITE_BULK_CHUNK_SIZE: int = 100  # 批量导入场站时每个事务处理的场站数
+    SITE_BULK_STATEMENT_ROWS: int = 1000  # 批量导入时单条多行写入语句的最大行数
+    TOPOLOGY_CACHE_SIZE: int = 5000  # 场站拓扑缓存最大场站数
+    TOPOLOGY_CACHE_TTL: float = 300  # 场站拓扑缓存有效期(秒)
+    RECORD_BATCH_SIZE: int = 500  # 充电记录单次批量写入行数
+    RECORD_FLUSH_INTERVAL: float = 1.0  # 充电记录最长缓冲时间(秒)
+    RECORD_BUFFER_SIZE: int = 20000  # 充电记录缓冲上限，超过时阻塞消费
+    ROLLUP_FLUSH_INTERVAL: float = 10  # 功率聚合写库间隔(秒)
+    ROLLUP_MAX_GAP: float = 60  # 电量积分的最大上报间隔(秒)
+    ROLLUP_MAX_POINTS: int = 2000  # 功率统计返回的最大数据点数
+    ROLLUP_CHARGER_RESOLUTION: int = 3600  # 单枪功率聚合粒度(秒)，场站汇总保留全部粒度
 
     # Kafka配置
     KAFKA_SERVERS: List[str] = ["localhost:9092"]
@@ -28,17 +50,40 @@ class Settings(BaseSettings):
         "PLUG_STATUS": "plug_status",
         "POWER_ALLOCATION": "power_allocation"
     }
+    KAFKA_BACKEND: str = "kafka"  # kafka: 真实集群, memory: 本地内存代理
+    KAFKA_CONSUMER_WORKERS: int = 4  # 按分区划分的消费协程数
+    KAFKA_WORKER_QUEUE_SIZE: int = 1000  # 单个消费协程的缓冲队列长度
+    KAFKA_MAX_POLL_RECORDS: int = 500
+    KAFKA_MEMORY_PARTITIONS: int = 8  # 内存代理每个主题的分区数
+    KAFKA_TOPIC_PARTITIONS: int = 8  # 上行主题的分区数，场站分片按分区划分，须与集群中各主题一致
+    KAFKA_COMMIT_BATCH_SIZE: int = 500  # 累计处理多少条消息触发一次offset提交
+    KAFKA_COMMIT_INTERVAL_MS: int = 1000  # offset提交最大间隔
+    KAFKA_PRODUCER_LINGER_MS: int = 5  # 生产者合并发送等待时间
+    KAFKA_PRODUCER_BATCH_SIZE: int = 65536  # 单分区批次最大字节数
+    KAFKA_PRODUCER_COMPRESSION: Optional[str] = None  # gzip/snappy/lz4/zstd
+    KAFKA_CODEC: str = "fast"  # json: 标准库, fast: 预编译schema+orjson, binary: 紧凑二进制
 
     # 运维平台配置
     MAINTENANCE_API_URL: str = "http://maintenance-api"
     MAINTENANCE_API_TIMEOUT: int = 30
+    MAINTENANCE_MAX_CONNECTIONS: int = 20  # 共享连接池最大连接数
+    MAINTENANCE_NOTIFY_WINDOW: float = 1.0  # 通知合并窗口(秒)，窗口内同一场站的桩列表合并为一次请求
+    MAINTENANCE_RETRY_ATTEMPTS: int = 3  # 单次通知最大尝试次数
+    MAINTENANCE_RETRY_BACKOFF: float = 0.5  # 首次重试等待(秒)，之后每次翻倍
+    MAINTENANCE_REQUEUE_LIMIT: int = 5  # 场站通知连续发送失败的窗口数上限，超过后丢弃
 
     # 数据保留配置
     DATA_RETENTION: Dict[str, int] = {
         "charging_record": 90,  # 90天
         "optimization_task": 30,  # 30天
-        "power_prediction": 7  # 7天
+        "power_prediction": 7,  # 7天
+        "power_rollup": 90  # 90天
     }
+    RETENTION_INTERVAL: float = 3600  # 过期清理执行间隔(秒)，0表示不自动执行
+    RETENTION_CHUNK_SIZE: int = 5000  # 每次删除的最大行数
+    RETENTION_CHUNK_PAUSE: float = 0.1  # 两次分块删除之间的间隔(秒)
+    RETENTION_PARTITIONED_TABLES: List[str] = []  # 按天分区的表，过期时直接删除分区
+    RETENTION_PARTITIONS_AHEAD: int = 3  # 分区表预建的未来分区天数
 
     # 日志配置
     LOG_LEVEL: str = "INFO"
@@ -47,10 +92,52 @@ class Settings(BaseSettings):
     # 算法配置
     MAX_POWER_REDUCTION: float = 0.3  # 最大功率下调30%
     MIN_POWER_IMPACT: float = 0.1  # 10%以下不计入影响
+    OPTIMIZATION_INTERVAL: float = 15  # 同一场站两次优化的最小间隔(秒)，窗口内的触发合并执行
+    DEMAND_MIN_INTERVAL: float = 2  # 需求响应优化的最小间隔(秒)，连续的需求变化合并执行
+    OPTIMIZATION_TASK_TYPE: int = 1  # 默认分配算法 1: 智能分配 2: 快速分配
+    OPTIMIZATION_TIME_BUDGET: float = 2.0  # 智能分配求解时限(秒)，超时回退快速分配
+    OPTIMIZATION_WORKERS: int = 4  # 优化执行协程数，同一场站的优化串行执行
+    OPTIMIZATION_RECOVER_LIMIT: int = 1000  # 启动时恢复的未完成优化任务数
+    OPTIMIZATION_EXECUTOR: str = "inline"  # inline: 事件循环内求解, process: 精确求解在进程池中执行
+    SOLVER_POOL_WORKERS: int = 2  # 求解进程数
+    SOLVER_POOL_MAX_PENDING: int = 4  # 进行中的求解数上限，达到上限时回退快速分配
+    SOLVER_POOL_TIMEOUT: float = 3.0  # 等待求解结果的最长时间(秒)，使用进程池时不能小于OPTIMIZATION_TIME_BUDGET
+    SOLVER_POOL_START_METHOD: str = "spawn"  # 求解进程启动方式
+    OPTIMIZATION_INCREMENTAL: bool = True  # 单枪插拔/需求变化时基于上次结果增量分配
+    CHARGER_STATE_TTL: float = 60  # 充电枪实时状态有效期(秒)，超时未上报时回查数据库
+    PREDICTION_TARGET_SOCS: List[int] = [80, 90]  # 功率预测的目标SOC点
+    CHARGING_CURVE_LOOKBACK_DAYS: int = 30  # 拟合充电曲线使用的历史记录天数
+    CHARGING_CURVE_REFRESH_INTERVAL: float = 3600  # 充电曲线重新拟合间隔(秒)，0表示只在启动时加载
+    CHARGING_CURVE_MIN_SAMPLES: int = 20  # SOC分桶的最少样本数，不足时该分桶由相邻分桶插值
+    CHARGING_CURVE_MIN_BINS: int = 20  # 车型曲线的最少有效SOC分桶数，不足时使用默认曲线
+    VEHICLE_LIBRARY_SIZE: int = 50000  # 车型指纹库最多加载的已识别记录数（按时间倒序）
+    VEHICLE_LIBRARY_REFRESH_INTERVAL: float = 3600  # 车型指纹库重新加载间隔(秒)，0表示只在启动时加载
+    VEHICLE_NEIGHBORS: int = 5  # 车型识别的近邻数
+    VEHICLE_MAX_DISTANCE: float = 1.0  # 标准化特征空间中的最大匹配距离，超过时识别为未知车型
+    VEHICLE_CACHE_SIZE: int = 100000  # 按mac地址缓存识别结果的最大车辆数
+    VEHICLE_CACHE_TTL: float = 86400  # 识别结果缓存有效期(秒)
+    VEHICLE_PENDING_BATCH_SIZE: int = 5000  # 指纹库重新加载后补识别的未识别记录数
+
+    # 监控配置
+    MONITORING_INTERVAL: float = 30  # 巡检间隔(秒)
+    ALERT_RESOLVE_AFTER: float = 90  # 告警超过该时间(秒)未再触发时自动恢复
+    ALERT_UPDATE_INTERVAL: float = 300  # 持续中告警的触发次数/最近触发时间写库间隔(秒)
+    ALERT_SUPPRESS_WINDOW: float = 300  # 恢复后该时间(秒)内再次触发时重新打开原告警
+    ALERT_BATCH_SIZE: int = 200  # 告警单次批量写入条数
+    ALERT_FLUSH_INTERVAL: float = 2.0  # 告警最长缓冲时间(秒)
+    ALERT_BUFFER_SIZE: int = 10000  # 告警缓冲上限
+    ALERT_STREAMING: bool = False  # 处理功率/插拔枪消息时即时检查告警（巡检仍作为兜底）
 
     class Config:
         env_file = ".env"
 
+    @model_validator(mode='after')
+    def check_solver_pool_timeout(self):
+        # 等待时间小于求解时限时，超时放弃的求解仍占用进程，进程池会持续处于饱和状态；未使用进程池时不校验
+        if self.OPTIMIZATION_EXECUTOR == "process" and self.SOLVER_POOL_TIMEOUT < self.OPTIMIZATION_TIME_BUDGET:
+            raise ValueError("SOLVER_POOL_TIMEOUT不能小于OPTIMIZATION_TIME_BUDGET")
+        return self
+
 
 @lru_cache()
 def get_settings() -> Settings:
@@ -1,4 +1,3 @@
-import asyncio
 from contextlib import asynccontextmanager
 
 import uvicorn
@@ -7,8 +6,12 @@ from fastapi import FastAPI
 from app.api.endpoints import HTTPService
 from app.core.config import settings
 from app.services.algorithm import AlgorithmService
+from app.services.charger_state import ChargerStateStore
 from app.services.database import DatabaseService
 from app.services.kafka import KafkaService
+from app.services.maintenance import MaintenanceService
+from app.services.monitoring import MonitoringService
+from app.services.sharding import ShardCoordinator
 from app.utils.logger import logger
 
 # 创建FastAPI应用实例
@@ -32,32 +35,56 @@ async def lifespan(app: FastAPI):
         db_service = DatabaseService()
         await db_service.initialize()
 
-        # 初始化算法和Kafka服务
-        algorithm_service = AlgorithmService(db_service, None)
+        # 多进程/多节点部署时按场站分片，每个场站只由一个节点调度和巡检
+        shards = None
+        if settings.SHARD_ENABLED or settings.WORKERS > 1:
+            shards = ShardCoordinator(db_service)
+            await shards.start()
+            db_service.cache_site_digests = False  # 场站归属会迁移，摘要只以数据库为准
+
+        # 初始化算法和Kafka服务（共享充电枪实时状态）
+        state_store = ChargerStateStore()
+        algorithm_service = AlgorithmService(db_service, None, state_store, shards)
         kafka_service = KafkaService(algorithm_service)
         algorithm_service.kafka_service = kafka_service
 
+        # 初始化监控服务
+        monitoring_service = MonitoringService(db_service, state_store, shards)
+        kafka_service.alert_stream = monitoring_service.alert_stream
+
+        # 初始化运维平台通知（共享连接池）
+        maintenance_service = MaintenanceService()
+        await maintenance_service.start()
+
         # 初始化HTTP服务
-        http_service = HTTPService(db_service, algorithm_service)
+        http_service = HTTPService(db_service, algorithm_service, maintenance_service)
 
         # 注册服务
         app.state.db = db_service
+        app.state.shards = shards
         app.state.kafka = kafka_service
         app.state.algorithm = algorithm_service
+        app.state.charger_states = state_store
+        app.state.monitoring = monitoring_service
+        app.state.maintenance = maintenance_service
         app.state.http = http_service
 
-        # 启动Kafka消费者
-        kafka_consumer_task = asyncio.create_task(
-            kafka_service.start_consuming()
-        )
+        # 启动算法、监控服务和Kafka消费者
+        await algorithm_service.start()
+        await monitoring_service.start()
+        await kafka_service.start()
 
         logger.info("所有服务组件初始化完成")
         yield
 
         # 清理资源
         logger.info("正在关闭服务...")
-        kafka_consumer_task.cancel()
-        await kafka_service.close()
+        await algorithm_service.stop()
+        await kafka_service.stop()
+        await monitoring_service.stop()
+        await maintenance_service.stop()
+        if shards is not None:
+            await shards.stop()
         await db_service.close()
         logger.info("所有服务已安全关闭")
 
@@ -1,6 +1,6 @@
 from datetime import datetime
 
-from sqlalchemy import Column, String, Float, DateTime, Boolean, Integer, ForeignKey, JSON
+from sqlalchemy import Column, String, Float, DateTime, Boolean, Integer, ForeignKey, JSON, UniqueConstraint
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 
@@ -17,6 +17,7 @@ class Site(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, onupdate=datetime.utcnow)
     is_active = Column(Boolean, default=True)
+    payload_hash = Column(String(64), comment='最近一次场站信息的内容摘要(不含demand)')
 
     # 关系定义
     charger_groups = relationship("ChargerGroup", back_populates="site")
@@ -91,6 +92,7 @@ class EVModel(Base):
     created_at = Column(DateTime, default=datetime.utcnow, comment='创建时间')
     report_at = Column(DateTime, comment='上报时间')
     vendor_model_capacity = Column(String(100), comment='车型识别结果')
+    model_source = Column(String(20), comment='车型标签来源 CONFIRMED/INFERRED，空为外部导入')
 
     # 关系定义
     charging_sessions = relationship("ChargingSession", back_populates="ev_model")
@@ -123,6 +125,7 @@ class PowerPrediction(Base):
     mac_addr = Column(String(50), comment='电池MAC')
     time = Column(Float, comment='时间')
     power = Column(Float, comment='功率')
+    created_at = Column(DateTime, default=datetime.utcnow, comment='创建时间')
 
     # 关系定义
     ev_model = relationship("EVModel", back_populates="power_predictions")
@@ -162,6 +165,69 @@ class OptimizationTask(Base):
     limit_json = Column(JSON, comment='限制条件JSON')
     pile_power_json = Column(JSON, comment='桩功率分配JSON')
     task_type = Column(Integer, comment='功率分配算法类型 智能分配/快速分配')
+    status = Column(String(20), index=True, comment='PENDING/RUNNING/DONE/FAILED/MERGED')
+    priority = Column(Integer, comment='0: 需求响应 1: 普通')
+    triggers = Column(Integer, default=1, comment='合并执行的触发次数')
+    created_at = Column(DateTime, default=datetime.utcnow)
+    error = Column(String(500))
+    node_id = Column(String(20), comment='执行节点')
 
     # 关系定义
-    site = relationship("Site", back_populates="optimization_tasks")
\ No newline at end of file
+    site = relationship("Site", back_populates="optimization_tasks")
+
+
+class PowerRollup(Base):
+    __tablename__ = 'power_rollup'
+    __table_args__ = (
+        UniqueConstraint('site_no', 'charger_sn', 'resolution', 'bucket_start', name='uk_power_rollup_bucket'),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    site_no = Column(String(50), nullable=False, comment='场站ID')
+    charger_sn = Column(String(50), nullable=False, default='', comment='枪SN，空字符串表示场站汇总')
+    resolution = Column(Integer, nullable=False, comment='聚合粒度(秒)')
+    bucket_start = Column(DateTime, nullable=False, comment='时间桶起始时间')
+    samples = Column(Integer, nullable=False, default=0, comment='采样次数')
+    power_sum = Column(Float, nullable=False, default=0, comment='功率采样累计值')
+    power_min = Column(Float, comment='最小功率')
+    power_max = Column(Float, comment='最大功率')
+    energy = Column(Float, nullable=False, default=0, comment='电量(kWh)')
+
+
+class AlertConfiguration(Base):
+    __tablename__ = 'alert_config'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    site_no = Column(String(50), nullable=False, comment='场站ID，*表示全部场站')
+    alert_type = Column(String(50), nullable=False, comment='告警类型')
+    threshold = Column(Float, nullable=False, comment='告警阈值')
+    description = Column(String(200))
+    is_active = Column(Boolean, default=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, onupdate=datetime.utcnow)
+
+
+class ShardNode(Base):
+    __tablename__ = 'shard_node'
+
+    node_id = Column(String(20), primary_key=True, comment='节点编号 shard-N')
+    token = Column(String(100), comment='当前持有该编号的进程')
+    heartbeat_at = Column(DateTime, nullable=False, comment='最近心跳时间')
+    started_at = Column(DateTime)
+
+
+class Alert(Base):
+    __tablename__ = 'alert'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    alert_key = Column(String(255), nullable=False, unique=True, comment='告警唯一键：场站:类型:对象:开始时间')
+    site_no = Column(String(50), nullable=False, comment='场站ID')
+    alert_type = Column(String(50), nullable=False, comment='告警类型')
+    target = Column(String(50), nullable=False, default='', comment='告警对象，场站级告警为空')
+    message = Column(String(500))
+    severity = Column(String(20))
+    status = Column(String(20), comment='ACTIVE / RESOLVED')
+    occurrences = Column(Integer, default=1, comment='触发次数')
+    created_at = Column(DateTime, comment='首次触发时间')
+    last_seen = Column(DateTime, comment='最近触发时间')
+    resolved_at = Column(DateTime, comment='恢复时间')
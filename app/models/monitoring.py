@@ -8,10 +8,10 @@ class AlertConfig(BaseModel):
     site_no: str
     alert_type: str
     threshold: float
-    description: str
+    description: Optional[str] = None
     is_active: bool = True
-    created_at: datetime = None
-    updated_at: datetime = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None  # 未修改过的配置为空
 
 class AlertMessage(BaseModel):
     site_no: str
@@ -21,6 +21,9 @@ class AlertMessage(BaseModel):
     status: str = "ACTIVE"
     created_at: datetime
     resolved_at: Optional[datetime] = None
+    target: str = ""  # 告警对象：充电枪SN/群组ID，场站级告警为空
+    occurrences: int = 1  # 告警持续期间的触发次数
+    last_seen: Optional[datetime] = None
 
 class PowerStatistics(BaseModel):
     site_no: str
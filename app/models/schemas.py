@@ -1,108 +1,160 @@
-import asyncio
 from datetime import datetime
-from typing import Dict
-
-from app.core.config import settings
-from app.models.schemas import AlertMessage
-from app.services.database import DatabaseService
-from app.utils.logger import logger
-
-
-class MonitoringService:
-    def __init__(self, db_service: DatabaseService):
-        self.db_service = db_service
-        self.alert_configs = {}
-        self._running = False
-
-    async def start(self):
-        """启动监控服务"""
-        self._running = True
-        await self._load_alert_configs()
-        asyncio.create_task(self._monitoring_loop())
-
-    async def stop(self):
-        """停止监控服务"""
-        self._running = False
-
-    async def _monitoring_loop(self):
-        """监控循环"""
-        while self._running:
-            try:
-                # 获取所有场站状态
-                sites = await self.db_service.get_all_active_sites()
-
-                for site in sites:
-                    # 检查场站状态
-                    await self._check_site_status(site)
-                    # 检查充电桩状态
-                    await self._check_charger_status(site.site_no)
-                    # 检查功率分配
-                    await self._check_power_allocation(site.site_no)
-
-                await asyncio.sleep(settings.MONITORING_INTERVAL)
-
-            except Exception as e:
-                logger.error(f"监控循环异常: {str(e)}")
-                await asyncio.sleep(5)
-
-    async def _check_site_status(self, site: Dict):
-        """检查场站状态"""
-        try:
-            # 检查总功率是否超限
-            if site['current_power'] > site['total_power_limit']:
-                await self._create_alert(
-                    site_no=site['site_no'],
-                    alert_type="POWER_EXCEED",
-                    message=f"场站总功率超限: {site['current_power']}kW > {site['total_power_limit']}kW"
-                )
-
-            # 检查需求响应
-            if site['current_power'] > site['demand']:
-                await self._create_alert(
-                    site_no=site['site_no'],
-                    alert_type="DEMAND_EXCEED",
-                    message=f"场站功率超过需求: {site['current_power']}kW > {site['demand']}kW"
-                )
-
-        except Exception as e:
-            logger.error(f"场站状态检查失败: {str(e)}")
-
-    async def _check_charger_status(self, site_no: str):
-        """检查充电桩状态"""
-        try:
-            chargers = await self.db_service.get_charger_states(site_no)
-
-            for charger in chargers:
-                # 检查充电异常
-                if charger['status'] == 'ERROR':
-                    await self._create_alert(
-                        site_no=site_no,
-                        alert_type="CHARGER_ERROR",
-                        message=f"充电桩故障: {charger['charger_sn']}"
-                    )
-
-                # 检查功率异常
-                if charger['current_power'] > charger['rated_power']:
-                    await self._create_alert(
-                        site_no=site_no,
-                        alert_type="CHARGER_POWER_EXCEED",
-                        message=f"充电桩功率超限: {charger['charger_sn']}"
-                    )
-
-        except Exception as e:
-            logger.error(f"充电桩状态检查失败: {str(e)}")
-
-    async def _create_alert(self, site_no: str, alert_type: str, message: str):
-        """创建告警"""
-        try:
-            alert = AlertMessage(
-                site_no=site_no,
-                alert_type=alert_type,
-                message=message,
-                created_at=datetime.utcnow()
-            )
-            await self.db_service.save_alert(alert)
-            logger.warning(f"创建告警: {message}")
-
-        except Exception as e:
-            logger.error(f"创建告警失败: {str(e)}")
\ No newline at end of file
+from typing import Dict, List, Optional
+
+from pydantic import BaseModel
+
+from app.models.monitoring import AlertConfig, AlertMessage
+
+
+# Kafka消息
+class KafkaMessage(BaseModel):
+    message_type: int  # 1: 车型识别 2: 功率预测 3: 插拔枪状态
+    data: Dict
+    timestamp: Optional[datetime] = None
+
+
+class VehicleData(BaseModel):
+    """车型识别数据"""
+    session_id: str
+    charger_sn: str
+    mac_addr: str
+    voltage: float
+    current: float
+    power: float
+    capacity: float
+    report_at: Optional[datetime] = None
+
+
+class PowerData(BaseModel):
+    """功率预测数据（充电过程遥测）"""
+    session_id: Optional[str] = None
+    charger_sn: str
+    mac_addr: Optional[str] = None
+    site_no: Optional[str] = None
+    soc: float
+    power: float
+    capacity: Optional[float] = None
+    curr_output: Optional[float] = None
+    vol_output: Optional[float] = None
+    curr_demand: Optional[float] = None
+    vol_demand: Optional[float] = None
+    consumed_energy: Optional[float] = None
+    timestamp: Optional[datetime] = None
+
+
+class PlugStatus(BaseModel):
+    """插拔枪状态"""
+    charger_sn: str
+    status: str  # PLUGGED / UNPLUGGED
+    power: Optional[float] = None  # 插枪时的请求功率
+    session_id: Optional[str] = None
+    mac_addr: Optional[str] = None
+    site_no: Optional[str] = None
+    timestamp: Optional[datetime] = None
+
+
+# 场站信息
+class ModuleInfo(BaseModel):
+    module_no: int
+    type: Optional[str] = None
+    unit_power: int
+
+
+class ChargerInfo(BaseModel):
+    charger_sn: str
+    status: Optional[str] = None
+    max_power: float
+    min_power: float = 0
+
+
+class PileInfo(BaseModel):
+    pile_sn: str
+    group_no: Optional[int] = None  # 所属群组编号，对应groups中的group_no
+    type: Optional[str] = None
+    rated_power: float
+    modules: List[ModuleInfo] = []
+    chargers: List[ChargerInfo] = []
+
+
+class ChargerGroupInfo(BaseModel):
+    group_no: int
+    power_limit: float
+
+
+class SiteInfoRequest(BaseModel):
+    site_no: str
+    name: str
+    demand: float
+    total_power_limit: float
+    groups: List[ChargerGroupInfo] = []
+    piles: List[PileInfo] = []
+
+
+class SiteTopology(BaseModel):
+    """场站拓扑快照（缓存用，不可修改）"""
+    site_no: str
+    name: str
+    total_power_limit: float
+    demand: float
+    is_active: bool = True
+    groups: List[Dict] = []  # group_id, power_limit
+    piles: List[Dict] = []  # pile_sn, group_id, type, rated_power, modules
+    chargers: List[Dict] = []  # charger_sn, pile_sn, group_id, status, 功率上下限及所属桩/群组上限、模块粒度
+
+
+class SiteResponse(BaseModel):
+    status: str
+    site_id: str
+
+
+class SiteBulkResult(BaseModel):
+    site_no: Optional[str] = None  # 请求行无法解析时为空
+    status: str  # created / updated / unchanged / duplicate / failed
+    demand_changed: bool = False
+    error: Optional[str] = None
+
+
+class SiteBulkResponse(BaseModel):
+    total: int
+    created: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    failed: int = 0
+    results: List[SiteBulkResult] = []
+
+
+class ChargerProfileRequest(BaseModel):
+    charger_sn: str
+    pile_sn: Optional[str] = None
+    status: Optional[str] = None
+    max_power: float
+    min_power: float = 0
+
+
+# 功率优化
+class OptimizationRequest(BaseModel):
+    site_no: str
+    task_type: Optional[int] = None
+
+
+class OptimizationResponse(BaseModel):
+    status: str
+    message: str
+    site_no: str
+    task_id: Optional[int] = None
+
+
+class OptimizationTaskInfo(BaseModel):
+    task_id: int
+    site_no: str
+    status: Optional[str] = None
+    priority: Optional[int] = None
+    task_type: Optional[int] = None
+    demand: Optional[float] = None
+    triggers: Optional[int] = None
+    created_at: Optional[datetime] = None
+    start_time: Optional[datetime] = None
+    end_time: Optional[datetime] = None
+    limit_json: Optional[Dict] = None
+    pile_power_json: Optional[Dict] = None
+    error: Optional[str] = None
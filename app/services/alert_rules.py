@@ -0,0 +1,289 @@
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+from app.models.schemas import AlertConfig
+from app.utils.logger import logger
+
+ALL_SITES = '*'  # AlertConfig.site_no为*时对全部场站生效
+
+SCOPE_SITE = 'site'
+SCOPE_GROUP = 'group'
+SCOPE_CHARGER = 'charger'
+
+
+class AlertFrame:
+    """
+    一轮巡检的列式数据：全部场站、群组、充电枪按列展开为numpy数组
+    规则在整列上一次比较，规则数增加不会增加逐枪的Python循环
+    """
+
+    __slots__ = (
+        'site_no', 'site_power', 'site_limit', 'site_demand',
+        'group_id', 'group_site', 'group_power', 'group_limit',
+        'charger_sn', 'charger_site', 'charger_power', 'charger_rated', 'charger_error'
+    )
+
+    def __init__(self, site_no, site_limit, site_demand, group_id, group_site, group_limit,
+                 charger_sn, charger_site, charger_group, charger_power, charger_rated, charger_error):
+        self.site_no = site_no
+        self.site_limit = site_limit
+        self.site_demand = site_demand
+        self.group_id = group_id
+        self.group_site = group_site
+        self.group_limit = group_limit
+        self.charger_sn = charger_sn
+        self.charger_site = charger_site
+        self.charger_power = charger_power
+        self.charger_rated = charger_rated
+        self.charger_error = charger_error
+        # 场站、群组功率由枪功率聚合
+        self.site_power = np.bincount(charger_site, weights=charger_power, minlength=len(site_no))
+        valid_group = charger_group >= 0
+        self.group_power = np.bincount(
+            charger_group[valid_group],
+            weights=charger_power[valid_group],
+            minlength=len(group_id)
+        )
+
+    @classmethod
+    def build(cls, sites: Sequence, charger_states: Dict[str, List[Dict]]) -> "AlertFrame":
+        """由场站拓扑和充电枪状态构建"""
+        site_no, site_limit, site_demand = [], [], []
+        group_id, group_site, group_limit = [], [], []
+        charger_sn, charger_site, charger_group = [], [], []
+        charger_power, charger_rated, charger_error = [], [], []
+
+        for site_idx, site in enumerate(sites):
+            site_no.append(site.site_no)
+            site_limit.append(site.total_power_limit)
+            site_demand.append(site.demand)
+            group_index = {}
+            for group in site.groups:
+                group_index[group['group_id']] = len(group_id)
+                group_id.append(group['group_id'])
+                group_site.append(site_idx)
+                group_limit.append(group['power_limit'])
+            for charger in charger_states.get(site.site_no, ()):
+                charger_sn.append(charger['charger_sn'])
+                charger_site.append(site_idx)
+                charger_group.append(group_index.get(charger.get('group_id'), -1))
+                charger_power.append(charger['current_power'])
+                rated = charger.get('rated_power')
+                charger_rated.append(np.nan if rated is None else rated)
+                charger_error.append(charger.get('status') == 'ERROR')
+
+        return cls(
+            site_no,
+            np.array(site_limit, dtype=float),
+            np.array(site_demand, dtype=float),
+            group_id,
+            np.array(group_site, dtype=np.int64),
+            np.array(group_limit, dtype=float),
+            charger_sn,
+            np.array(charger_site, dtype=np.int64),
+            np.array(charger_group, dtype=np.int64),
+            np.array(charger_power, dtype=float),
+            np.array(charger_rated, dtype=float),
+            np.array(charger_error, dtype=bool)
+        )
+
+
+class AlertPoint:
+    """单个充电枪及其所属群组、场站的当前值，用于消息驱动的增量检查"""
+
+    __slots__ = (
+        'site_no', 'site_power', 'site_limit', 'site_demand',
+        'group_id', 'group_power', 'group_limit',
+        'charger_sn', 'charger_power', 'charger_rated', 'charger_error'
+    )
+
+    def __init__(self, site_no: str, site_power: float, site_limit: float, site_demand: float,
+                 group_id, group_power: float, group_limit: Optional[float],
+                 charger_sn: str, charger_power: float, charger_rated: Optional[float],
+                 charger_error: bool = False):
+        self.site_no = site_no
+        self.site_power = site_power
+        self.site_limit = site_limit
+        self.site_demand = site_demand
+        self.group_id = group_id
+        self.group_power = group_power
+        self.group_limit = group_limit
+        self.charger_sn = charger_sn
+        self.charger_power = charger_power
+        self.charger_rated = charger_rated
+        self.charger_error = charger_error
+
+
+class RuleSpec(NamedTuple):
+    """告警类型定义：作用范围、指标、比较方向、默认阈值"""
+    scope: str
+    metric: Callable[[AlertFrame], np.ndarray]  # 同时支持AlertFrame（按列）和AlertPoint（单值）
+    above: bool  # True: 指标大于阈值告警 False: 小于阈值告警
+    default_threshold: Optional[float]  # 无配置时的默认阈值，None表示默认不启用
+    severity: str
+    message: str  # 告警信息模板，可用 {name} {value} {threshold}
+
+
+def _ratio(numerator, denominator):
+    """按列或单值计算比例，分母无效时为NaN"""
+    if isinstance(numerator, float):
+        return numerator / denominator if denominator is not None and denominator > 0 else np.nan
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(denominator > 0, numerator / denominator, np.nan)
+
+
+# 阈值均为比例（实际值/上限），1.0表示达到上限
+RULE_SPECS: Dict[str, RuleSpec] = {
+    "POWER_EXCEED": RuleSpec(
+        SCOPE_SITE, lambda f: _ratio(f.site_power, f.site_limit), True, 1.0,
+        "CRITICAL", "场站总功率超限: {name}, 负载率 {value:.0%} > {threshold:.0%}"
+    ),
+    "DEMAND_EXCEED": RuleSpec(
+        SCOPE_SITE, lambda f: _ratio(f.site_power, f.site_demand), True, 1.0,
+        "WARNING", "场站功率超过需求: {name}, 需求占用 {value:.0%} > {threshold:.0%}"
+    ),
+    "GROUP_POWER_EXCEED": RuleSpec(
+        SCOPE_GROUP, lambda f: _ratio(f.group_power, f.group_limit), True, 1.0,
+        "WARNING", "群组功率超限: {name}, 负载率 {value:.0%} > {threshold:.0%}"
+    ),
+    "CHARGER_POWER_EXCEED": RuleSpec(
+        SCOPE_CHARGER, lambda f: _ratio(f.charger_power, f.charger_rated), True, 1.0,
+        "WARNING", "充电桩功率超限: {name}, 负载率 {value:.0%} > {threshold:.0%}"
+    ),
+    "CHARGER_ERROR": RuleSpec(
+        SCOPE_CHARGER, lambda f: f.charger_error * 1.0, True, 0.5,
+        "CRITICAL", "充电桩故障: {name}"
+    ),
+    "SITE_UNDERUSED": RuleSpec(
+        SCOPE_SITE, lambda f: _ratio(f.site_power, f.site_demand), False, None,
+        "INFO", "场站功率利用率过低: {name}, 需求占用 {value:.0%} < {threshold:.0%}"
+    ),
+}
+
+
+class CompiledRule(NamedTuple):
+    alert_type: str
+    spec: RuleSpec
+    site_thresholds: Dict[str, float]  # 场站阈值，ALL_SITES为全场站阈值
+
+
+class TriggeredAlert(NamedTuple):
+    site_no: str
+    alert_type: str
+    target: str  # 告警对象：充电枪SN/群组ID，场站级告警为空字符串
+    severity: str
+    message: str
+
+
+class AlertRuleEngine:
+    """将AlertConfig编译为按列计算的规则"""
+
+    def __init__(self, configs: Iterable[AlertConfig] = ()):
+        self.rules: List[CompiledRule] = []
+        self.compile(configs)
+
+    def compile(self, configs: Iterable[AlertConfig]):
+        """
+        编译告警配置
+        - 同一告警类型的多条配置（不同场站或同一场站多个阈值）编译为若干规则层
+        - 未配置的告警类型使用默认阈值对全部场站生效
+        """
+        layers: Dict[str, List[Dict[str, float]]] = {}
+        for config in configs:
+            if not config.is_active:
+                continue
+            if config.alert_type not in RULE_SPECS:
+                logger.warning(f"未知的告警类型: {config.alert_type}")
+                continue
+            site_layers = layers.setdefault(config.alert_type, [])
+            # 放入第一个尚未包含该场站的规则层
+            for layer in site_layers:
+                if config.site_no not in layer:
+                    layer[config.site_no] = config.threshold
+                    break
+            else:
+                site_layers.append({config.site_no: config.threshold})
+
+        rules = []
+        for alert_type, spec in RULE_SPECS.items():
+            if alert_type in layers and spec.default_threshold is not None:
+                # 只为部分场站配置时，其余场站仍按默认阈值检查
+                layers[alert_type][0].setdefault(ALL_SITES, spec.default_threshold)
+            if alert_type in layers:
+                for layer in layers[alert_type]:
+                    rules.append(CompiledRule(alert_type, spec, layer))
+            elif spec.default_threshold is not None:
+                rules.append(CompiledRule(alert_type, spec, {ALL_SITES: spec.default_threshold}))
+        self.rules = rules
+
+    def evaluate_point(self, point: AlertPoint) -> List[TriggeredAlert]:
+        """对单个充电枪及其群组、场站计算全部规则"""
+        alerts = []
+        for rule in self.rules:
+            threshold = rule.site_thresholds.get(point.site_no, rule.site_thresholds.get(ALL_SITES))
+            if threshold is None:
+                continue
+            value = rule.spec.metric(point)
+            if not (value > threshold if rule.spec.above else value < threshold):
+                continue
+            if rule.spec.scope == SCOPE_SITE:
+                name, target = point.site_no, ''
+            elif rule.spec.scope == SCOPE_GROUP:
+                name = target = str(point.group_id)
+            else:
+                name = target = point.charger_sn
+            alerts.append(TriggeredAlert(
+                point.site_no,
+                rule.alert_type,
+                target,
+                rule.spec.severity,
+                rule.spec.message.format(name=name, value=value, threshold=threshold)
+            ))
+        return alerts
+
+    def evaluate(self, frame: AlertFrame) -> List[TriggeredAlert]:
+        """在整轮数据上计算全部规则"""
+        site_index = {site_no: i for i, site_no in enumerate(frame.site_no)}
+        metrics: Dict[str, np.ndarray] = {}
+        alerts = []
+        for rule in self.rules:
+            # 场站阈值数组，未配置的场站为NaN（比较结果恒为False）
+            thresholds = np.full(len(frame.site_no), rule.site_thresholds.get(ALL_SITES, np.nan))
+            for site_no, threshold in rule.site_thresholds.items():
+                idx = site_index.get(site_no)
+                if idx is not None:
+                    thresholds[idx] = threshold
+
+            values = metrics.get(rule.alert_type)
+            if values is None:
+                values = metrics[rule.alert_type] = rule.spec.metric(frame)
+
+            if rule.spec.scope == SCOPE_SITE:
+                owner, names = None, frame.site_no
+            elif rule.spec.scope == SCOPE_GROUP:
+                owner, names = frame.group_site, frame.group_id
+            else:
+                owner, names = frame.charger_site, frame.charger_sn
+            limits = thresholds if owner is None else thresholds[owner]
+
+            with np.errstate(invalid='ignore'):
+                triggered = values > limits if rule.spec.above else values < limits
+            hits = np.flatnonzero(triggered)
+            if not len(hits):
+                continue
+            # 只对触发的行转换为Python标量并生成告警信息
+            site_idx = hits if owner is None else owner[hits]
+            message, spec = rule.spec.message, rule.spec
+            site_scope = spec.scope == SCOPE_SITE
+            for i, s_idx, value, threshold in zip(
+                    hits.tolist(), site_idx.tolist(), values[hits].tolist(), limits[hits].tolist()
+            ):
+                alerts.append(TriggeredAlert(
+                    frame.site_no[s_idx],
+                    rule.alert_type,
+                    '' if site_scope else str(names[i]),
+                    spec.severity,
+                    message.format(name=names[i], value=value, threshold=threshold)
+                ))
+        return alerts
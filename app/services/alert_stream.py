@@ -0,0 +1,137 @@
+import asyncio
+import time
+from datetime import datetime
+from typing import Dict, Optional
+
+from app.models.schemas import PowerData, PlugStatus, SiteTopology
+from app.services.alert_rules import AlertPoint, AlertRuleEngine
+from app.services.alert_tracker import AlertTracker
+from app.utils.logger import logger
+
+
+class SiteTotals:
+    """场站功率累计值：各枪最新功率及按群组、场站的累计和"""
+
+    __slots__ = ('topology', 'chargers', 'group_limits', 'charger_power', 'group_power', 'site_power')
+
+    def __init__(self, topology: SiteTopology, charger_power: Dict[str, float] = None):
+        self.topology = topology
+        self.chargers = {c['charger_sn']: c for c in topology.chargers}
+        self.group_limits = {g['group_id']: g['power_limit'] for g in topology.groups}
+        self.charger_power: Dict[str, float] = dict(charger_power or {})
+        # 拓扑变化时按已知的枪功率重新累计
+        self.group_power: Dict = {}
+        self.site_power = 0.0
+        for charger_sn, power in self.charger_power.items():
+            self.site_power += power
+            group_id = self.chargers.get(charger_sn, {}).get('group_id')
+            self.group_power[group_id] = self.group_power.get(group_id, 0.0) + power
+
+    def update(self, charger_sn: str, power: float):
+        """更新单枪功率，O(1)维护群组和场站累计值"""
+        delta = power - self.charger_power.get(charger_sn, 0.0)
+        self.charger_power[charger_sn] = power
+        self.site_power += delta
+        group_id = self.chargers.get(charger_sn, {}).get('group_id')
+        self.group_power[group_id] = self.group_power.get(group_id, 0.0) + delta
+
+    def point(self, charger_sn: str) -> AlertPoint:
+        charger = self.chargers.get(charger_sn, {})
+        group_id = charger.get('group_id')
+        return AlertPoint(
+            self.topology.site_no,
+            self.site_power,
+            self.topology.total_power_limit,
+            self.topology.demand,
+            group_id,
+            self.group_power.get(group_id, 0.0),
+            self.group_limits.get(group_id),
+            charger_sn,
+            self.charger_power.get(charger_sn, 0.0),
+            charger.get('rated_power'),
+            charger.get('status') == 'ERROR'
+        )
+
+
+class StreamingAlertEvaluator:
+    """
+    消息驱动的告警检查：每条功率/插拔枪消息到达时增量更新场站累计功率，
+    只对该枪及其群组、场站计算规则，检测延迟取决于消息处理而非巡检周期
+    """
+
+    def __init__(self, db_service, rule_engine: AlertRuleEngine, tracker: AlertTracker):
+        self.db_service = db_service
+        self.rule_engine = rule_engine
+        self.tracker = tracker
+        self._sites: Dict[str, SiteTotals] = {}
+        self._loading: Dict[str, asyncio.Task] = {}
+
+        # 检查指标
+        self.evaluations = 0
+        self.skipped = 0  # 缺少场站信息或拓扑未就绪而跳过的消息
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+    async def on_power_data(self, data: PowerData, site_no: Optional[str]):
+        """功率遥测"""
+        await self._evaluate(site_no, data.charger_sn, data.power)
+
+    async def on_plug_status(self, data: PlugStatus, site_no: Optional[str]):
+        """插拔枪：拔枪时功率归零，插枪时使用请求功率"""
+        if data.status == 'UNPLUGGED':
+            power = 0.0
+        elif data.power is not None:
+            power = data.power
+        else:
+            return
+        await self._evaluate(site_no, data.charger_sn, power)
+
+    async def _evaluate(self, site_no: Optional[str], charger_sn: str, power: float):
+        start = time.perf_counter()
+        totals = self._site_totals(site_no) if site_no else None
+        if totals is None:
+            self.skipped += 1
+            return
+
+        totals.update(charger_sn, power)
+        alerts = self.rule_engine.evaluate_point(totals.point(charger_sn))
+        if alerts:
+            rows = self.tracker.observe(alerts, datetime.utcnow())
+            if rows:
+                await self.db_service.save_alerts(rows)
+
+        latency = time.perf_counter() - start
+        self.evaluations += 1
+        self.total_latency += latency
+        self.max_latency = max(self.max_latency, latency)
+
+    def _site_totals(self, site_no: str) -> Optional[SiteTotals]:
+        """获取场站累计值，拓扑取自数据库服务缓存；未缓存时后台加载，本条消息跳过"""
+        totals = self._sites.get(site_no)
+        topology = self.db_service.topology_cache.peek(site_no)  # 不计入拓扑缓存命中率
+        if topology is None:
+            if site_no not in self._loading:
+                task = asyncio.create_task(self.db_service.get_site_topology(site_no))
+                self._loading[site_no] = task
+                task.add_done_callback(lambda t: self._on_loaded(site_no, t))
+            return totals
+        if totals is None or totals.topology is not topology:
+            # 首次出现或拓扑已更新
+            totals = SiteTotals(topology, totals.charger_power if totals else None)
+            self._sites[site_no] = totals
+        return totals
+
+    def _on_loaded(self, site_no: str, task: asyncio.Task):
+        self._loading.pop(site_no, None)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"加载场站拓扑失败: {site_no}, {str(task.exception())}")
+
+    def stats(self) -> Dict:
+        """检查指标"""
+        return {
+            "sites": len(self._sites),
+            "evaluations": self.evaluations,
+            "skipped": self.skipped,
+            "avg_latency_ms": self.total_latency / self.evaluations * 1000 if self.evaluations else 0.0,
+            "max_latency_ms": self.max_latency * 1000
+        }
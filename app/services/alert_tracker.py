@@ -0,0 +1,157 @@
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from app.models.schemas import AlertMessage
+from app.services.alert_rules import TriggeredAlert
+from app.utils.logger import logger
+
+AlertKey = Tuple[str, str, str]  # (site_no, alert_type, target)
+
+STATUS_ACTIVE = "ACTIVE"
+STATUS_RESOLVED = "RESOLVED"
+
+
+class TrackedAlert:
+    """持续中的告警"""
+
+    __slots__ = (
+        'site_no', 'alert_type', 'target', 'message', 'severity', 'created_at',
+        'last_seen', 'occurrences', 'resolved_at', 'persisted_at'
+    )
+
+    def __init__(self, site_no: str, alert_type: str, target: str, message: str, severity: str,
+                 created_at: datetime, occurrences: int = 1, last_seen: datetime = None):
+        self.site_no = site_no
+        self.alert_type = alert_type
+        self.target = target
+        self.message = message
+        self.severity = severity
+        self.created_at = created_at
+        self.last_seen = last_seen or created_at
+        self.occurrences = occurrences
+        self.resolved_at: Optional[datetime] = None
+        self.persisted_at = self.last_seen  # 最近一次写库时间
+
+    @property
+    def alert_key(self) -> str:
+        return f"{self.site_no}:{self.alert_type}:{self.target}:{self.created_at:%Y%m%d%H%M%S}"
+
+    def to_row(self) -> Dict:
+        """转换为待写库的行"""
+        return {
+            "alert_key": self.alert_key,
+            "site_no": self.site_no,
+            "alert_type": self.alert_type,
+            "target": self.target,
+            "message": self.message,
+            "severity": self.severity,
+            "status": STATUS_RESOLVED if self.resolved_at else STATUS_ACTIVE,
+            "occurrences": self.occurrences,
+            "created_at": self.created_at,
+            "last_seen": self.last_seen,
+            "resolved_at": self.resolved_at
+        }
+
+
+class AlertTracker:
+    """
+    有状态告警：按 (场站, 告警类型, 告警对象) 去重
+    - 首次触发时创建告警，之后只累计次数和最近触发时间
+    - 超过resolve_after未再触发时自动恢复
+    - 恢复后suppress_window内再次触发视为同一告警重新打开，避免抖动产生大量告警
+    - 返回需要写库的行：新建/恢复立即写，持续中的告警最多每update_interval写一次
+    """
+
+    def __init__(self, resolve_after: float, update_interval: float, suppress_window: float):
+        self.resolve_after = timedelta(seconds=resolve_after)
+        self.update_interval = timedelta(seconds=update_interval)
+        self.suppress_window = timedelta(seconds=suppress_window)
+        self.active: Dict[AlertKey, TrackedAlert] = {}
+        self._recently_resolved: Dict[AlertKey, TrackedAlert] = {}
+
+        # 告警指标
+        self.opened = 0
+        self.reopened = 0
+        self.resolved = 0
+        self.suppressed = 0  # 已存在告警的重复触发次数
+
+    def restore(self, alerts: Iterable[AlertMessage]):
+        """恢复数据库中未恢复的告警（服务启动或接管场站时），已跟踪的告警保持不变"""
+        for alert in alerts:
+            self.active.setdefault((alert.site_no, alert.alert_type, alert.target), TrackedAlert(
+                alert.site_no, alert.alert_type, alert.target, alert.message, alert.severity,
+                alert.created_at, alert.occurrences, alert.last_seen
+            ))
+
+    def release(self, keep: Callable[[str], bool]) -> int:
+        """停止跟踪不再负责的场站的告警（由新负责节点继续跟踪和恢复）"""
+        released = 0
+        for tracked_alerts in (self.active, self._recently_resolved):
+            for key in [key for key in tracked_alerts if not keep(key[0])]:
+                del tracked_alerts[key]
+                released += 1
+        return released
+
+    def observe(self, triggered: Iterable[TriggeredAlert], now: datetime) -> List[Dict]:
+        """登记本次触发的告警"""
+        rows = []
+        for alert in triggered:
+            key = (alert.site_no, alert.alert_type, alert.target)
+            tracked = self.active.get(key)
+            if tracked is not None:
+                tracked.occurrences += 1
+                tracked.last_seen = now
+                tracked.message = alert.message
+                self.suppressed += 1
+                if now - tracked.persisted_at >= self.update_interval:
+                    tracked.persisted_at = now
+                    rows.append(tracked.to_row())
+                continue
+
+            tracked = self._recently_resolved.pop(key, None)
+            if tracked is not None and now - tracked.resolved_at <= self.suppress_window:
+                tracked.resolved_at = None
+                tracked.occurrences += 1
+                tracked.last_seen = now
+                tracked.message = alert.message
+                self.reopened += 1
+            else:
+                tracked = TrackedAlert(
+                    alert.site_no, alert.alert_type, alert.target, alert.message, alert.severity, now
+                )
+                self.opened += 1
+                logger.warning(f"创建告警: {alert.message}")
+            tracked.persisted_at = now
+            self.active[key] = tracked
+            rows.append(tracked.to_row())
+        return rows
+
+    def resolve_stale(self, now: datetime) -> List[Dict]:
+        """恢复超过resolve_after未再触发的告警"""
+        rows = []
+        for key, tracked in list(self.active.items()):
+            if now - tracked.last_seen < self.resolve_after:
+                continue
+            del self.active[key]
+            tracked.resolved_at = now
+            tracked.persisted_at = now
+            self._recently_resolved[key] = tracked
+            self.resolved += 1
+            logger.info(f"告警恢复: {tracked.message}")
+            rows.append(tracked.to_row())
+
+        # 清理超过抑制窗口的已恢复告警
+        for key, tracked in list(self._recently_resolved.items()):
+            if now - tracked.resolved_at > self.suppress_window:
+                del self._recently_resolved[key]
+        return rows
+
+    def stats(self) -> Dict:
+        """告警指标"""
+        return {
+            "active": len(self.active),
+            "opened": self.opened,
+            "reopened": self.reopened,
+            "resolved": self.resolved,
+            "suppressed": self.suppressed
+        }
@@ -1,97 +1,222 @@
-from datetime import datetime
-from typing import Dict, List
+import asyncio
+import math
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
 
-from app.models.schemas import PowerData
+from app.core.config import settings
+from app.models.schemas import PowerData, VehicleData, PlugStatus
+from app.services.allocation import (
+    ChargerArrays, ExactAllocator, SiteAllocation, allocate_greedy, TASK_TYPE_INTELLIGENT
+)
+from app.services.charger_state import ChargerStateStore, get_site_charger_states
+from app.services.charging_curve import ChargingCurveModel
+from app.services.scheduler import OptimizationScheduler, PRIORITY_DEMAND, PRIORITY_NORMAL
+from app.services.solver_pool import SolverPool
+from app.services.vehicle_library import UNKNOWN_MODEL, VehicleFingerprintIndex
+from app.utils.cache import TTLCache
 from app.utils.logger import logger
 
 
 class VehicleRecognition:
-    def recognize(self, **kwargs) -> str:
+    def __init__(self):
+        self.library = VehicleFingerprintIndex(settings.VEHICLE_NEIGHBORS, settings.VEHICLE_MAX_DISTANCE)
+        self.cache = TTLCache(settings.VEHICLE_CACHE_SIZE, settings.VEHICLE_CACHE_TTL)  # mac地址 -> 车型
+
+    def recognize(self, mac_addr: str = None, **kwargs) -> str:
         """车型识别算法"""
         try:
-            # 基于电压、电流、功率和容量特征进行识别
-            voltage = kwargs.get('voltage')
-            current = kwargs.get('current')
-            power = kwargs.get('power')
-            capacity = kwargs.get('capacity')
-
-            # 实现车型识别逻辑
-            # 这里需要根据具体的识别算法来实现
-            return "default_model"  # 临时返回默认值
+            return self.recognize_batch([dict(kwargs, mac_addr=mac_addr)])[0]
 
         except Exception as e:
             logger.error(f"车型识别失败: {str(e)}")
             raise
 
+    def recognize_batch(self, vehicles: List[Dict]) -> List[str]:
+        """
+        批量车型识别：同一车辆（mac地址）优先使用缓存，
+        其余基于电压、电流、功率和容量特征在指纹库中一次kNN查询
+        """
+        try:
+            models: List[Optional[str]] = [
+                self.cache.get(vehicle['mac_addr']) if vehicle.get('mac_addr') else None
+                for vehicle in vehicles
+            ]
+            misses = [i for i, model in enumerate(models) if model is None]
+            if misses:
+                matched = self.library.classify([
+                    [
+                        vehicles[i].get('voltage'),
+                        vehicles[i].get('current'),
+                        vehicles[i].get('power'),
+                        vehicles[i].get('capacity')
+                    ]
+                    for i in misses
+                ])
+                for i, model in zip(misses, matched):
+                    models[i] = model
+                    mac_addr = vehicles[i].get('mac_addr')
+                    # 未知车型不缓存，指纹库更新后可重新识别
+                    if mac_addr and model != UNKNOWN_MODEL:
+                        self.cache.put(mac_addr, model)
+            return models
+
+        except Exception as e:
+            logger.error(f"批量车型识别失败: {str(e)}")
+            raise
+
 
 class PowerPrediction:
+    def __init__(self, targets: List[float] = None):
+        self.target_socs = list(settings.PREDICTION_TARGET_SOCS if targets is None else targets)
+        self.curves = ChargingCurveModel(self.target_socs)
+        self.vehicles: Dict[str, Tuple[Optional[str], Optional[float]]] = {}  # 充电中的枪: (车型, 电池容量)
+
+    def set_vehicle(self, charger_sn: str, model: Optional[str], capacity: Optional[float]):
+        """登记充电枪当前车辆的车型识别结果"""
+        self.vehicles[charger_sn] = (model, capacity)
+
+    def end_session(self, charger_sn: str):
+        """拔枪后清除车辆信息"""
+        self.vehicles.pop(charger_sn, None)
+
     def predict(self, power_data: PowerData) -> List[Dict]:
         """功率预测算法"""
         try:
-            predictions = []
-            current_soc = power_data.soc
-
-            # 预测80%和90%SOC点的功率
-            for target_soc in [80, 90]:
-                if current_soc < target_soc:
-                    # 计算预计充电时间和功率
-                    time_to_target = self._calculate_charging_time(
-                        current_soc,
-                        target_soc,
-                        power_data.power,
-                        power_data.capacity
-                    )
-                    predicted_power = self._estimate_power(
-                        power_data.power,
-                        current_soc,
-                        target_soc
-                    )
-
-                    predictions.append({
-                        'target_soc': target_soc,
-                        'time': time_to_target,
-                        'power': predicted_power
-                    })
-
-            return predictions
+            model, capacity = self.vehicles.get(power_data.charger_sn, (None, None))
+            points = self.curves.predict_one(
+                power_data.soc,
+                power_data.power,
+                power_data.capacity or capacity,
+                model
+            )
+            return self._to_predictions(
+                power_data.soc,
+                [time_to_target for time_to_target, _ in points],
+                [predicted_power for _, predicted_power in points]
+            )
 
         except Exception as e:
             logger.error(f"功率预测失败: {str(e)}")
             raise
 
-    def _calculate_charging_time(
-            self,
-            current_soc: float,
-            target_soc: float,
-            current_power: float,
-            capacity: float
-    ) -> float:
-        """计算充电时间"""
-        soc_diff = target_soc - current_soc
-        energy_needed = (capacity * soc_diff) / 100
-        return energy_needed / current_power
-
-    def _estimate_power(
-            self,
-            current_power: float,
-            current_soc: float,
-            target_soc: float
-    ) -> float:
-        """估算目标SOC点的功率"""
-        # 简化模型，实际应该基于更复杂的充电曲线
-        power_decay_rate = 0.95  # 假设每10%SOC功率降低5%
-        soc_segments = (target_soc - current_soc) / 10
-        return current_power * (power_decay_rate ** soc_segments)
+    def predict_chargers(self, state_store: ChargerStateStore, charger_sns: List[str]) -> List[Dict]:
+        """按实时状态批量预测多把充电中的枪，一次向量化计算"""
+        try:
+            charger_sns, soc, power = state_store.charging(charger_sns)
+            if not charger_sns:
+                return []
+            vehicles = [self.vehicles.get(charger_sn, (None, None)) for charger_sn in charger_sns]
+            times, powers = self.curves.predict_batch(
+                soc,
+                power,
+                [capacity for _, capacity in vehicles],
+                [model for model, _ in vehicles]
+            )
+            return [
+                {
+                    'charger_sn': charger_sn,
+                    'soc': current_soc,
+                    'power': current_power,
+                    'predictions': self._to_predictions(current_soc, charger_times, charger_powers)
+                }
+                for charger_sn, current_soc, current_power, charger_times, charger_powers in zip(
+                    charger_sns, soc.tolist(), power.tolist(), times.tolist(), powers.tolist()
+                )
+            ]
+
+        except Exception as e:
+            logger.error(f"批量功率预测失败: {str(e)}")
+            raise
+
+    def _to_predictions(self, current_soc: float, times, powers) -> List[Dict]:
+        """转换为各目标SOC点的预测结果，无法预测的值为None"""
+        predictions = []
+        for target_soc, time_to_target, predicted_power in zip(self.target_socs, times, powers):
+            if current_soc < target_soc:
+                predictions.append({
+                    'target_soc': target_soc,
+                    'time': None if math.isnan(time_to_target) else float(time_to_target),
+                    'power': None if math.isnan(predicted_power) else float(predicted_power)
+                })
+        return predictions
 
 
 class PowerOptimization:
+    def __init__(self, pool: SolverPool = None):
+        self.solver = ExactAllocator()
+        self.pool = pool  # 配置时智能分配在求解进程池中执行
+
     def optimize(
             self,
             site_info: Dict,
-            charger_states: List[Dict]
+            charger_states: List[Dict],
+            task_type: int = None
     ) -> List[Dict]:
         """功率优化分配算法"""
         try:
+            task_type = settings.OPTIMIZATION_TASK_TYPE if task_type is None else task_type
+            optimized_powers = None
+
+            if task_type == TASK_TYPE_INTELLIGENT:
+                # 智能分配，求解失败或超时回退到快速分配
+                optimized_powers = self._calculate_exact_distribution(
+                    site_info,
+                    charger_states
+                )
+
+            return self._build_profiles(site_info, charger_states, task_type, optimized_powers)
+
+        except Exception as e:
+            logger.error(f"功率优化失败: {str(e)}")
+            raise
+
+    async def optimize_async(
+            self,
+            site_info: Dict,
+            charger_states: List[Dict],
+            task_type: int = None
+    ) -> List[Dict]:
+        """功率优化分配算法，智能分配在求解进程池中执行，进程池饱和或超时时回退到快速分配"""
+        if self.pool is None:
+            return self.optimize(site_info, charger_states, task_type)
+        try:
+            task_type = settings.OPTIMIZATION_TASK_TYPE if task_type is None else task_type
+            optimized_powers = None
+
+            if task_type == TASK_TYPE_INTELLIGENT:
+                chargers = ChargerArrays.from_states(charger_states)
+                new_powers = await self.pool.allocate_exact(
+                    chargers,
+                    self._site_limit(site_info),
+                    self.solver
+                )
+                if new_powers is not None:
+                    optimized_powers = dict(zip(chargers.charger_sn, new_powers.tolist()))
+
+            return self._build_profiles(site_info, charger_states, task_type, optimized_powers)
+
+        except Exception as e:
+            logger.error(f"功率优化失败: {str(e)}")
+            raise
+
+    def _build_profiles(
+            self,
+            site_info: Dict,
+            charger_states: List[Dict],
+            task_type: int,
+            optimized_powers: Optional[Dict[str, float]]
+    ) -> List[Dict]:
+        """由智能分配结果生成调整方案，智能分配无结果时按快速分配计算"""
+        if task_type == TASK_TYPE_INTELLIGENT:
+            if optimized_powers is None:
+                logger.warning(f"场站 {site_info.get('site_no')} 智能分配失败，回退快速分配")
+            elif all(
+                    optimized_powers[state['charger_sn']] == state['current_power']
+                    for state in charger_states
+            ):
+                return charger_states  # 无需调整
+
+        if optimized_powers is None:
             total_current_power = sum(
                 state['current_power'] for state in charger_states
             )
@@ -107,20 +232,35 @@ class PowerOptimization:
                 power_reduction
             )
 
-            # 生成调整方案
-            profiles = []
-            for charger_sn, new_power in optimized_powers.items():
-                profiles.append({
-                    'charger_sn': charger_sn,
-                    'power': new_power,
-                    'timestamp': datetime.utcnow().isoformat()
-                })
+        # 生成调整方案
+        profiles = []
+        for charger_sn, new_power in optimized_powers.items():
+            profiles.append({
+                'charger_sn': charger_sn,
+                'power': new_power,
+                'timestamp': datetime.utcnow().isoformat()
+            })
 
-            return profiles
+        return profiles
 
-        except Exception as e:
-            logger.error(f"功率优化失败: {str(e)}")
-            raise
+    @staticmethod
+    def _site_limit(site_info: Dict) -> float:
+        return min(
+            site_info['demand'],
+            site_info.get('total_power_limit') or float('inf')
+        )
+
+    def _calculate_exact_distribution(
+            self,
+            site_info: Dict,
+            charger_states: List[Dict]
+    ) -> Optional[Dict[str, float]]:
+        """精确求解功率分配，满足群组、桩、模块约束"""
+        chargers = ChargerArrays.from_states(charger_states)
+        new_powers = self.solver.allocate(chargers, self._site_limit(site_info))
+        if new_powers is None:
+            return None
+        return dict(zip(chargers.charger_sn, new_powers.tolist()))
 
     def _calculate_optimal_distribution(
             self,
@@ -128,35 +268,277 @@ class PowerOptimization:
             power_reduction: float
     ) -> Dict[str, float]:
         """计算最优功率分配"""
-        # 按功率从大到小排序
-        sorted_chargers = sorted(
-            charger_states,
-            key=lambda x: x['current_power'],
-            reverse=True
+        chargers = ChargerArrays.from_states(charger_states)
+        new_powers = allocate_greedy(chargers.current_power, power_reduction)
+        return dict(zip(chargers.charger_sn, new_powers.tolist()))
+
+
+class AlgorithmService:
+    def __init__(self, db_service, kafka_service, state_store: ChargerStateStore = None, shards=None):
+        self.db_service = db_service
+        self.kafka_service = kafka_service
+        self.shards = shards  # ShardCoordinator，多节点部署时只处理本节点负责的场站
+        self.state_store = state_store or ChargerStateStore()  # 充电枪实时状态，由Kafka消息更新
+        self.vehicle_recognition = VehicleRecognition()
+        self.power_prediction = PowerPrediction()
+        self.solver_pool = SolverPool(
+            settings.SOLVER_POOL_WORKERS,
+            settings.SOLVER_POOL_MAX_PENDING,
+            settings.SOLVER_POOL_TIMEOUT,
+            settings.SOLVER_POOL_START_METHOD
+        ) if settings.OPTIMIZATION_EXECUTOR == "process" else None
+        self.power_optimization = PowerOptimization(self.solver_pool)
+        self.allocations: Dict[str, SiteAllocation] = {}  # 场站最近一次下发的分配结果
+        self.scheduler = OptimizationScheduler(
+            self._run_power_optimization,
+            settings.OPTIMIZATION_INTERVAL,
+            settings.OPTIMIZATION_WORKERS,
+            db_service,
+            shards,
+            settings.SHARD_TASK_POLL_INTERVAL,
+            settings.DEMAND_MIN_INTERVAL
         )
+        if shards is not None:
+            shards.add_listener(self._on_rebalance)
+        self._refresh_tasks: List[asyncio.Task] = []
 
-        adjustments = {}
-        remaining_reduction = power_reduction
+    async def start(self):
+        """启动算法服务：恢复未完成的优化任务，加载充电曲线和车型指纹库并定时重新加载"""
+        if self.solver_pool is not None:
+            await self.solver_pool.start()
+        await self.scheduler.start()
+        self._refresh_tasks = [
+            asyncio.create_task(self._refresh_loop(
+                self.refresh_charging_curves, settings.CHARGING_CURVE_REFRESH_INTERVAL, "充电曲线"
+            )),
+            asyncio.create_task(self._refresh_loop(
+                self.refresh_vehicle_library, settings.VEHICLE_LIBRARY_REFRESH_INTERVAL, "车型指纹库"
+            ))
+        ]
 
-        for charger in sorted_chargers:
-            current_power = charger['current_power']
-            min_power = current_power * 0.7  # 最大下调30%
+    async def stop(self):
+        """停止算法服务"""
+        for task in self._refresh_tasks:
+            task.cancel()
+        await self.scheduler.stop()
+        if self.solver_pool is not None:
+            await self.solver_pool.stop()
 
-            if remaining_reduction <= 0:
-                adjustments[charger['charger_sn']] = current_power
-                continue
+    def get_metrics(self) -> Dict:
+        """优化执行与求解指标"""
+        return {
+            "optimization": self.scheduler.stats(),
+            "solver_pool": self.solver_pool.stats() if self.solver_pool else None,
+            "shards": self.shards.stats() if self.shards else None
+        }
 
-            # 计算可调整量
-            max_adjustment = current_power - min_power
-            actual_adjustment = min(max_adjustment, remaining_reduction)
+    def owns(self, site_no: str) -> bool:
+        """场站是否由本节点负责"""
+        return self.shards is None or self.shards.owns(site_no)
 
-            # 如果调整小于10%，不计入影响
-            if actual_adjustment / current_power < 0.1:
-                adjustments[charger['charger_sn']] = current_power
-                continue
+    async def _on_rebalance(self):
+        """分片变化：放弃不再负责的场站的待执行优化和增量分配状态"""
+        released = self.scheduler.release()
+        for site_no in [site_no for site_no in self.allocations if not self.owns(site_no)]:
+            del self.allocations[site_no]
+        # 新接管场站的拓扑可能已由其他节点更新
+        self.db_service.topology_cache.clear()
+        logger.info(f"分片重新划分完成，放弃待执行优化: {released}, 保留增量分配场站: {len(self.allocations)}")
 
-            new_power = current_power - actual_adjustment
-            adjustments[charger['charger_sn']] = new_power
-            remaining_reduction -= actual_adjustment
+    async def refresh_charging_curves(self) -> int:
+        """由历史充电记录重新拟合各车型充电曲线"""
+        since = datetime.utcnow() - timedelta(days=settings.CHARGING_CURVE_LOOKBACK_DAYS)
+        rows = await self.db_service.get_charging_curve_samples(since)
+        return self.power_prediction.curves.load(
+            rows,
+            settings.CHARGING_CURVE_MIN_SAMPLES,
+            settings.CHARGING_CURVE_MIN_BINS
+        )
 
-        return adjustments
\ No newline at end of file
+    async def refresh_vehicle_library(self) -> int:
+        """重新加载车型指纹库，并对此前未识别出的车辆批量补识别"""
+        rows = await self.db_service.get_vehicle_fingerprints(settings.VEHICLE_LIBRARY_SIZE)
+        self.vehicle_recognition.library.load(rows)
+        if self.shards is not None and not self.shards.is_leader:
+            return 0  # 补识别写库只由一个节点执行
+        return len(await self.recognize_pending())
+
+    async def recognize_pending(self, limit: int = None) -> Dict[str, str]:
+        """一次批量识别数据库中未识别出车型的充电任务"""
+        pending = await self.db_service.get_pending_vehicles(limit or settings.VEHICLE_PENDING_BATCH_SIZE)
+        if not pending:
+            return {}
+        models = self.vehicle_recognition.recognize_batch([
+            {
+                'mac_addr': vehicle['mac_addr'],
+                'voltage': vehicle['max_voltage'],
+                'current': vehicle['max_current'],
+                'power': vehicle['max_power'],
+                'capacity': vehicle['capacity']
+            }
+            for vehicle in pending
+        ])
+        recognized = {
+            vehicle['session_id']: model
+            for vehicle, model in zip(pending, models)
+            if model != UNKNOWN_MODEL
+        }
+        await self.db_service.update_vehicle_models(recognized)
+        logger.info(f"未识别车辆补识别完成: {len(recognized)}/{len(pending)}")
+        return recognized
+
+    async def _refresh_loop(self, refresh, interval: float, name: str):
+        """定时重新加载模型，失败时保留上次加载的结果"""
+        while True:
+            try:
+                await refresh()
+            except Exception as e:
+                logger.error(f"加载{name}失败: {str(e)}")
+            if interval <= 0:
+                return
+            await asyncio.sleep(interval)
+
+    async def process_vehicle_data(self, vehicle_data: VehicleData):
+        """处理车型识别数据"""
+        model = self.vehicle_recognition.recognize(
+            mac_addr=vehicle_data.mac_addr,
+            voltage=vehicle_data.voltage,
+            current=vehicle_data.current,
+            power=vehicle_data.power,
+            capacity=vehicle_data.capacity
+        )
+        await self.db_service.save_vehicle_model(
+            vehicle_data,
+            None if model == UNKNOWN_MODEL else model
+        )
+        self.power_prediction.set_vehicle(vehicle_data.charger_sn, model, vehicle_data.capacity)
+        logger.info(f"车型识别完成: {vehicle_data.session_id}, {model}")
+        return model
+
+    async def process_power_data(self, power_data: PowerData) -> List[Dict]:
+        """处理功率预测数据"""
+        await self.db_service.add_charging_record(power_data, self.state_store.site_of(power_data.charger_sn))
+        return self.power_prediction.predict(power_data)
+
+    async def predict_site(self, site_no: str) -> List[Dict]:
+        """批量预测场站全部充电中的枪"""
+        topology = await self.db_service.get_site_topology(site_no)
+        if topology is None:
+            return []
+        return self.power_prediction.predict_chargers(
+            self.state_store,
+            [charger['charger_sn'] for charger in topology.chargers]
+        )
+
+    async def process_plug_status(self, plug_status: PlugStatus):
+        """处理插拔枪状态，增量或全量重新分配所在场站功率"""
+        if plug_status.status == 'UNPLUGGED':
+            self.db_service.record_unplug(plug_status.charger_sn, plug_status.timestamp)
+            self.power_prediction.end_session(plug_status.charger_sn)
+
+        site_no = plug_status.site_no
+        if not site_no:
+            logger.warning(f"插拔枪消息缺少场站信息: {plug_status.charger_sn}")
+            return
+
+        allocation = self.allocations.get(site_no)
+        if settings.OPTIMIZATION_INCREMENTAL and allocation is not None:
+            if plug_status.status == 'UNPLUGGED':
+                allocation.remove_charger(plug_status.charger_sn)
+                if await self._rebalance(site_no, allocation):
+                    return
+            elif plug_status.status == 'PLUGGED' and plug_status.power is not None:
+                allocation.add_charger({
+                    'charger_sn': plug_status.charger_sn,
+                    'current_power': plug_status.power
+                })
+                if await self._rebalance(site_no, allocation):
+                    return
+
+        await self.trigger_power_optimization(site_no)
+
+    async def update_site_demand(self, site_no: str, demand: float, total_power_limit: float = None):
+        """场站需求变化：有历史分配时增量调整，否则全量优化"""
+        allocation = self.allocations.get(site_no)
+        if settings.OPTIMIZATION_INCREMENTAL and allocation is not None:
+            site_limit = min(demand, total_power_limit or float('inf'))
+            if await self._rebalance(site_no, allocation, site_limit):
+                return
+        await self.trigger_power_optimization(site_no, priority=PRIORITY_DEMAND)
+
+    async def _rebalance(self, site_no: str, allocation: SiteAllocation, site_limit: float = None) -> bool:
+        """增量重分配并只下发变化的配置，无法增量时返回False"""
+        changes = allocation.rebalance(site_limit)
+        if changes is None:
+            # 增量结果不可用，丢弃缓存等待全量重算
+            self.allocations.pop(site_no, None)
+            return False
+        await self._publish_changes(site_no, changes)
+        logger.info(f"场站 {site_no} 增量功率分配完成，变化数量: {len(changes)}")
+        return True
+
+    async def _publish_changes(self, site_no: str, changes: Dict[str, float]):
+        """下发功率变化的充电枪配置"""
+        if not changes:
+            return
+        timestamp = datetime.utcnow().isoformat()
+        await self.kafka_service.publish_batch_profiles(
+            [
+                {'charger_sn': charger_sn, 'power': power, 'timestamp': timestamp}
+                for charger_sn, power in changes.items()
+            ],
+            site_no=site_no
+        )
+
+    async def trigger_power_optimization(
+            self,
+            site_no: str,
+            task_type: int = None,
+            priority: int = PRIORITY_NORMAL
+    ) -> Optional[int]:
+        """触发场站功率优化（按场站合并，由优化执行器异步执行），返回优化任务ID"""
+        return await self.scheduler.schedule(site_no, priority, task_type)
+
+    async def _run_power_optimization(self, site_no: str, task_type: int = None) -> Optional[Dict]:
+        """基于场站最新状态执行功率优化并下发配置，返回写入优化任务的结果"""
+        if self.shards is not None:
+            # 场站信息可能由其他节点的HTTP请求更新，执行前重新加载拓扑
+            self.db_service.invalidate_site_topology(site_no)
+        site = await self.db_service.get_site_info(site_no)
+        if not site:
+            logger.warning(f"场站不存在，跳过功率优化: {site_no}")
+            return None
+
+        charger_states = await get_site_charger_states(self.db_service, self.state_store, site_no)
+        site_info = {
+            'site_no': site.site_no,
+            'demand': site.demand,
+            'total_power_limit': site.total_power_limit
+        }
+        profiles = await self.power_optimization.optimize_async(
+            site_info,
+            charger_states,
+            task_type
+        )
+
+        # 只下发与上次分配相比发生变化的配置
+        powers = {
+            profile['charger_sn']: profile.get('power', profile.get('current_power'))
+            for profile in profiles
+        }
+        previous = self.allocations.get(site_no)
+        changes = previous.diff(powers) if previous is not None else powers
+        await self._publish_changes(site_no, changes)
+
+        self.allocations[site_no] = SiteAllocation.from_result(
+            charger_states,
+            powers,
+            min(site.demand, site.total_power_limit or float('inf'))
+        )
+        logger.info(f"场站 {site_no} 功率优化完成，配置数量: {len(profiles)}, 下发数量: {len(changes)}")
+        return {
+            "demand": site.demand,
+            "task_type": settings.OPTIMIZATION_TASK_TYPE if task_type is None else task_type,
+            "limit_json": {"demand": site.demand, "total_power_limit": site.total_power_limit},
+            "pile_power_json": changes
+        }
@@ -0,0 +1,468 @@
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+import numpy as np
+from scipy.optimize import Bounds, LinearConstraint, milp
+from scipy.sparse import coo_matrix
+
+from app.core.config import settings
+from app.utils.logger import logger
+
+# 功率分配算法类型，对应OptimizationTask.task_type
+TASK_TYPE_INTELLIGENT = 1  # 智能分配：精确求解，最小化受影响充电枪数量
+TASK_TYPE_FAST = 2  # 快速分配：贪心
+
+
+class ChargerArrays:
+    """按列存储的充电枪状态，供向量化功率分配使用"""
+    __slots__ = (
+        'charger_sn', 'current_power', 'min_power', 'max_power', 'rated_power',
+        'pile_sn', 'group_id', 'group_power_limit', 'unit_power'
+    )
+
+    def __init__(
+            self,
+            charger_sn: List[str],
+            current_power: np.ndarray,
+            min_power: Optional[np.ndarray] = None,
+            max_power: Optional[np.ndarray] = None,
+            rated_power: Optional[np.ndarray] = None,
+            pile_sn: Optional[List[str]] = None,
+            group_id: Optional[List] = None,
+            group_power_limit: Optional[np.ndarray] = None,
+            unit_power: Optional[np.ndarray] = None
+    ):
+        size = len(charger_sn)
+        self.charger_sn = charger_sn
+        self.current_power = np.asarray(current_power, dtype=np.float64)
+        self.min_power = _column(min_power, size, 0.0)
+        self.max_power = _column(max_power, size, np.inf)
+        self.rated_power = _column(rated_power, size, np.inf)  # 所属桩额定功率
+        self.pile_sn = pile_sn if pile_sn is not None else [None] * size
+        self.group_id = group_id if group_id is not None else [None] * size
+        self.group_power_limit = _column(group_power_limit, size, np.inf)
+        self.unit_power = _column(unit_power, size, 0.0)  # 模块功率粒度，0表示不限
+
+    @classmethod
+    def from_states(cls, charger_states: List[Dict]) -> 'ChargerArrays':
+        """由充电枪状态列表构造"""
+        size = len(charger_states)
+
+        def column(key: str, default: float) -> np.ndarray:
+            return np.fromiter(
+                (_or_default(state.get(key), default) for state in charger_states),
+                dtype=np.float64,
+                count=size
+            )
+
+        return cls(
+            charger_sn=[state['charger_sn'] for state in charger_states],
+            current_power=column('current_power', 0.0),
+            min_power=column('min_power', 0.0),
+            max_power=column('max_power', np.inf),
+            rated_power=column('rated_power', np.inf),
+            pile_sn=[state.get('pile_sn') for state in charger_states],
+            group_id=[state.get('group_id') for state in charger_states],
+            group_power_limit=column('group_power_limit', np.inf),
+            unit_power=column('unit_power', 0.0)
+        )
+
+    def take(self, indices) -> 'ChargerArrays':
+        """按下标选取子集"""
+        indices = np.asarray(indices, dtype=np.intp)
+        return ChargerArrays(
+            charger_sn=[self.charger_sn[i] for i in indices],
+            current_power=self.current_power[indices],
+            min_power=self.min_power[indices],
+            max_power=self.max_power[indices],
+            rated_power=self.rated_power[indices],
+            pile_sn=[self.pile_sn[i] for i in indices],
+            group_id=[self.group_id[i] for i in indices],
+            group_power_limit=self.group_power_limit[indices],
+            unit_power=self.unit_power[indices]
+        )
+
+    def concat(self, other: 'ChargerArrays') -> 'ChargerArrays':
+        """拼接两组充电枪"""
+        return ChargerArrays(
+            charger_sn=self.charger_sn + other.charger_sn,
+            current_power=np.concatenate([self.current_power, other.current_power]),
+            min_power=np.concatenate([self.min_power, other.min_power]),
+            max_power=np.concatenate([self.max_power, other.max_power]),
+            rated_power=np.concatenate([self.rated_power, other.rated_power]),
+            pile_sn=self.pile_sn + other.pile_sn,
+            group_id=self.group_id + other.group_id,
+            group_power_limit=np.concatenate([self.group_power_limit, other.group_power_limit]),
+            unit_power=np.concatenate([self.unit_power, other.unit_power])
+        )
+
+    def __len__(self):
+        return len(self.charger_sn)
+
+
+def allocate_greedy(
+        current_power: np.ndarray,
+        power_reduction: float,
+        min_power: Optional[np.ndarray] = None,
+        max_decrease: float = None,
+        min_impact: float = None
+) -> np.ndarray:
+    """
+    向量化贪心功率分配，结果与逐个充电枪的贪心循环一致
+    - 按当前功率从大到小依次下调，单枪最多下调max_decrease
+    - 下调比例低于min_impact的充电枪不调整，也不计入削减量
+    - 指定min_power时，下调后不低于充电枪下限
+    返回与输入顺序一致的新功率
+    """
+    max_decrease = settings.MAX_POWER_REDUCTION if max_decrease is None else max_decrease
+    min_impact = settings.MIN_POWER_IMPACT if min_impact is None else min_impact
+
+    power = np.asarray(current_power, dtype=np.float64)
+    new_power = power.copy()
+    if power.size == 0 or power_reduction <= 0:
+        return new_power
+
+    # 按功率从大到小排序（稳定排序，功率相同时保持输入顺序）
+    order = np.argsort(-power, kind='stable')
+    sorted_power = power[order]
+    floor = sorted_power * (1 - max_decrease)
+    if min_power is not None:
+        floor = np.maximum(floor, np.asarray(min_power, dtype=np.float64)[order])
+    capacity = np.maximum(sorted_power - floor, 0.0)
+
+    # 可调整量本身不足影响阈值的充电枪永远不会被调整，提前剔除
+    with np.errstate(divide='ignore', invalid='ignore'):
+        adjustable = (sorted_power > 0) & ~(capacity / sorted_power < min_impact)
+    candidates = np.flatnonzero(adjustable)
+    cand_power = sorted_power[candidates]
+    cand_capacity = capacity[candidates]
+
+    reduction = np.zeros(candidates.size)
+    remaining = float(power_reduction)
+    start = 0
+    # 每一轮：跳过剩余削减量不足影响阈值的充电枪，再从第一个可调整的开始连续整档下调；
+    # 剩余量每轮至少缩小为原来的1/3，轮数与充电枪数量无关
+    while remaining > 0 and start < candidates.size:
+        actual = np.minimum(cand_capacity[start:], remaining)
+        eligible = np.flatnonzero(~(actual / cand_power[start:] < min_impact))
+        if eligible.size == 0:
+            break
+        first = start + eligible[0]
+
+        # 与逐个相减的顺序一致，保证浮点结果完全相同
+        remaining_seq = np.subtract.accumulate(
+            np.concatenate(([remaining], cand_capacity[first:]))
+        )
+        full = np.flatnonzero(remaining_seq[1:] < 0)
+        count = full[0] if full.size else candidates.size - first
+        reduction[first:first + count] = cand_capacity[first:first + count]
+        remaining = remaining_seq[count]
+        start = first + count
+        if remaining <= 0 or start >= candidates.size:
+            break
+
+        # 剩余量不足一整档：满足影响阈值则部分下调后结束，否则跳过该充电枪
+        if not remaining / cand_power[start] < min_impact:
+            reduction[start] = remaining
+            remaining = 0.0
+            break
+        start += 1
+
+    sorted_new = sorted_power.copy()
+    sorted_new[candidates] = cand_power - reduction
+    new_power[order] = sorted_new
+    return new_power
+
+
+class ExactAllocator:
+    """
+    精确功率分配（混合整数规划，HiGHS本地求解）
+    - 目标：最小化受影响充电枪数量，其次尽量少削减功率、少下发配置
+    - 约束：场站需求/总功率上限、群组上限、桩额定功率、
+            充电枪上下限、单枪最多下调max_decrease、模块功率粒度
+    - 下调比例低于min_impact的充电枪不计入影响
+    达到时间预算时使用当前可行解，无可行解时返回None，由调用方回退到贪心分配
+    """
+
+    def __init__(
+            self,
+            time_limit: float = None,
+            max_decrease: float = None,
+            min_impact: float = None
+    ):
+        self.time_limit = settings.OPTIMIZATION_TIME_BUDGET if time_limit is None else time_limit
+        self.max_decrease = settings.MAX_POWER_REDUCTION if max_decrease is None else max_decrease
+        self.min_impact = settings.MIN_POWER_IMPACT if min_impact is None else min_impact
+
+    def allocate(
+            self,
+            chargers: ChargerArrays,
+            site_limit: float,
+            time_limit: float = None
+    ) -> Optional[np.ndarray]:
+        """求解新功率，返回与输入顺序一致的数组"""
+        n = len(chargers)
+        if n == 0:
+            return np.zeros(0)
+        time_limit = self.time_limit if time_limit is None else time_limit
+        start = time.perf_counter()
+
+        power = chargers.current_power
+        upper = np.minimum(power, chargers.max_power)
+        lower = np.minimum(
+            np.maximum(power * (1 - self.max_decrease), chargers.min_power),
+            upper
+        )
+        # 下调后功率高于free_lower时不计入影响
+        free_lower = power * (1 - self.min_impact) + 1e-6
+
+        # 有模块粒度的充电枪按整数个模块分配，否则连续取值
+        granular = chargers.unit_power > 0
+        scale = np.where(granular, chargers.unit_power, 1.0)
+        k_upper = np.where(granular, np.floor(upper / scale + 1e-9), upper)
+        k_lower = np.where(granular, np.ceil(lower / scale - 1e-9), lower)
+        affect_span = np.maximum(free_lower - k_lower * scale, 0.0)
+
+        # 变量: [c(是否下发新功率), a(是否受影响), k(新功率/粒度)]
+        # 新功率 x = p - p*c + scale*k
+        idx = np.arange(n)
+        c_col, a_col, k_col = idx, idx + n, idx + 2 * n
+
+        rows, cols, vals, row_lower, row_upper = [], [], [], [], []
+        row = 0
+
+        def add_rows(count, entries, lb, ub):
+            nonlocal row
+            for col_index, coefs in entries:
+                rows.append(row + np.arange(count))
+                cols.append(col_index)
+                vals.append(coefs)
+            row_lower.append(lb)
+            row_upper.append(ub)
+            row += count
+
+        # 未下发时k=0，下发时k在[k_lower, k_upper]内
+        add_rows(n, [(k_col, np.ones(n)), (c_col, -k_upper)], np.full(n, -np.inf), np.zeros(n))
+        add_rows(n, [(k_col, np.ones(n)), (c_col, -k_lower)], np.zeros(n), np.full(n, np.inf))
+        # 影响判定: x + affect_span*a >= free_lower
+        add_rows(
+            n,
+            [(c_col, -power), (k_col, scale), (a_col, affect_span)],
+            free_lower - power,
+            np.full(n, np.inf)
+        )
+
+        # 功率上限约束: sum(x) <= limit，即 sum(-p*c + scale*k) <= limit - sum(p)
+        limits = [(idx, site_limit)]
+        for members, limit in _member_limits(chargers):
+            limits.append((members, limit))
+        for members, limit in limits:
+            if not np.isfinite(limit):
+                continue
+            count = len(members)
+            rows.append(np.full(count, row))
+            cols.append(c_col[members])
+            vals.append(-power[members])
+            rows.append(np.full(count, row))
+            cols.append(k_col[members])
+            vals.append(scale[members])
+            row_lower.append([-np.inf])
+            row_upper.append([limit - power[members].sum()])
+            row += 1
+
+        matrix = coo_matrix(
+            (np.concatenate(vals), (np.concatenate(rows), np.concatenate(cols))),
+            shape=(row, 3 * n)
+        ).tocsr()
+
+        total_power = max(power.sum(), 1e-9)
+        objective = np.concatenate([
+            0.5 * power / total_power + 0.25 / (n + 1),
+            np.ones(n),
+            -0.5 * scale / total_power
+        ])
+        # 超过充电枪上限的必须下发新功率
+        forced = (power > upper).astype(np.float64)
+        bounds = Bounds(
+            np.concatenate([forced, np.zeros(n), np.zeros(n)]),
+            np.concatenate([np.ones(n), np.ones(n), k_upper])
+        )
+        integrality = np.concatenate([np.ones(2 * n), granular.astype(np.float64)])
+
+        result = milp(
+            objective,
+            constraints=LinearConstraint(
+                matrix,
+                np.concatenate(row_lower),
+                np.concatenate(row_upper)
+            ),
+            integrality=integrality,
+            bounds=bounds,
+            # 次要目标的权重之和小于1，间隙小于0.5即可保证受影响数量最优
+            options={"time_limit": time_limit, "mip_rel_gap": 0.5 / (n + 1), "disp": False}
+        )
+        elapsed = time.perf_counter() - start
+        # status 1: 达到时限，HiGHS返回的可行解仍然满足全部约束
+        if result.status not in (0, 1) or result.x is None:
+            logger.warning(f"精确功率分配未求得可行解: {result.message}, 耗时{elapsed:.3f}s")
+            return None
+        if result.status == 1:
+            logger.info(f"精确功率分配达到时限，使用当前可行解, 耗时{elapsed:.3f}s")
+
+        changed = np.round(result.x[c_col]) > 0
+        units = result.x[k_col]
+        units = np.where(granular, np.round(units), units)
+        return np.where(changed, scale * units, power)
+
+
+class SiteAllocation:
+    """
+    场站最近一次下发的功率分配，用于单枪插拔、需求变化时的增量重分配
+    - chargers.current_power为各枪请求功率，allocated为已下发功率
+    - 增量结果违反桩/群组约束或削减空间不足时返回None，由调用方全量重算
+    """
+    __slots__ = ('chargers', 'allocated', 'site_limit')
+
+    def __init__(self, chargers: ChargerArrays, allocated: np.ndarray, site_limit: float):
+        self.chargers = chargers
+        self.allocated = np.asarray(allocated, dtype=np.float64)
+        self.site_limit = site_limit
+
+    @classmethod
+    def from_result(
+            cls,
+            charger_states: List[Dict],
+            powers: Dict[str, float],
+            site_limit: float
+    ) -> 'SiteAllocation':
+        """由全量优化结果构造"""
+        chargers = ChargerArrays.from_states(charger_states)
+        allocated = np.array([
+            powers.get(charger_sn, power)
+            for charger_sn, power in zip(chargers.charger_sn, chargers.current_power.tolist())
+        ])
+        return cls(chargers, allocated, site_limit)
+
+    def diff(self, powers: Dict[str, float]) -> Dict[str, float]:
+        """与已下发功率相比发生变化的充电枪"""
+        allocated = dict(zip(self.chargers.charger_sn, self.allocated.tolist()))
+        return {
+            charger_sn: power for charger_sn, power in powers.items()
+            if allocated.get(charger_sn) != power
+        }
+
+    def add_charger(self, state: Dict):
+        """插枪：加入充电枪，请求功率为state['current_power']"""
+        self.remove_charger(state['charger_sn'])
+        added = ChargerArrays.from_states([state])
+        self.chargers = self.chargers.concat(added)
+        self.allocated = np.concatenate([
+            self.allocated,
+            np.minimum(added.current_power, added.max_power)
+        ])
+
+    def remove_charger(self, charger_sn: str) -> bool:
+        """拔枪：移除充电枪"""
+        if charger_sn not in self.chargers.charger_sn:
+            return False
+        keep = [i for i, sn in enumerate(self.chargers.charger_sn) if sn != charger_sn]
+        self.chargers = self.chargers.take(keep)
+        self.allocated = self.allocated[keep]
+        return True
+
+    def rebalance(
+            self,
+            site_limit: float = None,
+            max_decrease: float = None,
+            min_impact: float = None
+    ) -> Optional[Dict[str, float]]:
+        """
+        按场站上限增量调整，返回功率发生变化的充电枪
+        - 超限：优先继续下调已受影响的充电枪，再按功率从大到小下调其他充电枪
+        - 有余量：按下调量从小到大恢复，尽量多地让充电枪恢复到请求功率
+        """
+        max_decrease = settings.MAX_POWER_REDUCTION if max_decrease is None else max_decrease
+        min_impact = settings.MIN_POWER_IMPACT if min_impact is None else min_impact
+        site_limit = self.site_limit if site_limit is None else site_limit
+        chargers = self.chargers
+
+        power = chargers.current_power
+        upper = np.minimum(power, chargers.max_power)
+        floor = np.minimum(np.maximum(power * (1 - max_decrease), chargers.min_power), upper)
+        allocated = np.clip(self.allocated, floor, upper)
+        excess = allocated.sum() - site_limit
+
+        if excess > 1e-9:
+            headroom = allocated - floor
+            if headroom.sum() < excess:
+                return None
+            with np.errstate(divide='ignore', invalid='ignore'):
+                affected = (power - allocated) / power >= min_impact
+            # 已受影响的优先（按余量从大到小），其次按请求功率从大到小
+            order = np.lexsort((-power, -headroom, ~affected))
+            allocated[order] -= _take_in_order(headroom[order], excess)
+        elif excess < -1e-9:
+            deficit = upper - allocated
+            order = np.argsort(deficit, kind='stable')
+            allocated[order] += _take_in_order(deficit[order], -excess)
+
+        # 模块粒度：向下取整到模块功率整数倍
+        granular = (chargers.unit_power > 0) & (allocated < upper)
+        allocated[granular] = (
+            np.floor(allocated[granular] / chargers.unit_power[granular] + 1e-9)
+            * chargers.unit_power[granular]
+        )
+        if (allocated < floor - 1e-6).any():
+            return None
+        for members, limit in _member_limits(chargers):
+            if allocated[members].sum() > limit + 1e-6:
+                return None
+
+        changed = np.flatnonzero(allocated != self.allocated)
+        self.allocated = allocated
+        self.site_limit = site_limit
+        return {chargers.charger_sn[i]: allocated[i].item() for i in changed}
+
+
+def _take_in_order(amounts: np.ndarray, total: float) -> np.ndarray:
+    """按顺序逐个取满amounts，直到累计达到total，最后一个部分取用"""
+    cumulative = np.cumsum(amounts)
+    before = cumulative - amounts
+    return np.clip(total - before, 0.0, amounts)
+
+
+def count_affected(current_power: np.ndarray, new_power: np.ndarray, min_impact: float = None) -> int:
+    """统计受影响充电枪数量（下调比例不低于min_impact）"""
+    min_impact = settings.MIN_POWER_IMPACT if min_impact is None else min_impact
+    current_power = np.asarray(current_power, dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = (current_power - new_power) / current_power
+    return int(np.count_nonzero(ratio >= min_impact))
+
+
+def _member_limits(chargers: ChargerArrays):
+    """按桩、群组汇总功率上限"""
+    piles = defaultdict(list)
+    groups = defaultdict(list)
+    for i, (pile_sn, group_id) in enumerate(zip(chargers.pile_sn, chargers.group_id)):
+        if pile_sn is not None:
+            piles[pile_sn].append(i)
+        if group_id is not None:
+            groups[group_id].append(i)
+    for members in piles.values():
+        members = np.asarray(members)
+        yield members, chargers.rated_power[members].min()
+    for members in groups.values():
+        members = np.asarray(members)
+        yield members, chargers.group_power_limit[members].min()
+
+
+def _column(values, size: int, default: float) -> np.ndarray:
+    if values is None:
+        return np.full(size, default)
+    return np.asarray(values, dtype=np.float64)
+
+
+def _or_default(value, default: float) -> float:
+    return default if value is None else value
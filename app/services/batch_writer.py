@@ -0,0 +1,129 @@
+import asyncio
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional
+
+from app.utils.logger import logger
+
+
+class BatchWriter:
+    """
+    批量写入缓冲
+    - 按数量或时间窗口合并为一批调用flush_fn写库
+    - 缓冲达到上限时add阻塞调用方（反压到Kafka消费协程），避免内存无限增长
+    - 写入失败的批次放回队首，下次重试
+    """
+
+    def __init__(
+            self,
+            name: str,
+            flush_fn: Callable[[List[Any]], Awaitable[None]],
+            batch_size: int,
+            interval: float,
+            max_pending: int
+    ):
+        self.name = name
+        self.flush_fn = flush_fn
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_pending = max(max_pending, batch_size)
+        self._buffer: Deque[Any] = deque()
+        self._wakeup = asyncio.Event()
+        self._not_full = asyncio.Event()
+        self._not_full.set()
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+        # 写入指标
+        self.rows_written = 0
+        self.batches = 0
+        self.failed_batches = 0
+        self.blocked_adds = 0
+        self.total_flush_latency = 0.0
+        self.max_flush_latency = 0.0
+
+    def start(self):
+        """启动后台刷写任务"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """停止后台任务并写入剩余数据"""
+        if self._task is not None:
+            # 等待进行中的批次写完再取消，避免丢失已出队的数据
+            async with self._flush_lock:
+                self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        while self._buffer:
+            if not await self.flush():
+                logger.error(f"{self.name}关闭时仍有 {len(self._buffer)} 条数据未写入")
+                break
+
+    async def add(self, row: Any):
+        """加入一条数据，缓冲已满时等待刷写"""
+        if len(self._buffer) >= self.max_pending:
+            self.blocked_adds += 1
+            while len(self._buffer) >= self.max_pending:
+                self._not_full.clear()
+                self._wakeup.set()
+                await self._not_full.wait()
+        self._buffer.append(row)
+        if len(self._buffer) >= self.batch_size:
+            self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            while self._buffer:
+                if not await self.flush():
+                    # 写入失败时等待下一个周期重试
+                    break
+                if len(self._buffer) < self.batch_size:
+                    break
+
+    async def flush(self) -> bool:
+        """写入一批数据，返回是否成功"""
+        async with self._flush_lock:
+            if not self._buffer:
+                return True
+            size = min(self.batch_size, len(self._buffer))
+            batch = [self._buffer.popleft() for _ in range(size)]
+            start = time.perf_counter()
+            try:
+                await self.flush_fn(batch)
+            except Exception as e:
+                self._buffer.extendleft(reversed(batch))
+                self.failed_batches += 1
+                logger.error(f"{self.name}批量写入失败: {str(e)}")
+                return False
+            finally:
+                if len(self._buffer) < self.max_pending:
+                    self._not_full.set()
+
+            latency = time.perf_counter() - start
+            self.rows_written += size
+            self.batches += 1
+            self.total_flush_latency += latency
+            self.max_flush_latency = max(self.max_flush_latency, latency)
+            return True
+
+    def stats(self) -> Dict:
+        """写入指标"""
+        return {
+            "pending": len(self._buffer),
+            "rows_written": self.rows_written,
+            "batches": self.batches,
+            "failed_batches": self.failed_batches,
+            "blocked_adds": self.blocked_adds,
+            "avg_batch_size": self.rows_written / self.batches if self.batches else 0.0,
+            "avg_flush_latency_ms": self.total_flush_latency / self.batches * 1000 if self.batches else 0.0,
+            "max_flush_latency_ms": self.max_flush_latency * 1000
+        }
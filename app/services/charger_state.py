@@ -0,0 +1,186 @@
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.models.schemas import PowerData, PlugStatus
+from app.utils.logger import logger
+
+# 插拔枪状态编码
+STATUS_UNKNOWN = 0
+STATUS_PLUGGED = 1
+STATUS_UNPLUGGED = 2
+
+_STATUS_CODES = {'PLUGGED': STATUS_PLUGGED, 'UNPLUGGED': STATUS_UNPLUGGED}
+_STATUS_NAMES = {STATUS_PLUGGED: 'PLUGGED', STATUS_UNPLUGGED: 'UNPLUGGED'}
+
+
+class ChargerStateStore:
+    """
+    充电枪实时状态存储，由Kafka遥测直接更新
+    - 每把枪分配固定下标，状态按列保存在numpy数组中，单枪读写O(1)
+    - 场站快照按拓扑中的枪列表批量取值，复杂度O(场站枪数)
+    """
+
+    __slots__ = (
+        '_index', '_charger_sn', '_site_no', 'power', 'soc',
+        'status', 'updated_at', 'ttl'
+    )
+
+    def __init__(self, capacity: int = 1024, ttl: float = None):
+        self._index: Dict[str, int] = {}
+        self._charger_sn: List[str] = []
+        self._site_no: List[Optional[str]] = []
+        self.power = np.zeros(capacity)
+        self.soc = np.full(capacity, np.nan)
+        self.status = np.zeros(capacity, dtype=np.int8)
+        self.updated_at = np.zeros(capacity)
+        self.ttl = settings.CHARGER_STATE_TTL if ttl is None else ttl
+
+    def __len__(self):
+        return len(self._charger_sn)
+
+    def __contains__(self, charger_sn: str) -> bool:
+        return charger_sn in self._index
+
+    def _slot(self, charger_sn: str, site_no: Optional[str]) -> int:
+        """获取充电枪下标，首次出现时分配"""
+        idx = self._index.get(charger_sn)
+        if idx is None:
+            idx = len(self._charger_sn)
+            if idx == len(self.power):
+                self._grow()
+            self._index[charger_sn] = idx
+            self._charger_sn.append(charger_sn)
+            self._site_no.append(site_no)
+        elif site_no:
+            self._site_no[idx] = site_no
+        return idx
+
+    def _grow(self):
+        """容量翻倍"""
+        size = len(self.power)
+        self.power = np.concatenate([self.power, np.zeros(size)])
+        self.soc = np.concatenate([self.soc, np.full(size, np.nan)])
+        self.status = np.concatenate([self.status, np.zeros(size, dtype=np.int8)])
+        self.updated_at = np.concatenate([self.updated_at, np.zeros(size)])
+
+    def update_power(self, data: PowerData):
+        """更新充电过程遥测"""
+        idx = self._slot(data.charger_sn, data.site_no)
+        self.power[idx] = data.power
+        self.soc[idx] = np.nan if data.soc is None else data.soc
+        # 有功率上报说明枪处于插枪充电状态
+        self.status[idx] = STATUS_PLUGGED
+        self.updated_at[idx] = time.time()
+
+    def update_plug(self, data: PlugStatus):
+        """更新插拔枪状态"""
+        idx = self._slot(data.charger_sn, data.site_no)
+        status = _STATUS_CODES.get(data.status, STATUS_UNKNOWN)
+        self.status[idx] = status
+        if status == STATUS_UNPLUGGED:
+            self.power[idx] = 0.0
+            self.soc[idx] = np.nan
+        elif data.power is not None:
+            self.power[idx] = data.power
+        self.updated_at[idx] = time.time()
+
+    def site_of(self, charger_sn: str) -> Optional[str]:
+        """获取充电枪最近上报的所属场站"""
+        idx = self._index.get(charger_sn)
+        return None if idx is None else self._site_no[idx]
+
+    def get(self, charger_sn: str) -> Optional[Dict]:
+        """获取单枪实时状态"""
+        idx = self._index.get(charger_sn)
+        if idx is None:
+            return None
+        soc = self.soc[idx]
+        return {
+            'charger_sn': charger_sn,
+            'site_no': self._site_no[idx],
+            'current_power': float(self.power[idx]),
+            'soc': None if np.isnan(soc) else float(soc),
+            'status': _STATUS_NAMES.get(int(self.status[idx])),
+            'updated_at': float(self.updated_at[idx])
+        }
+
+    def snapshot(self, charger_sns: Sequence[str]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        批量获取充电枪实时状态
+        返回 (功率, 状态编码, 是否有效)，未上报或超过ttl未更新的枪标记为无效
+        """
+        idx = np.fromiter(
+            (self._index.get(charger_sn, -1) for charger_sn in charger_sns),
+            dtype=np.int64,
+            count=len(charger_sns)
+        )
+        known = idx >= 0
+        safe_idx = np.where(known, idx, 0)
+        valid = known & (self.updated_at[safe_idx] >= time.time() - self.ttl)
+        power = np.where(valid, self.power[safe_idx], 0.0)
+        status = np.where(valid, self.status[safe_idx], STATUS_UNKNOWN)
+        return power, status, valid
+
+    def charging(self, charger_sns: Sequence[str]) -> Tuple[List[str], np.ndarray, np.ndarray]:
+        """
+        筛选有效、插枪且已上报SOC的充电枪
+        返回 (枪SN, SOC, 功率)
+        """
+        power, status, valid = self.snapshot(charger_sns)
+        idx = np.fromiter(
+            (self._index.get(charger_sn, 0) for charger_sn in charger_sns),
+            dtype=np.int64,
+            count=len(charger_sns)
+        )
+        soc = self.soc[idx]
+        active = valid & (status == STATUS_PLUGGED) & ~np.isnan(soc)
+        rows = np.flatnonzero(active)
+        return [charger_sns[i] for i in rows.tolist()], soc[rows], power[rows]
+
+    def stats(self) -> Dict:
+        """存储指标"""
+        count = len(self._charger_sn)
+        fresh = int(np.count_nonzero(self.updated_at[:count] >= time.time() - self.ttl))
+        return {"chargers": count, "fresh": fresh, "capacity": len(self.power)}
+
+
+async def get_site_charger_states(db_service, state_store: ChargerStateStore, site_no: str) -> List[Dict]:
+    """
+    获取场站充电枪状态：拓扑取自数据库服务的缓存，功率取自实时状态存储
+    只有缺少有效遥测的枪才回查数据库
+    """
+    topology = await db_service.get_site_topology(site_no)
+    if topology is None:
+        return []
+    states = await get_charger_states_bulk(db_service, state_store, [topology])
+    return states[site_no]
+
+
+async def get_charger_states_bulk(db_service, state_store: ChargerStateStore, topologies) -> Dict[str, List[Dict]]:
+    """批量获取多个场站的充电枪状态，缺少实时状态的枪合并为一次数据库查询"""
+    chargers = [charger for topology in topologies for charger in topology.chargers]
+    power, status, valid = state_store.snapshot([c['charger_sn'] for c in chargers])
+
+    missing = [chargers[i]['charger_sn'] for i in np.flatnonzero(~valid)]
+    fallback = await db_service.get_current_powers(missing) if missing else {}
+    if missing:
+        logger.debug(f"{len(missing)} 把枪无实时状态，回查数据库")
+
+    result = {}
+    offset = 0
+    for topology in topologies:
+        states = []
+        for i, charger in enumerate(topology.chargers, offset):
+            state = dict(charger)
+            if valid[i]:
+                state['current_power'] = float(power[i])
+                state['status'] = _STATUS_NAMES.get(int(status[i]), charger['status'])
+            else:
+                state['current_power'] = fallback.get(charger['charger_sn'], 0.0)
+            states.append(state)
+        offset += len(topology.chargers)
+        result[topology.site_no] = states
+    return result
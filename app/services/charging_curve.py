@@ -0,0 +1,192 @@
+import math
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.utils.logger import logger
+
+SOC_POINTS = 101  # 曲线按SOC 0~100%、步长1%保存
+DEFAULT_CURVE = ''  # 未识别车型或车型样本不足时使用的默认曲线
+
+
+def default_curve() -> np.ndarray:
+    """默认充电曲线：每10%SOC功率降低5%"""
+    return 0.95 ** (np.arange(SOC_POINTS) / 10)
+
+
+def fit_curve(
+        soc_bins: Sequence[int],
+        powers: Sequence[float],
+        samples: Sequence[int],
+        min_samples: int,
+        min_bins: int
+) -> Optional[np.ndarray]:
+    """
+    由按整数SOC分桶的平均功率拟合充电曲线
+    曲线按峰值归一化，缺失的分桶线性插值，有效分桶不足时返回None
+    """
+    soc_bins = np.asarray(soc_bins, dtype=float)
+    powers = np.asarray(powers, dtype=float)
+    samples = np.asarray(samples, dtype=float)
+    valid = (samples >= min_samples) & (powers > 0) & (soc_bins >= 0) & (soc_bins < SOC_POINTS)
+    if np.count_nonzero(valid) < min_bins:
+        return None
+    order = np.argsort(soc_bins[valid])
+    curve = np.interp(np.arange(SOC_POINTS), soc_bins[valid][order], powers[valid][order])
+    return curve / curve.max()
+
+
+def _cumulative_time(curves: np.ndarray) -> np.ndarray:
+    """
+    每条曲线从SOC 0充到各SOC点的累计时间（峰值功率1kW、容量100kWh时的小时数）
+    实际时间 = (累计时间[目标] - 累计时间[当前]) * 容量 / 100 / 峰值功率
+    """
+    step_power = (curves[:, 1:] + curves[:, :-1]) / 2
+    cumulative = np.zeros_like(curves)
+    cumulative[:, 1:] = np.cumsum(1.0 / step_power, axis=1)
+    return cumulative
+
+
+def _interp(values: List[float], soc: float) -> float:
+    """单条曲线在SOC上线性插值"""
+    soc = min(max(soc, 0.0), SOC_POINTS - 1.0)
+    low = min(int(soc), SOC_POINTS - 2)
+    frac = soc - low
+    return values[low] * (1 - frac) + values[low + 1] * frac
+
+
+def _interp_rows(table: np.ndarray, rows: np.ndarray, soc: np.ndarray) -> np.ndarray:
+    """按行取曲线并在SOC上线性插值"""
+    soc = np.clip(soc, 0, SOC_POINTS - 1)
+    low = np.minimum(soc.astype(np.int64), SOC_POINTS - 2)
+    frac = soc - low
+    return table[rows, low] * (1 - frac) + table[rows, low + 1] * frac
+
+
+class ChargingCurveModel:
+    """
+    按车型（vendor_model_capacity）的充电曲线查找表
+    - 所有曲线保存在一个二维数组中，每个车型一行，预测时按行批量插值
+    - 曲线及累计充电时间表在加载时预计算，预测不访问数据库
+    """
+
+    def __init__(self, targets: Iterable[float] = (80, 90)):
+        self.target_socs = list(targets)
+        self.targets = np.asarray(self.target_socs, dtype=float)
+        self._index: Dict[str, int] = {DEFAULT_CURVE: 0}
+        self._curves = default_curve()[None, :]
+        self._cumulative = _cumulative_time(self._curves)
+        self._lists = (self._curves.tolist(), self._cumulative.tolist())  # 单条预测使用，避免numpy标量开销
+        self.loaded_at: Optional[datetime] = None
+        self.skipped = 0  # 样本不足而使用默认曲线的车型数
+
+    def __len__(self):
+        return len(self._index)
+
+    def __contains__(self, model: str) -> bool:
+        return model in self._index
+
+    def load(self, rows: Iterable[Tuple[str, int, float, int]], min_samples: int = 1, min_bins: int = 10) -> int:
+        """
+        由历史充电记录聚合结果加载曲线
+        rows: (车型, SOC分桶, 平均功率, 样本数)，返回拟合成功的车型数
+        """
+        grouped: Dict[str, List[Tuple[int, float, int]]] = {}
+        for model, soc_bin, power, samples in rows:
+            if model:
+                grouped.setdefault(model, []).append((soc_bin, power, samples))
+
+        index = {DEFAULT_CURVE: 0}
+        curves = [default_curve()]
+        skipped = 0
+        for model, points in grouped.items():
+            soc_bins, powers, samples = zip(*points)
+            curve = fit_curve(soc_bins, powers, samples, min_samples, min_bins)
+            if curve is None:
+                skipped += 1
+                continue
+            index[model] = len(curves)
+            curves.append(curve)
+
+        # 整体替换，预测过程中不会读到半更新的表
+        curves = np.vstack(curves)
+        cumulative = _cumulative_time(curves)
+        self._curves, self._cumulative, self._index = curves, cumulative, index
+        self._lists = (curves.tolist(), cumulative.tolist())
+        self.skipped = skipped
+        self.loaded_at = datetime.utcnow()
+        logger.info(f"充电曲线加载完成: {len(index) - 1} 个车型, 样本不足 {skipped} 个")
+        return len(index) - 1
+
+    def curve(self, model: Optional[str]) -> np.ndarray:
+        """获取车型的归一化充电曲线"""
+        return self._curves[self._index.get(model or DEFAULT_CURVE, 0)]
+
+    def predict_one(
+            self,
+            soc: float,
+            power: float,
+            capacity: Optional[float],
+            model: Optional[str]
+    ) -> List[Tuple[float, float]]:
+        """单个会话的预测，结果与predict_batch一致，返回各目标SOC点的 (充电时间, 功率)"""
+        curves, cumulative = self._lists
+        row = self._index.get(model or DEFAULT_CURVE, 0)
+        curve, cum = curves[row], cumulative[row]
+        peak = power / _interp(curve, soc) if power > 0 else math.nan
+        start_time = _interp(cum, soc)
+        result = []
+        for target in self.target_socs:
+            if soc >= target:
+                result.append((math.nan, math.nan))
+                continue
+            hours = (_interp(cum, target) - start_time) * capacity / 100 / peak if capacity is not None else math.nan
+            result.append((hours, _interp(curve, target) * peak))
+        return result
+
+    def predict_batch(
+            self,
+            soc: Sequence[float],
+            power: Sequence[float],
+            capacity: Sequence[Optional[float]],
+            models: Sequence[Optional[str]]
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        批量预测各目标SOC点的充电时间(小时)和功率
+        返回两个 (会话数, 目标SOC数) 的数组，已超过目标SOC或数据无效时为NaN
+        """
+        soc = np.asarray(soc, dtype=float)
+        power = np.asarray(power, dtype=float)
+        capacity = np.array([np.nan if c is None else c for c in capacity], dtype=float)
+        rows = np.fromiter(
+            (self._index.get(model or DEFAULT_CURVE, 0) for model in models),
+            dtype=np.int64,
+            count=len(soc)
+        )
+
+        # 由当前功率和曲线上当前SOC的相对功率推算该会话的峰值功率
+        with np.errstate(divide='ignore', invalid='ignore'):
+            peak = np.where(power > 0, power / _interp_rows(self._curves, rows, soc), np.nan)
+        start_time = _interp_rows(self._cumulative, rows, soc)
+
+        n, k = len(soc), len(self.targets)
+        target = np.broadcast_to(self.targets, (n, k))
+        rows_2d = np.broadcast_to(rows[:, None], (n, k))
+        ahead = soc[:, None] < target
+
+        target_power = _interp_rows(self._curves, rows_2d, target) * peak[:, None]
+        with np.errstate(invalid='ignore'):
+            target_time = (
+                (_interp_rows(self._cumulative, rows_2d, target) - start_time[:, None])
+                * capacity[:, None] / 100 / peak[:, None]
+            )
+        return np.where(ahead, target_time, np.nan), np.where(ahead, target_power, np.nan)
+
+    def stats(self) -> Dict:
+        """曲线指标"""
+        return {
+            "models": len(self._index) - 1,
+            "skipped": self.skipped,
+            "loaded_at": self.loaded_at.isoformat() if self.loaded_at else None
+        }
@@ -1,16 +1,43 @@
+import asyncio
+import time
 from datetime import datetime, timedelta
-from typing import Dict
+from typing import Dict, List, Optional, Tuple
 
-from sqlalchemy import text, select, func
+from sqlalchemy import text, select, func, delete, insert, update, case, or_
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, selectinload
 
 from app.core.config import settings
 from app.models.entities import (
-    Site, ChargerGroup, Pile, ChargingSession
+    Base, Site, ChargerGroup, Pile, Charger, Module, ChargingSession, ChargingRecord, PowerRollup,
+    AlertConfiguration, Alert, EVModel, OptimizationTask, ShardNode
 )
+from app.models.monitoring import PowerStatistics
+from app.models.schemas import (
+    AlertConfig, AlertMessage, OptimizationTaskInfo, PowerData, SiteTopology, VehicleData
+)
+from app.services.batch_writer import BatchWriter
+from app.services.rollup import (
+    PowerRollupAggregator, SITE_TOTAL, bucket_start, choose_resolution, summarize_buckets
+)
+from app.services.scheduler import TASK_PENDING, TASK_RUNNING
+from app.services.vehicle_library import MODEL_SOURCE_CONFIRMED, MODEL_SOURCE_INFERRED
+from app.services.site_import import (
+    SiteImportPlan, STATUS_DUPLICATE, STATUS_FAILED, STATUS_UNCHANGED, payload_digest
+)
+from app.utils.cache import TTLCache
 from app.utils.logger import logger
 
+# 过期清理表的主键列与时间列
+RETENTION_COLUMNS = {
+    "charging_record": ("id", "created_at"),
+    "optimization_task": ("task_id", "created_at"),
+    "power_prediction": ("id", "created_at"),
+    "power_rollup": ("id", "bucket_start")
+}
+
 
 class DatabaseService:
     def __init__(self):
@@ -26,6 +53,70 @@ class DatabaseService:
             class_=AsyncSession,
             expire_on_commit=False
         )
+        # 场站拓扑缓存
+        self.topology_cache = TTLCache(
+            settings.TOPOLOGY_CACHE_SIZE,
+            settings.TOPOLOGY_CACHE_TTL
+        )
+        self._topology_loads: Dict[str, asyncio.Future] = {}
+        # 各场站最近一次场站信息的 (内容摘要, demand)，未命中时从数据库读取
+        self.site_digests: Dict[str, Tuple[str, float]] = {}
+        self.cache_site_digests = True  # 多节点分片时其他节点可能更新同一场站，关闭后每次从数据库读取
+        self._topology_versions: Dict[str, int] = {}
+        # 充电过程记录批量写入
+        self.record_writer = BatchWriter(
+            "充电记录",
+            self._insert_charging_records,
+            settings.RECORD_BATCH_SIZE,
+            settings.RECORD_FLUSH_INTERVAL,
+            settings.RECORD_BUFFER_SIZE
+        )
+        # 告警批量写入（按alert_key合并后upsert）
+        self.alert_writer = BatchWriter(
+            "告警",
+            self._upsert_alerts,
+            settings.ALERT_BATCH_SIZE,
+            settings.ALERT_FLUSH_INTERVAL,
+            settings.ALERT_BUFFER_SIZE
+        )
+        # 车型识别结果批量写入（按session_id upsert），批量参数与充电记录相同
+        self.vehicle_writer = BatchWriter(
+            "车型识别",
+            self._upsert_vehicle_models,
+            settings.RECORD_BATCH_SIZE,
+            settings.RECORD_FLUSH_INTERVAL,
+            settings.RECORD_BUFFER_SIZE
+        )
+        # 功率分时聚合，定时累加写入power_rollup
+        self.power_rollup = PowerRollupAggregator(
+            max_gap=settings.ROLLUP_MAX_GAP,
+            charger_resolutions=(settings.ROLLUP_CHARGER_RESOLUTION,)
+        )
+        self._rollup_task: Optional[asyncio.Task] = None
+        self._retention_task: Optional[asyncio.Task] = None
+        self.retention_stats: Dict[str, Dict] = {}  # 最近一次过期清理结果
+
+    async def initialize(self):
+        """初始化数据库服务"""
+        self.record_writer.start()
+        self.alert_writer.start()
+        self.vehicle_writer.start()
+        self._rollup_task = asyncio.create_task(self._rollup_loop())
+        if settings.RETENTION_INTERVAL > 0:
+            self._retention_task = asyncio.create_task(self._retention_loop())
+        logger.info("数据库服务已启动")
+
+    async def close(self):
+        """关闭数据库服务，写入缓冲中的剩余数据"""
+        for task in (self._retention_task, self._rollup_task):
+            if task is not None:
+                task.cancel()
+        await self.record_writer.stop()
+        await self.alert_writer.stop()
+        await self.vehicle_writer.stop()
+        await self.flush_power_rollups()
+        await self.engine.dispose()
+        logger.info("数据库服务已关闭")
 
     async def get_db(self) -> AsyncSession:
         """获取数据库会话"""
@@ -37,6 +128,998 @@ class DatabaseService:
 
     # ... (之前实现的方法保持不变)
 
+    async def get_site_info(self, site_no: str) -> Optional[SiteTopology]:
+        """获取场站信息"""
+        return await self.get_site_topology(site_no)
+
+    async def get_site_topology(self, site_no: str) -> Optional[SiteTopology]:
+        """获取场站拓扑（读穿透缓存）"""
+        topology = self.topology_cache.get(site_no)
+        if topology is not None:
+            return topology
+
+        # 同一场站并发未命中时只查询一次数据库
+        pending = self._topology_loads.get(site_no)
+        if pending is None:
+            pending = asyncio.ensure_future(self._load_site_topology(site_no))
+            self._topology_loads[site_no] = pending
+            pending.add_done_callback(lambda _: self._topology_loads.pop(site_no, None))
+        return await asyncio.shield(pending)
+
+    async def _load_site_topology(self, site_no: str) -> Optional[SiteTopology]:
+        """从数据库加载场站拓扑"""
+        topologies = await self._load_topologies(Site.site_no == site_no)
+        return topologies[0] if topologies else None
+
+    async def get_active_site_topologies(self) -> List[SiteTopology]:
+        """获取全部启用场站的拓扑，未缓存的场站合并为一次查询加载"""
+        async with self.async_session() as session:
+            try:
+                site_nos = (await session.scalars(
+                    select(Site.site_no).where(Site.is_active.is_(True))
+                )).all()
+            except Exception as e:
+                logger.error(f"获取启用场站失败: {str(e)}")
+                raise
+
+        topologies = {}
+        missing = []
+        for site_no in site_nos:
+            topology = self.topology_cache.get(site_no)
+            if topology is None:
+                missing.append(site_no)
+            else:
+                topologies[site_no] = topology
+        for i in range(0, len(missing), settings.DB_IN_CHUNK_SIZE):
+            for topology in await self._load_topologies(
+                    Site.site_no.in_(missing[i:i + settings.DB_IN_CHUNK_SIZE])
+            ):
+                topologies[topology.site_no] = topology
+        return [topologies[site_no] for site_no in site_nos if site_no in topologies]
+
+    async def _load_topologies(self, condition) -> List[SiteTopology]:
+        """按条件加载场站拓扑并写入缓存"""
+        versions = dict(self._topology_versions)
+        async with self.async_session() as session:
+            try:
+                sites = (await session.scalars(
+                    select(Site)
+                    .where(condition)
+                    .options(
+                        selectinload(Site.charger_groups)
+                        .selectinload(ChargerGroup.piles)
+                        .selectinload(Pile.chargers),
+                        selectinload(Site.charger_groups)
+                        .selectinload(ChargerGroup.piles)
+                        .selectinload(Pile.modules)
+                    )
+                )).all()
+            except Exception as e:
+                logger.error(f"加载场站拓扑失败: {str(e)}")
+                raise
+
+        topologies = []
+        for site in sites:
+            topology = self._build_topology(site)
+            # 加载期间发生写入时不回填，避免缓存旧数据
+            if self._topology_versions.get(site.site_no, 0) == versions.get(site.site_no, 0):
+                self.topology_cache.put(site.site_no, topology)
+            topologies.append(topology)
+        return topologies
+
+    @staticmethod
+    def _build_topology(site: Site) -> SiteTopology:
+        """ORM对象转换为拓扑快照"""
+        groups, piles, chargers = [], [], []
+        for group in site.charger_groups:
+            groups.append({"group_id": group.group_id, "power_limit": group.power_limit})
+            for pile in group.piles:
+                unit_powers = [m.unit_power for m in pile.modules if m.unit_power]
+                piles.append({
+                    "pile_sn": pile.pile_sn,
+                    "group_id": group.group_id,
+                    "type": pile.type,
+                    "rated_power": pile.rated_power,
+                    "modules": [
+                        {"module_no": m.module_no, "type": m.type, "unit_power": m.unit_power}
+                        for m in pile.modules
+                    ]
+                })
+                for charger in pile.chargers:
+                    chargers.append({
+                        "charger_sn": charger.charger_sn,
+                        "pile_sn": pile.pile_sn,
+                        "group_id": group.group_id,
+                        "status": charger.status,
+                        "min_power": charger.min_power,
+                        "max_power": charger.max_power,
+                        "rated_power": pile.rated_power,
+                        "group_power_limit": group.power_limit,
+                        "unit_power": min(unit_powers) if unit_powers else None
+                    })
+        return SiteTopology(
+            site_no=site.site_no,
+            name=site.name,
+            total_power_limit=site.total_power_limit,
+            demand=site.demand,
+            is_active=site.is_active,
+            groups=groups,
+            piles=piles,
+            chargers=chargers
+        )
+
+    def invalidate_site_topology(self, site_no: str):
+        """场站拓扑变更后清除缓存"""
+        self._topology_versions[site_no] = self._topology_versions.get(site_no, 0) + 1
+        self.topology_cache.invalidate(site_no)
+
+    async def get_charger_states(self, site_no: str) -> List[Dict]:
+        """获取场站充电枪状态（拓扑来自缓存，当前功率取最新充电记录）"""
+        topology = await self.get_site_topology(site_no)
+        if topology is None:
+            return []
+        powers = await self.get_current_powers([c["charger_sn"] for c in topology.chargers])
+        return [
+            {**charger, "current_power": powers.get(charger["charger_sn"], 0.0)}
+            for charger in topology.chargers
+        ]
+
+    async def get_current_powers(self, charger_sns: List[str]) -> Dict[str, float]:
+        """批量获取充电枪最新功率(kW)"""
+        powers = {}
+        async with self.async_session() as session:
+            try:
+                for i in range(0, len(charger_sns), settings.DB_IN_CHUNK_SIZE):
+                    latest = (
+                        select(func.max(ChargingRecord.id))
+                        .where(ChargingRecord.charger_sn.in_(charger_sns[i:i + settings.DB_IN_CHUNK_SIZE]))
+                        .group_by(ChargingRecord.charger_sn)
+                    )
+                    rows = await session.execute(
+                        select(
+                            ChargingRecord.charger_sn,
+                            ChargingRecord.curr_output,
+                            ChargingRecord.vol_output
+                        ).where(ChargingRecord.id.in_(latest))
+                    )
+                    for charger_sn, curr, vol in rows:
+                        powers[charger_sn] = (curr or 0.0) * (vol or 0.0) / 1000
+            except Exception as e:
+                logger.error(f"获取充电枪功率失败: {str(e)}")
+                raise
+        return powers
+
+    async def save_site_info(self, data: Dict) -> Site:
+        """保存场站信息（含群组、桩、枪、模块）"""
+        async with self.async_session() as session:
+            async with session.begin():
+                try:
+                    site = await session.get(Site, data['site_no'])
+                    if site is None:
+                        site = Site(site_no=data['site_no'])
+                        session.add(site)
+                    site.name = data.get('name', site.name)
+                    site.demand = data['demand']
+                    site.total_power_limit = data['total_power_limit']
+                    site.payload_hash = payload_digest(data)
+
+                    # 群组按编号顺序与已有群组对应
+                    existing_groups = (await session.scalars(
+                        select(ChargerGroup)
+                        .where(ChargerGroup.site_no == data['site_no'])
+                        .order_by(ChargerGroup.group_id)
+                    )).all()
+                    group_ids = {}
+                    for i, group_data in enumerate(
+                            sorted(data.get('groups', []), key=lambda g: g['group_no'])
+                    ):
+                        if i < len(existing_groups):
+                            group = existing_groups[i]
+                            group.power_limit = group_data['power_limit']
+                        else:
+                            group = ChargerGroup(
+                                site_no=data['site_no'],
+                                power_limit=group_data['power_limit']
+                            )
+                            session.add(group)
+                            await session.flush()
+                        group_ids[group_data['group_no']] = group.group_id
+
+                    for pile_data in data.get('piles', []):
+                        await session.merge(Pile(
+                            pile_sn=pile_data['pile_sn'],
+                            group_id=group_ids.get(pile_data.get('group_no')),
+                            type=pile_data.get('type'),
+                            rated_power=pile_data['rated_power']
+                        ))
+                        await session.execute(
+                            delete(Module).where(Module.pile_sn == pile_data['pile_sn'])
+                        )
+                        session.add_all([
+                            Module(
+                                pile_sn=pile_data['pile_sn'],
+                                type=module.get('type'),
+                                module_no=module['module_no'],
+                                unit_power=module['unit_power']
+                            )
+                            for module in pile_data.get('modules', [])
+                        ])
+                        for charger in pile_data.get('chargers', []):
+                            await session.merge(Charger(
+                                charger_sn=charger['charger_sn'],
+                                pile_sn=pile_data['pile_sn'],
+                                status=charger.get('status'),
+                                max_power=charger['max_power'],
+                                min_power=charger.get('min_power', 0)
+                            ))
+                except Exception as e:
+                    logger.error(f"保存场站信息失败: {str(e)}")
+                    raise
+                finally:
+                    self.invalidate_site_topology(data['site_no'])
+        self.site_digests[site.site_no] = (site.payload_hash, site.demand)
+        return site
+
+    async def get_site_digest(self, site_no: str) -> Optional[Tuple[str, float]]:
+        """获取场站最近一次场站信息的 (内容摘要, demand)，从未记录时返回None"""
+        digest = self.site_digests.get(site_no) if self.cache_site_digests else None
+        if digest is not None:
+            return digest
+        async with self.async_session() as session:
+            try:
+                row = (await session.execute(
+                    select(Site.payload_hash, Site.demand).where(Site.site_no == site_no)
+                )).first()
+            except Exception as e:
+                logger.error(f"获取场站信息摘要失败: {str(e)}")
+                raise
+        if row is None or row.payload_hash is None:
+            return None
+        digest = (row.payload_hash, row.demand)
+        if self.cache_site_digests:
+            self.site_digests[site_no] = digest
+        return digest
+
+    async def update_site_demand(self, site_no: str, demand: float):
+        """只更新场站demand，缓存中的拓扑同步替换，无需重新加载"""
+        async with self.async_session() as session:
+            async with session.begin():
+                try:
+                    await session.execute(
+                        update(Site)
+                        .where(Site.site_no == site_no)
+                        .values(demand=demand, updated_at=datetime.utcnow())
+                    )
+                except Exception as e:
+                    logger.error(f"更新场站demand失败: {str(e)}")
+                    raise
+        self._set_cached_demand(site_no, demand)
+
+    def _set_cached_demand(self, site_no: str, demand: float):
+        """demand已写库后同步替换缓存中的拓扑和摘要"""
+        topology = self.topology_cache.peek(site_no)
+        self.invalidate_site_topology(site_no)
+        if topology is not None:
+            self.topology_cache.put(site_no, topology.model_copy(update={"demand": demand}))
+        digest = self.site_digests.get(site_no)
+        if digest is not None:
+            self.site_digests[site_no] = (digest[0], demand)
+
+    def _invalidate_site_digest(self, site_no: str):
+        """场站拓扑被场站信息以外的接口修改后清除摘要，下次场站信息完整写入"""
+        self.site_digests.pop(site_no, None)
+
+    async def save_sites_bulk(self, sites: List[Dict]) -> List[Dict]:
+        """
+        批量保存场站信息
+        - 每SITE_BULK_CHUNK_SIZE个场站一个事务：一次加载已有拓扑，比较后按表多行写入变化的行
+        - 事务失败时逐个场站重试，单个场站的错误不影响其他场站
+        返回与请求顺序一致的各场站结果
+        """
+        latest = {}
+        for data in sites:
+            latest[data['site_no']] = data
+        payloads = list(latest.values())
+
+        outcomes: Dict[str, Dict] = {}
+        size = settings.SITE_BULK_CHUNK_SIZE
+        for i in range(0, len(payloads), size):
+            chunk = payloads[i:i + size]
+            try:
+                outcomes.update(await self._save_site_chunk(chunk))
+            except Exception as e:
+                logger.error(f"批量保存场站失败，逐个重试: {str(e)}")
+                for data in chunk:
+                    try:
+                        outcomes.update(await self._save_site_chunk([data]))
+                    except Exception as site_error:
+                        outcomes[data['site_no']] = {
+                            "site_no": data['site_no'],
+                            "status": STATUS_FAILED,
+                            "demand_changed": False,
+                            "error": str(site_error)
+                        }
+
+        results = []
+        for data in sites:
+            if latest[data['site_no']] is data:
+                results.append(outcomes[data['site_no']])
+            else:
+                results.append({"site_no": data['site_no'], "status": STATUS_DUPLICATE, "demand_changed": False})
+        return results
+
+    async def _save_site_chunk(self, chunk: List[Dict]) -> Dict[str, Dict]:
+        """在一个事务中保存一批场站"""
+        site_nos = [data['site_no'] for data in chunk]
+        async with self.async_session() as session:
+            async with session.begin():
+                existing = {
+                    site.site_no: site
+                    for site in (await session.scalars(
+                        select(Site)
+                        .where(Site.site_no.in_(site_nos))
+                        .options(
+                            selectinload(Site.charger_groups)
+                            .selectinload(ChargerGroup.piles)
+                            .selectinload(Pile.chargers),
+                            selectinload(Site.charger_groups)
+                            .selectinload(ChargerGroup.piles)
+                            .selectinload(Pile.modules)
+                        )
+                    )).all()
+                }
+                plan = SiteImportPlan()
+                for data in chunk:
+                    plan.add_site(data, existing.get(data['site_no']))
+
+                if plan.sites:
+                    await self._execute_rows(session, self._upsert(
+                        Site, ["name", "demand", "total_power_limit", "payload_hash"], updated_at=func.now()
+                    ), plan.sites)
+                if plan.group_updates:
+                    await self._execute_rows(session, update(ChargerGroup), plan.group_updates)
+
+                new_group_ids: Dict[str, List[int]] = {}
+                if plan.group_inserts:
+                    await self._execute_rows(session, insert(ChargerGroup), plan.group_inserts)
+                    # 多行插入不返回自增ID，按场站重新读取群组（按group_id排序与编号顺序对应）
+                    result = await session.execute(
+                        select(ChargerGroup.site_no, ChargerGroup.group_id)
+                        .where(ChargerGroup.site_no.in_({row["site_no"] for row in plan.group_inserts}))
+                        .order_by(ChargerGroup.group_id)
+                    )
+                    for site_no, group_id in result.all():
+                        new_group_ids.setdefault(site_no, []).append(group_id)
+
+                if plan.piles:
+                    await self._execute_rows(session, self._upsert(
+                        Pile, ["group_id", "type", "rated_power"]
+                    ), plan.resolve_piles(new_group_ids))
+                for i in range(0, len(plan.module_piles), settings.DB_IN_CHUNK_SIZE):
+                    await session.execute(
+                        delete(Module).where(Module.pile_sn.in_(plan.module_piles[i:i + settings.DB_IN_CHUNK_SIZE]))
+                    )
+                if plan.modules:
+                    await self._execute_rows(session, insert(Module), plan.modules)
+                if plan.chargers:
+                    await self._execute_rows(session, self._upsert(
+                        Charger, ["pile_sn", "status", "max_power", "min_power"]
+                    ), plan.chargers)
+
+        for site_no in plan.changed_sites:
+            self.invalidate_site_topology(site_no)
+        for row in plan.sites:
+            self.site_digests[row["site_no"]] = (row["payload_hash"], row["demand"])
+            if plan.results[row["site_no"]]["status"] == STATUS_UNCHANGED:
+                self._set_cached_demand(row["site_no"], row["demand"])
+        return plan.results
+
+    def _upsert(self, model, columns: List[str], **values):
+        """按主键插入或更新：MySQL为ON DUPLICATE KEY UPDATE，SQLite（测试）为ON CONFLICT DO UPDATE"""
+        if self.engine.dialect.name == "sqlite":
+            stmt = sqlite_insert(model)
+            return stmt.on_conflict_do_update(
+                index_elements=[column.name for column in model.__table__.primary_key],
+                set_={**{column: stmt.excluded[column] for column in columns}, **values}
+            )
+        stmt = mysql_insert(model)
+        return stmt.on_duplicate_key_update(**{column: stmt.inserted[column] for column in columns}, **values)
+
+    @staticmethod
+    async def _execute_rows(session: AsyncSession, stmt, rows: List[Dict]):
+        """分批执行多行写入，控制单条语句大小"""
+        for i in range(0, len(rows), settings.SITE_BULK_STATEMENT_ROWS):
+            await session.execute(stmt, rows[i:i + settings.SITE_BULK_STATEMENT_ROWS])
+
+    async def save_charger_profile(self, data: Dict) -> Charger:
+        """保存充电枪配置"""
+        async with self.async_session() as session:
+            async with session.begin():
+                try:
+                    charger = await session.merge(Charger(**{
+                        key: value for key, value in data.items()
+                        if value is not None
+                    }))
+                    await session.flush()
+                    site_no = await session.scalar(
+                        select(ChargerGroup.site_no)
+                        .join(Pile, Pile.group_id == ChargerGroup.group_id)
+                        .where(Pile.pile_sn == charger.pile_sn)
+                    )
+                    if site_no:
+                        # 拓扑已与最近一次场站信息不同，相同的场站信息再次上报时需要完整写入
+                        await session.execute(update(Site).where(Site.site_no == site_no).values(payload_hash=None))
+                except Exception as e:
+                    logger.error(f"保存充电枪配置失败: {str(e)}")
+                    raise
+        if site_no:
+            self._invalidate_site_digest(site_no)
+            self.invalidate_site_topology(site_no)
+        return charger
+
+    async def add_charging_record(self, data: PowerData, site_no: Optional[str] = None):
+        """
+        缓冲一条充电过程记录，缓冲已满时阻塞等待写入
+        功率按场站聚合，消息未带场站编号时使用调用方解析的场站，仍无法确定时不计入聚合
+        """
+        now = datetime.utcnow()
+        await self.record_writer.add({
+            "session_id": data.session_id,
+            "mac_addr": data.mac_addr,
+            "charger_sn": data.charger_sn,
+            "timestamp": data.timestamp or now,
+            "curr_output": data.curr_output,
+            "vol_output": data.vol_output,
+            "curr_demand": data.curr_demand,
+            "soc": data.soc,
+            "vol_demand": data.vol_demand,
+            "consumed_energy": data.consumed_energy,
+            "created_at": now,
+            "report_at": data.timestamp
+        })
+        if data.power is None:
+            return
+        site_no = data.site_no or site_no
+        if site_no is None:
+            logger.debug(f"充电枪 {data.charger_sn} 所属场站未知，功率不计入聚合")
+            return
+        self.power_rollup.add(site_no, data.charger_sn, data.power, data.timestamp or now)
+
+    def record_unplug(self, charger_sn: str, timestamp: datetime = None):
+        """拔枪后从功率聚合中移除该枪"""
+        self.power_rollup.remove(charger_sn, timestamp or datetime.utcnow())
+
+    async def _insert_charging_records(self, rows: List[Dict]):
+        """批量写入充电过程记录（executemany，由驱动合并为多行INSERT）"""
+        async with self.async_session() as session:
+            async with session.begin():
+                await session.execute(insert(ChargingRecord), rows)
+
+    async def flush_power_rollups(self) -> int:
+        """将功率聚合增量累加写入数据库"""
+        rows = self.power_rollup.drain()
+        if not rows:
+            return 0
+        stmt = mysql_insert(PowerRollup)
+        stmt = stmt.on_duplicate_key_update(
+            samples=PowerRollup.samples + stmt.inserted.samples,
+            power_sum=PowerRollup.power_sum + stmt.inserted.power_sum,
+            power_min=func.least(PowerRollup.power_min, stmt.inserted.power_min),
+            power_max=func.greatest(PowerRollup.power_max, stmt.inserted.power_max),
+            energy=PowerRollup.energy + stmt.inserted.energy
+        )
+        try:
+            async with self.async_session() as session:
+                async with session.begin():
+                    for i in range(0, len(rows), settings.RECORD_BATCH_SIZE):
+                        await session.execute(stmt, rows[i:i + settings.RECORD_BATCH_SIZE])
+        except Exception as e:
+            self.power_rollup.restore(rows)
+            logger.error(f"功率聚合写入失败: {str(e)}")
+            raise
+        return len(rows)
+
+    async def _rollup_loop(self):
+        """定时写入功率聚合"""
+        while True:
+            await asyncio.sleep(settings.ROLLUP_FLUSH_INTERVAL)
+            try:
+                await self.flush_power_rollups()
+            except Exception:
+                pass  # 已记录日志，增量保留到下次写入
+
+    async def get_power_statistics(
+            self,
+            site_no: str,
+            start_time: datetime,
+            end_time: datetime
+    ) -> PowerStatistics:
+        """获取场站功率统计（读取分时聚合，数据点数与统计周期无关）"""
+        resolution = choose_resolution(start_time, end_time, settings.ROLLUP_MAX_POINTS)
+        first_bucket = bucket_start(start_time, resolution)
+        async with self.async_session() as session:
+            try:
+                result = await session.execute(
+                    select(
+                        PowerRollup.bucket_start,
+                        PowerRollup.samples,
+                        PowerRollup.power_sum,
+                        PowerRollup.power_min,
+                        PowerRollup.power_max,
+                        PowerRollup.energy
+                    )
+                    .where(
+                        PowerRollup.site_no == site_no,
+                        PowerRollup.charger_sn == SITE_TOTAL,
+                        PowerRollup.resolution == resolution,
+                        PowerRollup.bucket_start >= first_bucket,
+                        PowerRollup.bucket_start < end_time
+                    )
+                    .order_by(PowerRollup.bucket_start)
+                )
+                buckets = {row[0]: list(row[1:]) for row in result}
+            except Exception as e:
+                logger.error(f"获取功率统计失败: {str(e)}")
+                raise
+
+        # 合并尚未落库的增量
+        for start, delta in self.power_rollup.pending(site_no, SITE_TOTAL, resolution).items():
+            if not first_bucket <= start < end_time:
+                continue
+            bucket = buckets.get(start)
+            if bucket is None:
+                buckets[start] = list(delta)
+                continue
+            bucket[0] += delta[0]
+            bucket[1] += delta[1]
+            bucket[2] = min(bucket[2], delta[2])
+            bucket[3] = max(bucket[3], delta[3])
+            bucket[4] += delta[4]
+
+        topology = await self.get_site_topology(site_no)
+        summary = summarize_buckets(
+            [(start, *buckets[start]) for start in sorted(buckets)],
+            topology.demand if topology else None
+        )
+        return PowerStatistics(
+            site_no=site_no,
+            time_range=f"{start_time:%Y-%m-%d %H:%M} ~ {end_time:%Y-%m-%d %H:%M}",
+            updated_at=datetime.utcnow(),
+            **summary
+        )
+
+    async def get_charging_curve_samples(self, since: datetime) -> List[tuple]:
+        """
+        按车型和整数SOC聚合历史充电功率，用于拟合充电曲线
+        返回 (车型, SOC分桶, 平均功率, 样本数)
+        """
+        power = ChargingRecord.curr_output * ChargingRecord.vol_output / 1000
+        soc_bin = func.floor(ChargingRecord.soc)
+        async with self.async_session() as session:
+            try:
+                result = await session.execute(
+                    select(
+                        EVModel.vendor_model_capacity,
+                        soc_bin,
+                        func.avg(power),
+                        func.count()
+                    )
+                    .join(EVModel, EVModel.session_id == ChargingRecord.session_id)
+                    .where(
+                        ChargingRecord.created_at >= since,
+                        ChargingRecord.soc.is_not(None),
+                        ChargingRecord.curr_output > 0,
+                        ChargingRecord.vol_output > 0,
+                        EVModel.vendor_model_capacity.is_not(None)
+                    )
+                    .group_by(EVModel.vendor_model_capacity, soc_bin)
+                )
+                return [(model, int(soc), float(avg), count) for model, soc, avg, count in result.all()]
+            except Exception as e:
+                logger.error(f"获取充电曲线样本失败: {str(e)}")
+                raise
+
+    async def get_vehicle_fingerprints(self, limit: int) -> List[tuple]:
+        """
+        获取最近已确认车型的特征，用于构建车型指纹库
+        本服务识别写入的标签不参与，避免识别结果反过来训练自身
+        返回 (车型, 最大电压, 最大电流, 最大功率, 电池容量)
+        """
+        async with self.async_session() as session:
+            try:
+                result = await session.execute(
+                    select(
+                        EVModel.vendor_model_capacity,
+                        EVModel.max_voltage,
+                        EVModel.max_current,
+                        EVModel.max_power,
+                        EVModel.capacity
+                    )
+                    .where(
+                        EVModel.vendor_model_capacity.is_not(None),
+                        or_(EVModel.model_source.is_(None), EVModel.model_source != MODEL_SOURCE_INFERRED)
+                    )
+                    .order_by(EVModel.created_at.desc())
+                    .limit(limit)
+                )
+                return [tuple(row) for row in result.all()]
+            except Exception as e:
+                logger.error(f"获取车型指纹失败: {str(e)}")
+                raise
+
+    async def get_pending_vehicles(self, limit: int) -> List[Dict]:
+        """获取最近未识别出车型的充电任务"""
+        async with self.async_session() as session:
+            try:
+                result = await session.execute(
+                    select(EVModel)
+                    .where(EVModel.vendor_model_capacity.is_(None))
+                    .order_by(EVModel.created_at.desc())
+                    .limit(limit)
+                )
+                return [
+                    {
+                        "session_id": vehicle.session_id,
+                        "mac_addr": vehicle.mac_addr,
+                        "max_voltage": vehicle.max_voltage,
+                        "max_current": vehicle.max_current,
+                        "max_power": vehicle.max_power,
+                        "capacity": vehicle.capacity
+                    }
+                    for vehicle in result.scalars()
+                ]
+            except Exception as e:
+                logger.error(f"获取未识别车辆失败: {str(e)}")
+                raise
+
+    async def save_vehicle_model(self, data: VehicleData, model: Optional[str]):
+        """缓冲一条车型识别结果，未识别的车型保存为空"""
+        await self.vehicle_writer.add({
+            "session_id": data.session_id,
+            "mac_addr": data.mac_addr,
+            "capacity": data.capacity,
+            "max_voltage": data.voltage,
+            "max_current": data.current,
+            "max_power": data.power,
+            "created_at": datetime.utcnow(),
+            "report_at": data.report_at,
+            "vendor_model_capacity": model,
+            "model_source": MODEL_SOURCE_INFERRED if model is not None else None
+        })
+
+    async def update_vehicle_models(self, models: Dict[str, str]):
+        """批量更新已有充电任务的车型识别结果（标记为识别写入）"""
+        if not models:
+            return
+        async with self.async_session() as session:
+            try:
+                async with session.begin():
+                    # 按主键批量更新
+                    await session.execute(
+                        update(EVModel),
+                        [
+                            {
+                                "session_id": session_id,
+                                "vendor_model_capacity": model,
+                                "model_source": MODEL_SOURCE_INFERRED
+                            }
+                            for session_id, model in models.items()
+                        ]
+                    )
+            except Exception as e:
+                logger.error(f"更新车型识别结果失败: {str(e)}")
+                raise
+
+    async def _upsert_vehicle_models(self, rows: List[Dict]):
+        """批量写入车型识别结果，同一充电任务只保留最新一条；已确认的车型标签不被识别结果覆盖"""
+        latest = {row["session_id"]: row for row in rows}
+        stmt = mysql_insert(EVModel)
+        confirmed = EVModel.model_source == MODEL_SOURCE_CONFIRMED
+        stmt = stmt.on_duplicate_key_update(
+            capacity=stmt.inserted.capacity,
+            max_voltage=stmt.inserted.max_voltage,
+            max_current=stmt.inserted.max_current,
+            max_power=stmt.inserted.max_power,
+            report_at=stmt.inserted.report_at,
+            model_source=case((confirmed, EVModel.model_source), else_=stmt.inserted.model_source),
+            vendor_model_capacity=case((confirmed, EVModel.vendor_model_capacity), else_=stmt.inserted.vendor_model_capacity)
+        )
+        async with self.async_session() as session:
+            async with session.begin():
+                await session.execute(stmt, list(latest.values()))
+
+    async def create_optimization_task(self, site_no: str, priority: int, task_type: Optional[int]) -> int:
+        """新建待执行的优化任务，返回任务ID"""
+        async with self.async_session() as session:
+            try:
+                async with session.begin():
+                    task = OptimizationTask(
+                        site_no=site_no,
+                        status=TASK_PENDING,
+                        priority=priority,
+                        task_type=task_type,
+                        triggers=1,
+                        created_at=datetime.utcnow()
+                    )
+                    session.add(task)
+                    await session.flush()
+                    return task.task_id
+            except Exception as e:
+                logger.error(f"创建优化任务失败: {str(e)}")
+                raise
+
+    async def update_optimization_task(self, task_id: int, **values):
+        """更新优化任务状态与结果"""
+        async with self.async_session() as session:
+            try:
+                async with session.begin():
+                    await session.execute(
+                        update(OptimizationTask)
+                        .where(OptimizationTask.task_id == task_id)
+                        .values(**values)
+                    )
+            except Exception as e:
+                logger.error(f"更新优化任务失败: {str(e)}")
+                raise
+
+    async def claim_optimization_task(
+            self,
+            task_id: int,
+            node_id: Optional[str],
+            triggers: int,
+            reclaim: bool = False
+    ) -> bool:
+        """
+        领取优化任务开始执行，已被其他节点领取时返回False
+        执行中的任务可由同一节点（重启后）重新领取，执行节点心跳超时后可由任意节点接管；
+        reclaim为True表示调用方当前负责该场站，可接管其他节点执行中的任务
+        """
+        running = OptimizationTask.status == TASK_RUNNING
+        if not reclaim:
+            live_nodes = select(ShardNode.node_id).where(
+                ShardNode.heartbeat_at >= datetime.utcnow() - timedelta(seconds=settings.SHARD_NODE_TTL)
+            )
+            running = running & (
+                OptimizationTask.node_id.is_(None)
+                | (OptimizationTask.node_id == node_id)
+                | OptimizationTask.node_id.not_in(live_nodes)
+            )
+        async with self.async_session() as session:
+            try:
+                async with session.begin():
+                    result = await session.execute(
+                        update(OptimizationTask)
+                        .where(OptimizationTask.task_id == task_id)
+                        .where((OptimizationTask.status == TASK_PENDING) | running)
+                        .values(
+                            status=TASK_RUNNING,
+                            node_id=node_id,
+                            start_time=datetime.utcnow(),
+                            triggers=triggers
+                        )
+                    )
+                    return result.rowcount > 0
+            except Exception as e:
+                logger.error(f"领取优化任务失败: {str(e)}")
+                raise
+
+    async def get_unfinished_optimization_tasks(self, statuses: List[str] = None) -> List[Dict]:
+        """获取待执行和执行中断的优化任务，按任务ID升序"""
+        async with self.async_session() as session:
+            try:
+                rows = await session.execute(
+                    select(
+                        OptimizationTask.task_id,
+                        OptimizationTask.site_no,
+                        OptimizationTask.priority,
+                        OptimizationTask.task_type,
+                        OptimizationTask.triggers,
+                        OptimizationTask.status,
+                        OptimizationTask.node_id
+                    )
+                    .where(OptimizationTask.status.in_(statuses or [TASK_PENDING, TASK_RUNNING]))
+                    .order_by(OptimizationTask.task_id)
+                    .limit(settings.OPTIMIZATION_RECOVER_LIMIT)
+                )
+                return [dict(row._mapping) for row in rows]
+            except Exception as e:
+                logger.error(f"获取未完成优化任务失败: {str(e)}")
+                raise
+
+    async def get_optimization_tasks(self, site_no: str, limit: int = 100) -> List[OptimizationTaskInfo]:
+        """获取场站最近的优化任务"""
+        async with self.async_session() as session:
+            try:
+                query = (
+                    select(OptimizationTask)
+                    .where(OptimizationTask.site_no == site_no)
+                    .order_by(OptimizationTask.task_id.desc())
+                    .limit(limit)
+                )
+                return [
+                    OptimizationTaskInfo.model_validate(task, from_attributes=True)
+                    for task in await session.scalars(query)
+                ]
+            except Exception as e:
+                logger.error(f"获取优化任务失败: {str(e)}")
+                raise
+
+    async def get_optimization_task(self, task_id: int) -> Optional[OptimizationTaskInfo]:
+        """获取优化任务详情"""
+        async with self.async_session() as session:
+            try:
+                task = await session.get(OptimizationTask, task_id)
+                return OptimizationTaskInfo.model_validate(task, from_attributes=True) if task else None
+            except Exception as e:
+                logger.error(f"获取优化任务详情失败: {str(e)}")
+                raise
+
+    async def claim_shard_node(self, token: str, ttl: float) -> str:
+        """领取编号最小的空闲或心跳超时的分片节点编号"""
+        now = datetime.utcnow()
+        expired = now - timedelta(seconds=ttl)
+        try:
+            async with self.async_session() as session:
+                rows = {
+                    row.node_id: row
+                    for row in await session.execute(
+                        select(ShardNode.node_id, ShardNode.token, ShardNode.heartbeat_at)
+                    )
+                }
+            for slot in range(settings.SHARD_MAX_NODES):
+                node_id = f"shard-{slot}"
+                row = rows.get(node_id)
+                if row is not None and row.heartbeat_at >= expired and row.token != token:
+                    continue
+                async with self.async_session() as session:
+                    async with session.begin():
+                        if row is None:
+                            await session.execute(
+                                mysql_insert(ShardNode).prefix_with("IGNORE"),
+                                [{"node_id": node_id, "heartbeat_at": datetime(1970, 1, 1)}]
+                            )
+                        # 以条件更新抢占，并发启动的进程只有一个能领取成功
+                        result = await session.execute(
+                            update(ShardNode)
+                            .where(ShardNode.node_id == node_id)
+                            .where((ShardNode.heartbeat_at < expired) | (ShardNode.token == token))
+                            .values(token=token, heartbeat_at=now, started_at=now)
+                        )
+                if result.rowcount > 0:
+                    return node_id
+        except Exception as e:
+            logger.error(f"领取分片节点失败: {str(e)}")
+            raise
+        raise RuntimeError(f"没有空闲的分片节点编号（上限 {settings.SHARD_MAX_NODES}）")
+
+    async def heartbeat_shard_node(self, node_id: str, token: str) -> bool:
+        """分片节点心跳，编号已被其他进程领取时返回False"""
+        async with self.async_session() as session:
+            try:
+                async with session.begin():
+                    result = await session.execute(
+                        update(ShardNode)
+                        .where(ShardNode.node_id == node_id)
+                        .where(ShardNode.token == token)
+                        .values(heartbeat_at=datetime.utcnow())
+                    )
+                    return result.rowcount > 0
+            except Exception as e:
+                logger.error(f"分片节点心跳失败: {str(e)}")
+                raise
+
+    async def release_shard_node(self, node_id: str, token: str):
+        """释放分片节点编号，其他节点立即视为离开"""
+        async with self.async_session() as session:
+            async with session.begin():
+                await session.execute(
+                    update(ShardNode)
+                    .where(ShardNode.node_id == node_id)
+                    .where(ShardNode.token == token)
+                    .values(token=None, heartbeat_at=datetime(1970, 1, 1))
+                )
+
+    async def get_live_shard_nodes(self, ttl: float) -> List[str]:
+        """获取心跳未超时的分片节点"""
+        expired = datetime.utcnow() - timedelta(seconds=ttl)
+        async with self.async_session() as session:
+            try:
+                return list(await session.scalars(
+                    select(ShardNode.node_id).where(ShardNode.heartbeat_at >= expired)
+                ))
+            except Exception as e:
+                logger.error(f"获取分片节点失败: {str(e)}")
+                raise
+
+    async def get_alert_configs(self, site_no: str = None) -> List[AlertConfig]:
+        """获取告警配置，未指定场站时返回全部"""
+        async with self.async_session() as session:
+            try:
+                query = select(AlertConfiguration)
+                if site_no is not None:
+                    query = query.where(AlertConfiguration.site_no == site_no)
+                return [
+                    AlertConfig.model_validate(config, from_attributes=True)
+                    for config in await session.scalars(query)
+                ]
+            except Exception as e:
+                logger.error(f"获取告警配置失败: {str(e)}")
+                raise
+
+    async def save_alert_config(self, config: AlertConfig) -> AlertConfiguration:
+        """保存告警配置"""
+        async with self.async_session() as session:
+            async with session.begin():
+                try:
+                    record = AlertConfiguration(**config.model_dump(exclude_none=True))
+                    session.add(record)
+                except Exception as e:
+                    logger.error(f"保存告警配置失败: {str(e)}")
+                    raise
+        return record
+
+    async def save_alerts(self, rows: List[Dict]):
+        """缓冲告警变更，批量写入"""
+        for row in rows:
+            await self.alert_writer.add(row)
+
+    async def _upsert_alerts(self, rows: List[Dict]):
+        """批量写入告警，同一告警在批次内只保留最新状态"""
+        latest = {row["alert_key"]: row for row in rows}
+        stmt = mysql_insert(Alert)
+        stmt = stmt.on_duplicate_key_update(
+            message=stmt.inserted.message,
+            severity=stmt.inserted.severity,
+            status=stmt.inserted.status,
+            occurrences=stmt.inserted.occurrences,
+            last_seen=stmt.inserted.last_seen,
+            resolved_at=stmt.inserted.resolved_at
+        )
+        async with self.async_session() as session:
+            async with session.begin():
+                await session.execute(stmt, list(latest.values()))
+
+    async def get_alerts(
+            self,
+            site_no: str = None,
+            start_time: datetime = None,
+            end_time: datetime = None,
+            alert_type: str = None,
+            status: str = None
+    ) -> List[AlertMessage]:
+        """查询告警"""
+        query = select(Alert).order_by(Alert.created_at.desc())
+        if site_no is not None:
+            query = query.where(Alert.site_no == site_no)
+        if start_time is not None:
+            query = query.where(Alert.created_at >= start_time)
+        if end_time is not None:
+            query = query.where(Alert.created_at < end_time)
+        if alert_type is not None:
+            query = query.where(Alert.alert_type == alert_type)
+        if status is not None:
+            query = query.where(Alert.status == status)
+        async with self.async_session() as session:
+            try:
+                return [
+                    AlertMessage.model_validate(alert, from_attributes=True)
+                    for alert in await session.scalars(query)
+                ]
+            except Exception as e:
+                logger.error(f"查询告警失败: {str(e)}")
+                raise
+
+    def get_metrics(self) -> Dict:
+        """缓存与批量写入指标"""
+        return {
+            "topology": self.topology_cache.stats(),
+            "charging_records": self.record_writer.stats(),
+            "alerts": self.alert_writer.stats(),
+            "vehicle_models": self.vehicle_writer.stats(),
+            "retention": self.retention_stats,
+            "pending_rollups": len(self.power_rollup)
+        }
+
     async def get_site_statistics(self, site_no: str) -> Dict:
         """获取场站统计信息"""
         async with self.async_session() as session:
@@ -75,20 +1158,141 @@ class DatabaseService:
                 logger.error(f"获取场站统计信息失败: {str(e)}")
                 raise
 
-    async def cleanup_old_data(self):
-        """清理过期数据"""
-        async with self.async_session() as session:
-            async with session.begin():
-                try:
-                    for table, days in settings.DATA_RETENTION.items():
-                        cutoff_date = datetime.utcnow() - timedelta(days=days)
-                        await session.execute(
-                            text(f"DELETE FROM {table} WHERE created_at < :cutoff"),
-                            {"cutoff": cutoff_date}
+    async def cleanup_old_data(self) -> Dict[str, Dict]:
+        """清理过期数据（按主键分块删除，每块独立事务，块间让出数据库），单表失败不影响其他表"""
+        results = {}
+        for table, days in settings.DATA_RETENTION.items():
+            cutoff_date = datetime.utcnow() - timedelta(days=days)
+            try:
+                if table in settings.RETENTION_PARTITIONED_TABLES:
+                    results[table] = await self._drop_expired_partitions(table, cutoff_date)
+                else:
+                    results[table] = await self._delete_expired_rows(table, cutoff_date)
+            except Exception as e:
+                logger.error(f"数据清理失败: {table}, {str(e)}")
+                results[table] = {"deleted": 0, "chunks": 0, "elapsed": 0.0, "rows_per_second": 0.0, "error": str(e)}
+                continue
+            logger.info(
+                f"数据清理完成: {table}, 删除 {results[table]['deleted']} 行, "
+                f"{results[table]['rows_per_second']:.0f} 行/秒"
+            )
+        self.retention_stats = results
+        return results
+
+    async def _delete_expired_rows(self, table_name: str, cutoff: datetime) -> Dict:
+        """按主键顺序分块删除早于cutoff的数据"""
+        table = Base.metadata.tables[table_name]
+        pk_name, time_name = RETENTION_COLUMNS[table_name]
+        pk, time_column = table.c[pk_name], table.c[time_name]
+        chunk_size = settings.RETENTION_CHUNK_SIZE
+
+        deleted, chunks, last_pk = 0, 0, None
+        start = time.perf_counter()
+        while True:
+            # 主键索引上顺序扫描一块；数据按写入时间追加（时间列均为写入时间或时间桶），
+            # 允许少量乱序，整块都未过期时才结束
+            query = select(pk, time_column).order_by(pk).limit(chunk_size)
+            if last_pk is not None:
+                query = query.where(pk > last_pk)
+            async with self.async_session() as session:
+                rows = (await session.execute(query)).all()
+                if not rows:
+                    break
+                last_pk = rows[-1][0]
+                expired = [row[0] for row in rows if row[1] is not None and row[1] < cutoff]
+                if expired:
+                    result = await session.execute(
+                        delete(table).where(
+                            pk.between(expired[0], expired[-1]),
+                            time_column < cutoff
                         )
+                    )
                     await session.commit()
-                    logger.info("数据清理完成")
-                except Exception as e:
-                    await session.rollback()
-                    logger.error(f"数据清理失败: {str(e)}")
-                    raise
\ No newline at end of file
+                    deleted += result.rowcount
+                    chunks += 1
+            if len(rows) < chunk_size or not expired:
+                break
+            await asyncio.sleep(settings.RETENTION_CHUNK_PAUSE)
+
+        elapsed = time.perf_counter() - start
+        return {
+            "deleted": deleted,
+            "chunks": chunks,
+            "elapsed": elapsed,
+            "rows_per_second": deleted / elapsed if elapsed else 0.0
+        }
+
+    async def _drop_expired_partitions(self, table_name: str, cutoff: datetime) -> Dict:
+        """
+        按天分区表的过期清理：删除整个分区并预建后续分区
+        约定表按 RANGE(TO_DAYS(时间列)) 分区，分区名为 pYYYYMMDD（存放该日期之前的数据），可选 pmax 兜底分区
+        表未分区时按主键分块删除
+        """
+        start = time.perf_counter()
+        async with self.async_session() as session:
+            rows = (await session.execute(
+                text(
+                    "SELECT PARTITION_NAME, TABLE_ROWS FROM information_schema.PARTITIONS "
+                    "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table "
+                    "AND PARTITION_NAME IS NOT NULL"
+                ),
+                {"table": table_name}
+            )).all()
+            if not rows:
+                logger.warning(f"表 {table_name} 未分区，按主键分块清理")
+                return await self._delete_expired_rows(table_name, cutoff)
+
+            partitions = {}
+            for name, table_rows in rows:
+                try:
+                    partitions[name] = (datetime.strptime(name, "p%Y%m%d"), table_rows or 0)
+                except ValueError:
+                    continue  # pmax等非日期分区
+            expired = [name for name, (bound, _) in partitions.items() if bound <= cutoff]
+            if expired:
+                await session.execute(text(
+                    f"ALTER TABLE {table_name} DROP PARTITION {', '.join(expired)}"
+                ))
+
+            # 预建未来分区，保证新数据不会落入pmax
+            today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+            upcoming = [
+                today + timedelta(days=i)
+                for i in range(1, settings.RETENTION_PARTITIONS_AHEAD + 1)
+            ]
+            missing = [
+                bound for bound in upcoming
+                if bound.strftime("p%Y%m%d") not in partitions
+                and (not partitions or bound > max(b for b, _ in partitions.values()))
+            ]
+            if missing:
+                definitions = ", ".join(
+                    f"PARTITION {bound.strftime('p%Y%m%d')} "
+                    f"VALUES LESS THAN (TO_DAYS('{bound.strftime('%Y-%m-%d')}'))"
+                    for bound in missing
+                )
+                if any(name == "pmax" for name, _ in rows):
+                    await session.execute(text(
+                        f"ALTER TABLE {table_name} REORGANIZE PARTITION pmax INTO "
+                        f"({definitions}, PARTITION pmax VALUES LESS THAN MAXVALUE)"
+                    ))
+                else:
+                    await session.execute(text(f"ALTER TABLE {table_name} ADD PARTITION ({definitions})"))
+
+        elapsed = time.perf_counter() - start
+        deleted = sum(partitions[name][1] for name in expired)
+        return {
+            "deleted": deleted,  # 取自分区统计信息，为估算值
+            "chunks": len(expired),
+            "elapsed": elapsed,
+            "rows_per_second": deleted / elapsed if elapsed else 0.0
+        }
+
+    async def _retention_loop(self):
+        """定时执行过期数据清理"""
+        while True:
+            await asyncio.sleep(settings.RETENTION_INTERVAL)
+            try:
+                await self.cleanup_old_data()
+            except Exception as e:
+                logger.error(f"定时数据清理失败: {str(e)}")
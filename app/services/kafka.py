@@ -1,136 +1,448 @@
 import asyncio
-import json
+import time
 from datetime import datetime
-from typing import Dict, List
+from typing import Dict, List, Optional
 
-from kafka import KafkaConsumer, KafkaProducer
+from aiokafka import AIOKafkaConsumer, AIOKafkaProducer
+from aiokafka.structs import TopicPartition
 from pydantic import ValidationError
 
 from app.core.config import settings
-from app.models.schemas import KafkaMessage, VehicleData, PowerData, PlugStatus
 from app.services.algorithm import AlgorithmService
+from app.services.kafka_codec import (
+    get_codec, VEHICLE_RECOGNITION, POWER_PREDICTION, PLUG_STATUS
+)
+from app.services.kafka_memory import InMemoryBroker, InMemoryConsumer, InMemoryProducer
 from app.utils.logger import logger
 
 
+class OffsetCommitter:
+    """按分区合并offset提交：消息处理完成后才登记，按数量/时间窗口批量提交（至少一次语义）"""
+
+    def __init__(self, consumer, batch_size: int, interval_ms: int):
+        self.consumer = consumer
+        self.batch_size = batch_size
+        self.interval = interval_ms / 1000
+        self._pending: Dict[TopicPartition, int] = {}
+        self._pending_counts: Dict[TopicPartition, int] = {}  # 各分区待提交的消息数
+        self._pending_count = 0
+        self._first_pending_at: Optional[float] = None
+        self._committed: Dict[TopicPartition, int] = {}
+        self._lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+
+        # 提交指标
+        self.commit_count = 0
+        self.failed_commits = 0
+        self.committed_messages = 0
+        self.total_commit_latency = 0.0
+        self.last_commit_latency = 0.0
+        self.max_commit_latency = 0.0
+
+    def mark_processed(self, record):
+        """登记已处理完成的消息"""
+        tp = TopicPartition(record.topic, record.partition)
+        self._pending[tp] = record.offset + 1
+        self._pending_counts[tp] = self._pending_counts.get(tp, 0) + 1
+        self._pending_count += 1
+        if self._first_pending_at is None:
+            self._first_pending_at = time.monotonic()
+        if self._pending_count >= self.batch_size:
+            self._wakeup.set()
+
+    async def run(self):
+        """定时或达到批量阈值时提交"""
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.commit()
+
+    async def commit(self):
+        """提交所有已登记的offset"""
+        async with self._lock:
+            if not self._pending:
+                return
+            offsets, counts, count = self._pending, self._pending_counts, self._pending_count
+            self._pending, self._pending_counts, self._pending_count = {}, {}, 0
+            first_pending_at, self._first_pending_at = self._first_pending_at, None
+
+            start = time.perf_counter()
+            try:
+                await self.consumer.commit(offsets)
+            except Exception as e:
+                self.failed_commits += 1
+                logger.error(f"提交offset失败: {str(e)}")
+                # 放回待提交队列，已有更新的offset时以新的为准
+                for tp, offset in offsets.items():
+                    self._pending.setdefault(tp, offset)
+                    self._pending_counts[tp] = self._pending_counts.get(tp, 0) + counts.get(tp, 0)
+                self._pending_count += count
+                self._first_pending_at = first_pending_at
+                return
+
+            latency = time.perf_counter() - start
+            self.commit_count += 1
+            self.committed_messages += count
+            self.total_commit_latency += latency
+            self.last_commit_latency = latency
+            self.max_commit_latency = max(self.max_commit_latency, latency)
+            self._committed.update(offsets)
+
+    def discard(self, partitions):
+        """丢弃已不再分配给本节点的分区的待提交offset"""
+        for tp in partitions:
+            self._pending.pop(tp, None)
+            self._committed.pop(tp, None)
+            self._pending_count -= self._pending_counts.pop(tp, 0)
+        if not self._pending:
+            self._first_pending_at = None
+
+    def stats(self) -> Dict:
+        """提交指标：提交延迟与未提交积压"""
+        return {
+            "commits": self.commit_count,
+            "failed_commits": self.failed_commits,
+            "committed_messages": self.committed_messages,
+            "pending_messages": self._pending_count,
+            "commit_lag_seconds": (
+                time.monotonic() - self._first_pending_at
+                if self._first_pending_at is not None else 0.0
+            ),
+            "partition_lag": {
+                f"{tp.topic}-{tp.partition}": offset - self._committed.get(tp, offset)
+                for tp, offset in self._pending.items()
+            },
+            "avg_commit_latency_ms": (
+                self.total_commit_latency / self.commit_count * 1000
+                if self.commit_count else 0.0
+            ),
+            "last_commit_latency_ms": self.last_commit_latency * 1000,
+            "max_commit_latency_ms": self.max_commit_latency * 1000
+        }
+
+
 class KafkaService:
-    def __init__(self, algorithm_service: AlgorithmService):
+    def __init__(
+            self,
+            algorithm_service: AlgorithmService,
+            broker: Optional[InMemoryBroker] = None
+    ):
         self.algorithm_service = algorithm_service
-        self.producer = KafkaProducer(
+        # 与算法服务共享充电枪实时状态
+        self.state_store = algorithm_service.state_store
+        self.alert_stream = None  # 启用消息驱动告警时由监控服务注入
+        # 场站分片时各节点共用消费组，手动分配本节点负责的分区，分片变化时重新分配
+        self.shards = algorithm_service.shards
+        self.group_id = settings.KAFKA_GROUP_ID
+        self.misrouted_messages = 0  # 未以场站编号为key、落在其他节点分区的消息
+        self._pending_assignment: Optional[List[TopicPartition]] = None
+        if self.shards is not None:
+            self.shards.add_listener(self._on_rebalance)
+        # 只订阅上行主题，功率分配主题由本服务发布
+        self.topics = [
+            topic for name, topic in settings.KAFKA_TOPICS.items()
+            if name != 'POWER_ALLOCATION'
+        ]
+        if broker is None and settings.KAFKA_BACKEND == 'memory':
+            broker = InMemoryBroker(settings.KAFKA_MEMORY_PARTITIONS)
+        self.broker = broker
+        self.codec = get_codec(settings.KAFKA_CODEC)
+        self.producer = self._create_producer()
+        self.consumer = self._create_consumer()
+        self.offset_committer = OffsetCommitter(
+            self.consumer,
+            settings.KAFKA_COMMIT_BATCH_SIZE,
+            settings.KAFKA_COMMIT_INTERVAL_MS
+        )
+        self.num_workers = max(1, settings.KAFKA_CONSUMER_WORKERS)
+        self._queues: List[asyncio.Queue] = []
+        self._workers: List[asyncio.Task] = []
+        self._consumer_task: Optional[asyncio.Task] = None
+        self._committer_task: Optional[asyncio.Task] = None
+        self.site_deliveries: Dict[str, Dict] = {}  # 场站最近一次配置下发结果
+        self._running = False
+
+    def _create_producer(self):
+        """创建生产者"""
+        key_serializer = lambda k: k.encode('utf-8')
+        if self.broker is not None:
+            return InMemoryProducer(
+                self.broker,
+                value_serializer=self.codec.encode,
+                key_serializer=key_serializer
+            )
+        return AIOKafkaProducer(
             bootstrap_servers=settings.KAFKA_SERVERS,
-            value_serializer=lambda v: json.dumps(v).encode('utf-8'),
+            value_serializer=self.codec.encode,
+            key_serializer=key_serializer,
             acks='all',
-            retries=3,
-            retry_backoff_ms=1000
+            retry_backoff_ms=1000,
+            linger_ms=settings.KAFKA_PRODUCER_LINGER_MS,
+            max_batch_size=settings.KAFKA_PRODUCER_BATCH_SIZE,
+            compression_type=settings.KAFKA_PRODUCER_COMPRESSION
         )
-        self.consumer = KafkaConsumer(
-            *settings.KAFKA_TOPICS,
+
+    def _create_consumer(self):
+        """创建消费者（消息解码在消费协程中进行，单条消息格式错误不影响拉取）"""
+        # 场站分片时不订阅主题，启动后手动分配分区
+        topics = self.topics if self.shards is None else []
+        if self.broker is not None:
+            return InMemoryConsumer(
+                *topics,
+                broker=self.broker,
+                group_id=self.group_id,
+                auto_offset_reset='latest'
+            )
+        return AIOKafkaConsumer(
+            *topics,
             bootstrap_servers=settings.KAFKA_SERVERS,
-            group_id=settings.KAFKA_GROUP_ID,
+            group_id=self.group_id,
             auto_offset_reset='latest',
             enable_auto_commit=False,
-            value_deserializer=lambda x: json.loads(x.decode('utf-8'))
+            max_poll_records=settings.KAFKA_MAX_POLL_RECORDS
         )
-        self._running = False
-
-        async def _handle_message(self, message):
-            """处理接收到的消息"""
-            try:
-                kafka_message = KafkaMessage(**message.value)
-
-                if kafka_message.message_type == 1:
-                    # 车型识别数据
-                    vehicle_data = VehicleData(**kafka_message.data)
-                    await self.algorithm_service.process_vehicle_data(vehicle_data)
-
-                elif kafka_message.message_type == 2:
-                    # 功率预测数据
-                    power_data = PowerData(**kafka_message.data)
-                    await self.algorithm_service.process_power_data(power_data)
-
-                elif kafka_message.message_type == 3:
-                    # 插拔枪状态
-                    plug_status = PlugStatus(**kafka_message.data)
-                    await self.algorithm_service.process_plug_status(plug_status)
-
-                else:
-                    logger.warning(f"未知的消息类型: {kafka_message.message_type}")
-
-            except ValidationError as e:
-                logger.error(f"消息格式验证失败: {str(e)}")
-            except Exception as e:
-                logger.error(f"消息处理失败: {str(e)}")
 
     async def start(self):
         """启动Kafka服务"""
+        await self.producer.start()
+        await self.consumer.start()
+        if self.shards is not None:
+            await self._check_partitions()
+            self._pending_assignment = None
+            self.consumer.assign(self._owned_partitions())
         self._running = True
-        await self.consume_messages()
+        self._queues = [
+            asyncio.Queue(maxsize=settings.KAFKA_WORKER_QUEUE_SIZE)
+            for _ in range(self.num_workers)
+        ]
+        self._workers = [
+            asyncio.create_task(self._worker_loop(queue))
+            for queue in self._queues
+        ]
+        self._committer_task = asyncio.create_task(self.offset_committer.run())
+        self._consumer_task = asyncio.create_task(self.consume_messages())
+        logger.info(f"Kafka服务已启动，消费协程数: {self.num_workers}")
 
     async def stop(self):
         """停止Kafka服务"""
         self._running = False
-        self.producer.close()
-        self.consumer.close()
+        if self._consumer_task:
+            self._consumer_task.cancel()
+            await asyncio.gather(self._consumer_task, return_exceptions=True)
+        # 等待已拉取的消息处理完成
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(*(queue.join() for queue in self._queues)),
+                timeout=10
+            )
+        except asyncio.TimeoutError:
+            logger.warning("等待Kafka消息处理完成超时")
+        for task in [*self._workers, self._committer_task]:
+            if task:
+                task.cancel()
+        await asyncio.gather(*self._workers, self._committer_task, return_exceptions=True)
+        # 提交剩余已处理的offset
+        await self.offset_committer.commit()
+        await self.consumer.stop()
+        await self.producer.stop()
 
     async def consume_messages(self):
-        """消费Kafka消息"""
+        """拉取Kafka消息并按分区分发到消费协程"""
         try:
             while self._running:
-                messages = self.consumer.poll(timeout_ms=1000)
-                for topic_partition, records in messages.items():
+                if self._pending_assignment is not None:
+                    await self._reassign()
+                batches = await self.consumer.getmany(
+                    timeout_ms=1000,
+                    max_records=settings.KAFKA_MAX_POLL_RECORDS
+                )
+                for topic_partition, records in batches.items():
+                    # 同一分区固定由同一协程处理，保证分区内消息顺序
+                    queue = self._queues[self._worker_index(topic_partition)]
                     for record in records:
-                        await self._handle_message(record)
-                        # 手动提交offset
-                        self.consumer.commit()
-                await asyncio.sleep(0.1)
+                        await queue.put(record)
+        except asyncio.CancelledError:
+            raise
         except Exception as e:
             logger.error(f"Kafka消息消费失败: {str(e)}")
             raise
 
+    def _owned_partitions(self) -> List[TopicPartition]:
+        """本节点负责的上行主题分区"""
+        return [
+            TopicPartition(topic, partition)
+            for topic in self.topics
+            for partition in sorted(self.shards.owned_partitions)
+        ]
+
+    async def _check_partitions(self):
+        """校验上行主题的分区数与分片配置一致，否则场站与分区的对应关系不成立"""
+        if self.broker is None:
+            # 手动分配分区时消费者不会主动加载主题元数据
+            await self.consumer.topics()
+        for topic in self.topics:
+            partitions = self.consumer.partitions_for_topic(topic)
+            if not partitions or len(partitions) != self.shards.partitions:
+                raise RuntimeError(
+                    f"主题 {topic} 的分区数 {len(partitions or ())} 与分片分区数 {self.shards.partitions} 不一致"
+                )
+
+    async def _on_rebalance(self):
+        """分片变化：由消费循环在两次拉取之间切换分区"""
+        self._pending_assignment = self._owned_partitions()
+
+    async def _reassign(self):
+        """切换分区：先处理完已拉取的消息并提交被收回分区的offset，新负责节点从提交位置继续消费"""
+        partitions, self._pending_assignment = self._pending_assignment, None
+        revoked = self.consumer.assignment() - set(partitions)
+        if revoked:
+            await asyncio.gather(*(queue.join() for queue in self._queues))
+            await self.offset_committer.commit()
+            self.offset_committer.discard(revoked)
+        self.consumer.assign(partitions)
+        logger.info(f"Kafka分区重新分配: {len(partitions)} 个分区，收回 {len(revoked)} 个")
+
+    def _worker_index(self, topic_partition) -> int:
+        """计算分区对应的消费协程"""
+        return hash((topic_partition.topic, topic_partition.partition)) % self.num_workers
+
+    async def _worker_loop(self, queue: asyncio.Queue):
+        """消费协程：顺序处理所属分区的消息"""
+        while True:
+            record = await queue.get()
+            try:
+                await self._handle_message(record)
+                # 处理完成后登记offset，由OffsetCommitter批量提交
+                self.offset_committer.mark_processed(record)
+            finally:
+                queue.task_done()
+
+    def get_metrics(self) -> Dict:
+        """获取消费指标"""
+        return {
+            "workers": self.num_workers,
+            "group_id": self.group_id,
+            "partitions": len(self.consumer.assignment()),
+            "misrouted_messages": self.misrouted_messages,
+            "queue_depths": [queue.qsize() for queue in self._queues],
+            "charger_states": self.state_store.stats(),
+            "offsets": self.offset_committer.stats()
+        }
+
     async def _handle_message(self, message):
         """处理接收到的消息"""
         try:
-            data = message.value
-            message_type = data.get('message_type')
+            message_type, data = self.codec.decode(message.value)
+
+            if self.shards is not None and message_type in (VEHICLE_RECOGNITION, POWER_PREDICTION, PLUG_STATUS):
+                self._check_routing(message, data)
 
-            if message_type == 1:
+            if message_type == VEHICLE_RECOGNITION:
                 # 车型识别数据
                 await self.algorithm_service.process_vehicle_data(data)
-            elif message_type == 2:
+            elif message_type == POWER_PREDICTION:
                 # 功率预测数据
+                self.state_store.update_power(data)
                 await self.algorithm_service.process_power_data(data)
-            elif message_type == 3:
+                if self.alert_stream is not None:
+                    await self._check_alerts(self.alert_stream.on_power_data, data)
+            elif message_type == PLUG_STATUS:
                 # 插拔枪状态
+                self.state_store.update_plug(data)
                 await self.algorithm_service.process_plug_status(data)
+                if self.alert_stream is not None:
+                    await self._check_alerts(self.alert_stream.on_plug_status, data)
             else:
                 logger.warning(f"未知的消息类型: {message_type}")
 
-        except json.JSONDecodeError:
-            logger.error("消息格式错误")
+        except (ValueError, ValidationError) as e:
+            logger.error(f"消息格式错误: {str(e)}")
         except Exception as e:
             logger.error(f"消息处理失败: {str(e)}")
 
+    async def _check_alerts(self, check, data):
+        """消息驱动的告警检查，在功率处理之后执行，失败不影响功率处理"""
+        try:
+            await check(data, data.site_no or self.state_store.site_of(data.charger_sn))
+        except Exception as e:
+            logger.error(f"消息告警检查失败: {str(e)}")
+
+    def _check_routing(self, message, data):
+        """统计未按场站编号分区的消息，仍然处理（优化任务经任务表转交负责节点）"""
+        site_no = getattr(data, 'site_no', None) or self.state_store.site_of(data.charger_sn)
+        if site_no is not None and self.shards.partition_of(site_no) != message.partition:
+            self.misrouted_messages += 1
+
+    def _build_profile_message(self, profile: Dict) -> Dict:
+        """构造充电配置消息"""
+        return {
+            'timestamp': datetime.utcnow().isoformat(),
+            'profile': profile,
+            'version': '1.0'
+        }
+
     async def publish_profile(self, profile: Dict):
         """发布充电配置信息"""
         try:
             topic = settings.KAFKA_TOPICS['POWER_ALLOCATION']
-            message = {
-                'timestamp': datetime.utcnow().isoformat(),
-                'profile': profile,
-                'version': '1.0'
-            }
-            future = self.producer.send(topic, message)
-            await asyncio.wrap_future(future)
+            await self.producer.send_and_wait(
+                topic,
+                self._build_profile_message(profile),
+                key=profile.get('charger_sn')
+            )
             logger.info(f"成功发布充电配置: {profile.get('charger_sn')}")
         except Exception as e:
             logger.error(f"发布充电配置失败: {str(e)}")
             raise
 
-    async def publish_batch_profiles(self, profiles: List[Dict]):
-        """批量发布充电配置信息"""
+    async def publish_batch_profiles(self, profiles: List[Dict], site_no: str = None) -> Dict:
+        """
+        批量发布充电配置信息
+        - 同一次优化的所有配置并发发送，由生产者按linger/batch合并，整体只等待一次确认
+        - 以charger_sn为key，保证同一充电枪的配置按序到达
+        """
+        topic = settings.KAFKA_TOPICS['POWER_ALLOCATION']
+        start = time.perf_counter()
+        charger_sns = [profile.get('charger_sn') for profile in profiles]
         try:
-            for profile in profiles:
-                await self.publish_profile(profile)
-            logger.info(f"批量发布充电配置成功，数量: {len(profiles)}")
+            # 先全部入队，再统一等待投递结果
+            futures = [
+                await self.producer.send(
+                    topic,
+                    self._build_profile_message(profile),
+                    key=charger_sn
+                )
+                for profile, charger_sn in zip(profiles, charger_sns)
+            ]
+            results = await asyncio.gather(*futures, return_exceptions=True)
         except Exception as e:
             logger.error(f"批量发布充电配置失败: {str(e)}")
             raise
+
+        failed = [
+            charger_sn for charger_sn, result in zip(charger_sns, results)
+            if isinstance(result, Exception)
+        ]
+        delivery = {
+            "site_no": site_no,
+            "total": len(profiles),
+            "succeeded": len(profiles) - len(failed),
+            "failed": failed,
+            "latency_ms": (time.perf_counter() - start) * 1000,
+            "timestamp": datetime.utcnow().isoformat()
+        }
+        if site_no is not None:
+            self.site_deliveries[site_no] = delivery
+
+        if failed:
+            logger.error(f"批量发布充电配置部分失败: {site_no}, 失败数量: {len(failed)}")
+        else:
+            logger.info(f"批量发布充电配置成功: {site_no}, 数量: {len(profiles)}")
+        return delivery
+
+    def get_site_delivery(self, site_no: str) -> Optional[Dict]:
+        """获取场站最近一次配置下发结果"""
+        return self.site_deliveries.get(site_no)
@@ -0,0 +1,222 @@
+import json
+import math
+import struct
+from datetime import datetime, timezone
+from typing import Annotated, Any, Dict, Literal, NamedTuple, Union
+
+from pydantic import BaseModel, Field, TypeAdapter, ValidationError
+
+from app.models.schemas import VehicleData, PowerData, PlugStatus
+
+try:
+    import orjson
+except ImportError:  # orjson为可选依赖，缺失时退回标准库
+    orjson = None
+
+# 消息类型
+VEHICLE_RECOGNITION = 1
+POWER_PREDICTION = 2
+PLUG_STATUS = 3
+
+MESSAGE_MODELS = {
+    VEHICLE_RECOGNITION: VehicleData,
+    POWER_PREDICTION: PowerData,
+    PLUG_STATUS: PlugStatus
+}
+
+
+class DecodedMessage(NamedTuple):
+    message_type: int
+    data: Any  # VehicleData / PowerData / PlugStatus，未知类型时为原始dict
+
+
+class JsonCodec:
+    """标准库JSON编解码（基准实现）"""
+    name = "json"
+
+    def encode(self, message: Dict) -> bytes:
+        return json.dumps(message, default=_json_default).encode('utf-8')
+
+    def decode(self, raw: bytes) -> DecodedMessage:
+        envelope = json.loads(raw.decode('utf-8'))
+        message_type = envelope.get('message_type')
+        model = MESSAGE_MODELS.get(message_type)
+        if model is None:
+            return DecodedMessage(message_type, envelope.get('data'))
+        return DecodedMessage(message_type, model.model_validate(envelope['data']))
+
+
+# 按message_type区分的消息信封，由pydantic-core预编译为单次JSON解析+校验
+class _VehicleEnvelope(BaseModel):
+    message_type: Literal[1]
+    data: VehicleData
+
+
+class _PowerEnvelope(BaseModel):
+    message_type: Literal[2]
+    data: PowerData
+
+
+class _PlugEnvelope(BaseModel):
+    message_type: Literal[3]
+    data: PlugStatus
+
+
+_ENVELOPE_ADAPTER = TypeAdapter(Annotated[
+    Union[_VehicleEnvelope, _PowerEnvelope, _PlugEnvelope],
+    Field(discriminator='message_type')
+])
+
+
+class FastJsonCodec:
+    """
+    快速JSON编解码
+    - 解码：预编译的信封schema，直接从字节解析为类型化消息，不经过中间dict
+    - 编码：优先使用orjson
+    """
+    name = "fast"
+
+    def encode(self, message: Dict) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(message, default=_json_default)
+        return json.dumps(message, default=_json_default, separators=(',', ':')).encode('utf-8')
+
+    def decode(self, raw: bytes) -> DecodedMessage:
+        try:
+            envelope = _ENVELOPE_ADAPTER.validate_json(raw)
+        except ValidationError:
+            # 未知消息类型与JsonCodec一致返回原始dict，已知类型的校验错误照常抛出
+            envelope = orjson.loads(raw) if orjson is not None else json.loads(raw)
+            if not isinstance(envelope, dict) or envelope.get('message_type') in MESSAGE_MODELS:
+                raise
+            return DecodedMessage(envelope.get('message_type'), envelope.get('data'))
+        return DecodedMessage(envelope.message_type, envelope.data)
+
+
+class BinaryCodec(FastJsonCodec):
+    """
+    紧凑二进制编解码，用于高频的功率预测/插拔枪消息
+    格式: 魔数(1B) 消息类型(1B) 时间戳毫秒(8B) 数值字段(float32，NaN表示空) 字符串字段(2B长度+UTF-8)
+    其他消息类型以及非二进制格式的消息按快速JSON处理
+    """
+    name = "binary"
+    MAGIC = 0xB7
+
+    _POWER_FLOATS = (
+        'soc', 'power', 'capacity', 'curr_output', 'vol_output',
+        'curr_demand', 'vol_demand', 'consumed_energy'
+    )
+    _POWER_STRINGS = ('charger_sn', 'session_id', 'mac_addr', 'site_no')
+    _PLUG_STRINGS = ('charger_sn', 'status', 'session_id', 'mac_addr', 'site_no')
+
+    _HEADER = struct.Struct('<BBq')
+    _POWER_BODY = struct.Struct('<8f')
+    _PLUG_BODY = struct.Struct('<f')
+    _STRING_LENGTH = struct.Struct('<H')
+
+    def encode(self, message: Dict) -> bytes:
+        message_type = message.get('message_type')
+        data = message.get('data')
+        if message_type == POWER_PREDICTION:
+            data = _as_dict(data)
+            return b''.join([
+                self._HEADER.pack(self.MAGIC, message_type, _timestamp_ms(data.get('timestamp'))),
+                self._POWER_BODY.pack(*(
+                    math.nan if data.get(field) is None else data[field]
+                    for field in self._POWER_FLOATS
+                )),
+                _pack_strings(data, self._POWER_STRINGS, self._STRING_LENGTH)
+            ])
+        if message_type == PLUG_STATUS:
+            data = _as_dict(data)
+            return b''.join([
+                self._HEADER.pack(self.MAGIC, message_type, _timestamp_ms(data.get('timestamp'))),
+                self._PLUG_BODY.pack(math.nan if data.get('power') is None else data['power']),
+                _pack_strings(data, self._PLUG_STRINGS, self._STRING_LENGTH)
+            ])
+        return super().encode(message)
+
+    def decode(self, raw: bytes) -> DecodedMessage:
+        if not raw or raw[0] != self.MAGIC:
+            return super().decode(raw)
+
+        _, message_type, timestamp = self._HEADER.unpack_from(raw)
+        offset = self._HEADER.size
+        fields = {'timestamp': _from_timestamp_ms(timestamp)}
+
+        if message_type == POWER_PREDICTION:
+            values = self._POWER_BODY.unpack_from(raw, offset)
+            offset += self._POWER_BODY.size
+            for field, value in zip(self._POWER_FLOATS, values):
+                fields[field] = None if math.isnan(value) else value
+            _unpack_strings(raw, offset, self._POWER_STRINGS, fields, self._STRING_LENGTH)
+            return DecodedMessage(message_type, PowerData.model_validate(fields))
+        if message_type == PLUG_STATUS:
+            power, = self._PLUG_BODY.unpack_from(raw, offset)
+            fields['power'] = None if math.isnan(power) else power
+            offset += self._PLUG_BODY.size
+            _unpack_strings(raw, offset, self._PLUG_STRINGS, fields, self._STRING_LENGTH)
+            return DecodedMessage(message_type, PlugStatus.model_validate(fields))
+        raise ValueError(f"二进制格式不支持的消息类型: {message_type}")
+
+
+CODECS = {
+    codec.name: codec for codec in (JsonCodec, FastJsonCodec, BinaryCodec)
+}
+
+
+def get_codec(name: str):
+    """按名称获取编解码器"""
+    try:
+        return CODECS[name]()
+    except KeyError:
+        raise ValueError(f"未知的消息编解码器: {name}")
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode='json')
+    raise TypeError(f"无法序列化的类型: {type(value)}")
+
+
+def _as_dict(data) -> Dict:
+    return data.model_dump() if isinstance(data, BaseModel) else data
+
+
+def _timestamp_ms(value) -> int:
+    if value is None:
+        return 0
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp() * 1000)
+
+
+def _from_timestamp_ms(value: int):
+    if not value:
+        return None
+    return datetime.fromtimestamp(value / 1000, tz=timezone.utc).replace(tzinfo=None)
+
+
+def _pack_strings(data: Dict, fields, length: struct.Struct) -> bytes:
+    parts = []
+    limit = 1 << (8 * length.size)
+    for field in fields:
+        encoded = (data.get(field) or '').encode('utf-8')
+        if len(encoded) >= limit:
+            raise ValueError(f"字段 {field} 超过二进制格式长度上限: {len(encoded)} 字节")
+        parts.append(length.pack(len(encoded)) + encoded)
+    return b''.join(parts)
+
+
+def _unpack_strings(raw: bytes, offset: int, fields, result: Dict, length: struct.Struct):
+    for field in fields:
+        size, = length.unpack_from(raw, offset)
+        offset += length.size
+        value = raw[offset:offset + size].decode('utf-8')
+        offset += size
+        result[field] = value or None
+    return offset
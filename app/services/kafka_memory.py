@@ -0,0 +1,242 @@
+import asyncio
+import itertools
+import time
+from collections import defaultdict, namedtuple
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from aiokafka.partitioner import murmur2
+
+from app.utils.logger import logger
+
+# 与aiokafka.structs中的结构字段一致，可互相比较/作为字典键
+TopicPartition = namedtuple('TopicPartition', ['topic', 'partition'])
+ConsumerRecord = namedtuple(
+    'ConsumerRecord',
+    ['topic', 'partition', 'offset', 'timestamp', 'key', 'value']
+)
+RecordMetadata = namedtuple(
+    'RecordMetadata',
+    ['topic', 'partition', 'offset', 'timestamp']
+)
+
+
+def default_partition(key: bytes, num_partitions: int) -> int:
+    """与Kafka默认分区器一致的key分区"""
+    return (murmur2(key) & 0x7fffffff) % num_partitions
+
+
+class InMemoryBroker:
+    """本地内存Kafka代理，用于无集群环境下联调和压测消息管道"""
+
+    def __init__(self, num_partitions: int = 8):
+        self.num_partitions = num_partitions
+        self._logs: Dict[TopicPartition, List[ConsumerRecord]] = defaultdict(list)
+        self._committed: Dict[str, Dict[TopicPartition, int]] = defaultdict(dict)
+        self._waiters: List[asyncio.Future] = []
+        self._round_robin = itertools.count()
+
+    def partitions_for(self, topic: str) -> List[TopicPartition]:
+        """获取主题的全部分区"""
+        return [TopicPartition(topic, p) for p in range(self.num_partitions)]
+
+    def partition_for(self, key: Optional[bytes]) -> int:
+        """按key计算分区，无key时轮询"""
+        if key is None:
+            return next(self._round_robin) % self.num_partitions
+        return default_partition(key, self.num_partitions)
+
+    def append(
+            self,
+            topic: str,
+            value: Any,
+            key: Optional[bytes] = None,
+            partition: Optional[int] = None
+    ) -> RecordMetadata:
+        """写入一条消息"""
+        if partition is None:
+            partition = self.partition_for(key)
+        tp = TopicPartition(topic, partition)
+        log = self._logs[tp]
+        timestamp = int(time.time() * 1000)
+        log.append(ConsumerRecord(topic, partition, len(log), timestamp, key, value))
+        self._notify()
+        return RecordMetadata(topic, partition, len(log) - 1, timestamp)
+
+    def read(self, tp: TopicPartition, offset: int, max_records: int) -> List[ConsumerRecord]:
+        """从指定offset读取消息"""
+        return self._logs[tp][offset:offset + max_records]
+
+    def end_offset(self, tp: TopicPartition) -> int:
+        """获取分区末尾offset"""
+        return len(self._logs[tp])
+
+    def commit(self, group_id: str, offsets: Dict[TopicPartition, int]):
+        """提交消费组offset"""
+        self._committed[group_id].update(offsets)
+
+    def committed(self, group_id: str, tp: TopicPartition) -> Optional[int]:
+        """获取消费组已提交的offset"""
+        return self._committed[group_id].get(tp)
+
+    async def wait_for_data(self, timeout: float):
+        """等待新消息写入"""
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        try:
+            await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            if future in self._waiters:
+                self._waiters.remove(future)
+
+    def _notify(self):
+        waiters, self._waiters = self._waiters, []
+        for future in waiters:
+            if not future.done():
+                future.set_result(None)
+
+
+class InMemoryProducer:
+    """模拟AIOKafkaProducer接口的内存生产者"""
+
+    def __init__(
+            self,
+            broker: InMemoryBroker,
+            value_serializer: Optional[Callable] = None,
+            key_serializer: Optional[Callable] = None,
+            **kwargs
+    ):
+        self.broker = broker
+        self.value_serializer = value_serializer
+        self.key_serializer = key_serializer
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    async def flush(self):
+        pass
+
+    async def send(
+            self,
+            topic: str,
+            value: Any = None,
+            key: Any = None,
+            partition: Optional[int] = None,
+            **kwargs
+    ) -> asyncio.Future:
+        """发送消息，返回投递结果future"""
+        if self.value_serializer is not None:
+            value = self.value_serializer(value)
+        if key is not None and self.key_serializer is not None:
+            key = self.key_serializer(key)
+        future = asyncio.get_running_loop().create_future()
+        future.set_result(self.broker.append(topic, value, key, partition))
+        return future
+
+    async def send_and_wait(self, topic: str, value: Any = None, key: Any = None, **kwargs):
+        """发送消息并等待投递结果"""
+        future = await self.send(topic, value, key, **kwargs)
+        return await future
+
+
+class InMemoryConsumer:
+    """模拟AIOKafkaConsumer接口的内存消费者：订阅时独占全部分区，未指定主题时用assign手动分配分区"""
+
+    def __init__(
+            self,
+            *topics: str,
+            broker: InMemoryBroker,
+            group_id: str = None,
+            auto_offset_reset: str = 'latest',
+            value_deserializer: Optional[Callable] = None,
+            **kwargs
+    ):
+        self.broker = broker
+        self._topics = topics
+        self.group_id = group_id
+        self.auto_offset_reset = auto_offset_reset
+        self.value_deserializer = value_deserializer
+        self._positions: Dict[TopicPartition, int] = {}
+        self._rotation = 0
+
+    async def start(self):
+        """分配分区并定位消费位置"""
+        for topic in self._topics:
+            for tp in self.broker.partitions_for(topic):
+                self._positions[tp] = self._initial_position(tp)
+        logger.info(f"内存消费者已启动，分区数: {len(self._positions)}")
+
+    async def stop(self):
+        pass
+
+    def assign(self, partitions: Iterable[TopicPartition]):
+        """手动分配分区，替换之前的分配；新分区从已提交offset继续消费"""
+        partitions = [TopicPartition(*tp) for tp in partitions]
+        self._positions = {
+            tp: self._positions[tp] if tp in self._positions else self._initial_position(tp)
+            for tp in partitions
+        }
+
+    def _initial_position(self, tp: TopicPartition) -> int:
+        committed = self.broker.committed(self.group_id, tp)
+        if committed is not None:
+            return committed
+        if self.auto_offset_reset == 'earliest':
+            return 0
+        return self.broker.end_offset(tp)
+
+    def assignment(self):
+        return set(self._positions)
+
+    def partitions_for_topic(self, topic: str):
+        return {tp.partition for tp in self.broker.partitions_for(topic)}
+
+    async def getmany(
+            self,
+            *partitions: TopicPartition,
+            timeout_ms: int = 0,
+            max_records: Optional[int] = None
+    ) -> Dict[TopicPartition, List[ConsumerRecord]]:
+        """批量拉取消息，无消息时最多等待timeout_ms"""
+        result = self._fetch(partitions or tuple(self._positions), max_records)
+        if not result and timeout_ms > 0:
+            await self.broker.wait_for_data(timeout_ms / 1000)
+            result = self._fetch(partitions or tuple(self._positions), max_records)
+        return result
+
+    def _fetch(self, partitions, max_records: Optional[int]):
+        result = {}
+        remaining = max_records or float('inf')
+        # 轮换起始分区，避免max_records限制下后面的分区饥饿
+        self._rotation = (self._rotation + 1) % max(len(partitions), 1)
+        for tp in partitions[self._rotation:] + partitions[:self._rotation]:
+            if remaining <= 0:
+                break
+            records = self.broker.read(tp, self._positions[tp], int(min(remaining, 1 << 30)))
+            if not records:
+                continue
+            self._positions[tp] += len(records)
+            remaining -= len(records)
+            if self.value_deserializer is not None:
+                records = [r._replace(value=self.value_deserializer(r.value)) for r in records]
+            result[tp] = records
+        return result
+
+    async def commit(self, offsets: Optional[Dict[TopicPartition, int]] = None):
+        """提交offset，未指定时提交当前消费位置"""
+        if offsets is None:
+            offsets = dict(self._positions)
+        self.broker.commit(self.group_id, {
+            TopicPartition(*tp): (offset[0] if isinstance(offset, tuple) else offset)
+            for tp, offset in offsets.items()
+        })
+
+    async def committed(self, tp: TopicPartition) -> Optional[int]:
+        return self.broker.committed(self.group_id, tp)
+
+    def seek(self, tp: TopicPartition, offset: int):
+        self._positions[tp] = offset
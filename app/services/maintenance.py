@@ -1,5 +1,7 @@
+import asyncio
+import time
 from datetime import datetime
-from typing import List
+from typing import Dict, List, Optional
 
 import httpx
 
@@ -8,15 +10,116 @@ from app.utils.logger import logger
 
 
 class MaintenanceService:
-    def __init__(self):
+    """
+    运维平台通知
+    - 使用长连接池的共享客户端，避免每次通知重新建立TCP/TLS连接
+    - 通知先进入队列，同一场站在合并窗口内的桩列表合并为一次请求
+    - 发送失败按指数退避重试，仍失败时放回队列等待下一个窗口，连续失败超过MAINTENANCE_REQUEUE_LIMIT个窗口后丢弃
+    """
+
+    def __init__(self, client: httpx.AsyncClient = None):
         self.base_url = settings.MAINTENANCE_API_URL
         self.timeout = settings.MAINTENANCE_API_TIMEOUT
+        self.window = settings.MAINTENANCE_NOTIFY_WINDOW
+        self.client = client
+        self._owns_client = client is None
+        self._pending: Dict[str, Dict[str, None]] = {}  # 场站 -> 待通知的桩SN（保持顺序去重）
+        self._attempts: Dict[str, int] = {}  # 场站 -> 连续发送失败的窗口数
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+        # 通知指标
+        self.notifications = 0
+        self.requests = 0
+        self.retries = 0
+        self.failures = 0
+        self.dropped = 0  # 多次失败后丢弃的场站通知
+        self.total_latency = 0.0
+
+    async def start(self):
+        """创建连接池并启动通知队列"""
+        if self.client is None:
+            self.client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=settings.MAINTENANCE_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.MAINTENANCE_MAX_CONNECTIONS
+                )
+            )
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+        logger.info("运维平台通知服务已启动")
+
+    async def stop(self):
+        """发送队列中剩余的通知并关闭连接池"""
+        if self._task is not None:
+            # 等待进行中的发送完成再取消，避免丢失已出队的通知
+            async with self._flush_lock:
+                self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush(requeue=False)
+        if self._owns_client and self.client is not None:
+            await self.client.aclose()
+            self.client = None
+        logger.info("运维平台通知服务已关闭")
 
     async def notify_maintenance(self, site_no: str, pile_sns: List[str]):
-        """通知运维平台上报数据"""
-        try:
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.post(
+        """通知运维平台上报数据（加入队列，按场站合并发送）"""
+        self.notifications += 1
+        if self._task is None:
+            # 未启动队列时直接发送
+            await self.send(site_no, pile_sns)
+            return
+        self._pending.setdefault(site_no, {}).update(dict.fromkeys(pile_sns))
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.window)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"运维平台通知队列处理失败: {str(e)}")
+
+    async def flush(self, requeue: bool = True) -> int:
+        """发送当前队列中的全部场站通知，返回成功的请求数"""
+        async with self._flush_lock:
+            if not self._pending:
+                return 0
+            batch, self._pending = self._pending, {}
+            results = await asyncio.gather(
+                *(self.send(site_no, list(pile_sns)) for site_no, pile_sns in batch.items()),
+                return_exceptions=True
+            )
+        sent = 0
+        for (site_no, pile_sns), result in zip(batch.items(), results):
+            if not isinstance(result, Exception):
+                sent += 1
+                self._attempts.pop(site_no, None)
+                continue
+            attempts = self._attempts[site_no] = self._attempts.get(site_no, 0) + 1
+            if requeue and attempts < settings.MAINTENANCE_REQUEUE_LIMIT:
+                # 与窗口内新到的通知合并，下次重试
+                self._pending.setdefault(site_no, {}).update(pile_sns)
+                continue
+            self._attempts.pop(site_no, None)
+            self.dropped += 1
+            logger.error(f"运维平台通知丢弃: {site_no}, {len(pile_sns)} 个桩, 已失败 {attempts} 次")
+        return sent
+
+    async def send(self, site_no: str, pile_sns: List[str]) -> Dict:
+        """发送一次通知，失败时按指数退避重试"""
+        if self.client is None:
+            raise RuntimeError("运维平台通知服务未启动")
+        delay = settings.MAINTENANCE_RETRY_BACKOFF
+        for attempt in range(1, settings.MAINTENANCE_RETRY_ATTEMPTS + 1):
+            start = time.perf_counter()
+            try:
+                self.requests += 1
+                response = await self.client.post(
                     f"{self.base_url}/notify",
                     json={
                         "site_no": site_no,
@@ -25,8 +128,28 @@ class MaintenanceService:
                     }
                 )
                 response.raise_for_status()
-                logger.info(f"成功通知运维平台: {site_no}, {pile_sns}")
+                self.total_latency += time.perf_counter() - start
+                logger.info(f"成功通知运维平台: {site_no}, {len(pile_sns)} 个桩")
                 return response.json()
-        except Exception as e:
-            logger.error(f"通知运维平台失败: {str(e)}")
-            raise
\ No newline at end of file
+            except Exception as e:
+                if attempt == settings.MAINTENANCE_RETRY_ATTEMPTS:
+                    self.failures += 1
+                    logger.error(f"通知运维平台失败: {site_no}, {str(e)}")
+                    raise
+                self.retries += 1
+                logger.warning(f"通知运维平台失败，{delay:.1f}秒后重试: {site_no}, {str(e)}")
+                await asyncio.sleep(delay)
+                delay *= 2
+
+    def stats(self) -> Dict:
+        """通知指标"""
+        sent = self.requests - self.retries - self.failures
+        return {
+            "pending_sites": len(self._pending),
+            "notifications": self.notifications,
+            "requests": self.requests,
+            "retries": self.retries,
+            "failures": self.failures,
+            "dropped": self.dropped,
+            "avg_latency_ms": self.total_latency / sent * 1000 if sent > 0 else 0.0
+        }
@@ -1,108 +1,156 @@
 import asyncio
+import time
 from datetime import datetime
-from typing import Dict
+from typing import Dict, List, Optional
 
 from app.core.config import settings
-from app.models.schemas import AlertMessage
+from app.models.schemas import AlertConfig, AlertMessage
+from app.services.alert_rules import ALL_SITES, AlertFrame, AlertRuleEngine
+from app.services.alert_stream import StreamingAlertEvaluator
+from app.services.alert_tracker import AlertTracker, STATUS_ACTIVE
+from app.services.charger_state import ChargerStateStore, get_charger_states_bulk
 from app.services.database import DatabaseService
 from app.utils.logger import logger
 
 
 class MonitoringService:
-    def __init__(self, db_service: DatabaseService):
+    def __init__(self, db_service: DatabaseService, state_store: ChargerStateStore = None, shards=None):
         self.db_service = db_service
-        self.alert_configs = {}
+        self.state_store = state_store or ChargerStateStore()
+        self.shards = shards  # ShardCoordinator，多节点部署时只巡检本节点负责的场站
+        self.alert_configs: Dict[str, List[AlertConfig]] = {}
+        self.rule_engine = AlertRuleEngine()
+        self.alert_tracker = AlertTracker(
+            settings.ALERT_RESOLVE_AFTER,
+            settings.ALERT_UPDATE_INTERVAL,
+            settings.ALERT_SUPPRESS_WINDOW
+        )
+        # 消息驱动告警，由KafkaService在处理功率/插拔枪消息时调用
+        self.alert_stream = (
+            StreamingAlertEvaluator(db_service, self.rule_engine, self.alert_tracker)
+            if settings.ALERT_STREAMING else None
+        )
         self._running = False
+        self._task: Optional[asyncio.Task] = None
+        if shards is not None:
+            shards.add_listener(self._on_rebalance)
+
+        # 巡检指标
+        self.ticks = 0
+        self.overruns = 0  # 单轮耗时超过巡检间隔的次数
+        self.sites_checked = 0
+        self.last_tick_duration = 0.0
+        self.max_tick_duration = 0.0
+        self.lag = 0.0  # 本轮实际开始时间相对计划时间的延迟
 
     async def start(self):
         """启动监控服务"""
         self._running = True
         await self._load_alert_configs()
-        asyncio.create_task(self._monitoring_loop())
+        self.alert_tracker.restore(await self._owned_active_alerts())
+        self._task = asyncio.create_task(self._monitoring_loop())
 
     async def stop(self):
         """停止监控服务"""
         self._running = False
+        if self._task is not None:
+            self._task.cancel()
 
     async def _monitoring_loop(self):
-        """监控循环"""
+        """监控循环（固定频率，单轮超时时立即开始下一轮）"""
+        interval = settings.MONITORING_INTERVAL
+        scheduled = time.monotonic()
         while self._running:
+            started = time.monotonic()
+            self.lag = max(0.0, started - scheduled)
             try:
-                # 获取所有场站状态
-                sites = await self.db_service.get_all_active_sites()
-
-                for site in sites:
-                    # 检查场站状态
-                    await self._check_site_status(site)
-                    # 检查充电桩状态
-                    await self._check_charger_status(site.site_no)
-                    # 检查功率分配
-                    await self._check_power_allocation(site.site_no)
-
-                await asyncio.sleep(settings.MONITORING_INTERVAL)
-
+                await self._run_checks()
             except Exception as e:
                 logger.error(f"监控循环异常: {str(e)}")
-                await asyncio.sleep(5)
-
-    async def _check_site_status(self, site: Dict):
-        """检查场站状态"""
-        try:
-            # 检查总功率是否超限
-            if site['current_power'] > site['total_power_limit']:
-                await self._create_alert(
-                    site_no=site['site_no'],
-                    alert_type="POWER_EXCEED",
-                    message=f"场站总功率超限: {site['current_power']}kW > {site['total_power_limit']}kW"
-                )
-
-            # 检查需求响应
-            if site['current_power'] > site['demand']:
-                await self._create_alert(
-                    site_no=site['site_no'],
-                    alert_type="DEMAND_EXCEED",
-                    message=f"场站功率超过需求: {site['current_power']}kW > {site['demand']}kW"
-                )
-
-        except Exception as e:
-            logger.error(f"场站状态检查失败: {str(e)}")
-
-    async def _check_charger_status(self, site_no: str):
-        """检查充电桩状态"""
-        try:
-            chargers = await self.db_service.get_charger_states(site_no)
-
-            for charger in chargers:
-                # 检查充电异常
-                if charger['status'] == 'ERROR':
-                    await self._create_alert(
-                        site_no=site_no,
-                        alert_type="CHARGER_ERROR",
-                        message=f"充电桩故障: {charger['charger_sn']}"
-                    )
-
-                # 检查功率异常
-                if charger['current_power'] > charger['rated_power']:
-                    await self._create_alert(
-                        site_no=site_no,
-                        alert_type="CHARGER_POWER_EXCEED",
-                        message=f"充电桩功率超限: {charger['charger_sn']}"
-                    )
-
-        except Exception as e:
-            logger.error(f"充电桩状态检查失败: {str(e)}")
-
-    async def _create_alert(self, site_no: str, alert_type: str, message: str):
-        """创建告警"""
-        try:
-            alert = AlertMessage(
-                site_no=site_no,
-                alert_type=alert_type,
-                message=message,
-                created_at=datetime.utcnow()
-            )
-            await self.db_service.save_alert(alert)
-            logger.warning(f"创建告警: {message}")
-
-        except Exception as e:
-            logger.error(f"创建告警失败: {str(e)}")
\ No newline at end of file
+
+            duration = time.monotonic() - started
+            self.ticks += 1
+            self.last_tick_duration = duration
+            self.max_tick_duration = max(self.max_tick_duration, duration)
+            if duration > interval:
+                self.overruns += 1
+                logger.warning(f"监控巡检耗时 {duration:.1f}s 超过间隔 {interval}s")
+
+            scheduled = max(scheduled + interval, time.monotonic())
+            await asyncio.sleep(scheduled - time.monotonic())
+
+    async def _run_checks(self):
+        """一轮巡检：批量获取全部场站状态，按列计算全部告警规则"""
+        # 获取所有场站拓扑和充电枪状态（批量查询）
+        sites = await self.db_service.get_active_site_topologies()
+        if self.shards is not None:
+            sites = [site for site in sites if self.shards.owns(site.site_no)]
+        charger_states = await get_charger_states_bulk(self.db_service, self.state_store, sites)
+
+        alerts = self.rule_engine.evaluate(AlertFrame.build(sites, charger_states))
+        # 去重后只写入新建/恢复/到期更新的告警
+        now = datetime.utcnow()
+        rows = self.alert_tracker.observe(alerts, now) + self.alert_tracker.resolve_stale(now)
+        await self.db_service.save_alerts(rows)
+        self.sites_checked = len(sites)
+
+    async def _load_alert_configs(self):
+        """加载告警配置并编译规则"""
+        configs = await self.db_service.get_alert_configs()
+        self.alert_configs = {}
+        for config in configs:
+            self.alert_configs.setdefault(config.site_no, []).append(config)
+        self.rule_engine.compile(configs)
+        logger.info(f"告警规则已加载，配置数: {len(configs)}, 规则数: {len(self.rule_engine.rules)}")
+
+    async def add_alert_config(self, config: AlertConfig):
+        """新增告警配置并重新编译规则"""
+        record = await self.db_service.save_alert_config(config)
+        await self._load_alert_configs()
+        return record
+
+    async def get_alert_configs(self, site_no: str) -> List[AlertConfig]:
+        """获取场站告警配置（含全场站配置）"""
+        return self.alert_configs.get(site_no, []) + self.alert_configs.get(ALL_SITES, [])
+
+    async def get_alerts(
+            self,
+            site_no: str,
+            start_time: str = None,
+            end_time: str = None,
+            alert_type: str = None
+    ) -> List[AlertMessage]:
+        """查询场站告警"""
+        return await self.db_service.get_alerts(
+            site_no,
+            datetime.fromisoformat(start_time) if start_time else None,
+            datetime.fromisoformat(end_time) if end_time else None,
+            alert_type
+        )
+
+    async def _owned_active_alerts(self) -> List[AlertMessage]:
+        """本节点负责的场站中未恢复的告警"""
+        alerts = await self.db_service.get_alerts(status=STATUS_ACTIVE)
+        if self.shards is None:
+            return alerts
+        return [alert for alert in alerts if self.shards.owns(alert.site_no)]
+
+    async def _on_rebalance(self):
+        """分片变化：交出不再负责的场站的告警，接管新场站未恢复的告警"""
+        released = self.alert_tracker.release(self.shards.owns)
+        self.alert_tracker.restore(await self._owned_active_alerts())
+        logger.info(f"告警跟踪重新划分完成，交出告警: {released}, 跟踪中告警: {len(self.alert_tracker.active)}")
+
+    def get_metrics(self) -> Dict:
+        """获取巡检指标"""
+        return {
+            "ticks": self.ticks,
+            "overruns": self.overruns,
+            "sites_checked": self.sites_checked,
+            "last_tick_duration": self.last_tick_duration,
+            "max_tick_duration": self.max_tick_duration,
+            "lag": self.lag,
+            "interval": settings.MONITORING_INTERVAL,
+            "alerts": self.alert_tracker.stats(),
+            "streaming": self.alert_stream.stats() if self.alert_stream else None
+        }
@@ -0,0 +1,192 @@
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# 聚合粒度(秒)：1分钟、15分钟、1小时
+ROLLUP_RESOLUTIONS = (60, 900, 3600)
+SITE_TOTAL = ''  # 场站汇总行的charger_sn
+
+_EPOCH = datetime(1970, 1, 1)
+
+# (site_no, charger_sn, resolution, bucket_start) -> [samples, power_sum, power_min, power_max, energy]
+BucketKey = Tuple[str, str, int, datetime]
+
+
+def bucket_start(timestamp: datetime, resolution: int) -> datetime:
+    """时间戳对齐到所在时间桶的起始时间（UTC）"""
+    seconds = int((timestamp - _EPOCH).total_seconds())
+    return _EPOCH + timedelta(seconds=seconds - seconds % resolution)
+
+
+def choose_resolution(start_time: datetime, end_time: datetime, max_points: int,
+                      resolutions: Sequence[int] = ROLLUP_RESOLUTIONS) -> int:
+    """选择数据点不超过max_points的最细粒度"""
+    span = (end_time - start_time).total_seconds()
+    for resolution in resolutions:
+        if span / resolution <= max_points:
+            return resolution
+    return resolutions[-1]
+
+
+class PowerRollupAggregator:
+    """
+    功率分时聚合，随遥测增量更新
+    - 单枪：按charger_resolutions聚合功率采样的最小/最大/累计值，电量按与上次上报的时间差积分
+    - 场站：维护场站总功率（各枪最新功率之和），按每秒一次的固定网格采样，
+            与各枪上报频率无关；电量为场站总功率对时间的积分
+    内存中只保存上次落库之后的增量，由drain取出后累加写入数据库
+    """
+
+    def __init__(
+            self,
+            resolutions: Sequence[int] = ROLLUP_RESOLUTIONS,
+            max_gap: float = 60,
+            charger_resolutions: Sequence[int] = None
+    ):
+        self.resolutions = tuple(resolutions)
+        # 单枪聚合只保留较粗粒度，控制行数
+        self.charger_resolutions = self.resolutions[-1:] if charger_resolutions is None else tuple(charger_resolutions)
+        self.max_gap = max_gap  # 两次上报间隔超过该值(秒)时按该值积分，避免断线期间电量虚高
+        self._last: Dict[str, Tuple[str, float, datetime]] = {}  # charger_sn -> (site_no, 功率, 上报时间)
+        self._site_power: Dict[str, Tuple[float, int]] = {}  # site_no -> (总功率, 已采样到的秒)
+        self._deltas: Dict[BucketKey, List[float]] = {}
+
+    def add(self, site_no: str, charger_sn: str, power: float, timestamp: datetime):
+        """记录一次功率上报(kW)"""
+        previous = self._last.get(charger_sn)
+        energy = 0.0
+        site_change = power
+        if previous is not None:
+            previous_site, previous_power, previous_at = previous
+            gap = (timestamp - previous_at).total_seconds()
+            if 0 < gap:
+                energy = previous_power * min(gap, self.max_gap) / 3600
+            if previous_site == site_no:
+                site_change -= previous_power
+            else:
+                self._change_site_power(previous_site, -previous_power, timestamp)
+        self._last[charger_sn] = (site_no, power, timestamp)
+        self._change_site_power(site_no, site_change, timestamp)
+
+        for resolution in self.charger_resolutions:
+            self._accumulate((site_no, charger_sn, resolution, bucket_start(timestamp, resolution)), power, energy)
+
+    def _change_site_power(self, site_no: str, change: float, timestamp: datetime):
+        """场站总功率变化前，将原功率按秒计入其持续期间所在的时间桶"""
+        second = int((timestamp - _EPOCH).total_seconds())
+        power, sampled = self._site_power.get(site_no, (0.0, second))
+        # 未上报期间最多保持max_gap秒，乱序的上报不回补
+        end = min(second, sampled + int(self.max_gap))
+        if end > sampled:
+            for resolution in self.resolutions:
+                cursor = sampled
+                while cursor < end:
+                    start = cursor - cursor % resolution
+                    stop = min(end, start + resolution)
+                    count = stop - cursor
+                    self._accumulate(
+                        (site_no, SITE_TOTAL, resolution, _EPOCH + timedelta(seconds=start)),
+                        power, power * count / 3600, count
+                    )
+                    cursor = stop
+        self._site_power[site_no] = (power + change, max(sampled, second))
+
+    def _accumulate(self, key: BucketKey, power: float, energy: float, samples: int = 1):
+        delta = self._deltas.get(key)
+        if delta is None:
+            self._deltas[key] = [samples, power * samples, power, power, energy]
+            return
+        delta[0] += samples
+        delta[1] += power * samples
+        if power < delta[2]:
+            delta[2] = power
+        if power > delta[3]:
+            delta[3] = power
+        delta[4] += energy
+
+    def remove(self, charger_sn: str, timestamp: datetime):
+        """拔枪：积分最后一段电量并从场站总功率中移除"""
+        previous = self._last.get(charger_sn)
+        if previous is None:
+            return
+        self.add(previous[0], charger_sn, 0.0, timestamp)
+        del self._last[charger_sn]
+
+    def drain(self) -> List[Dict]:
+        """取出全部增量，转换为待写库的行"""
+        deltas, self._deltas = self._deltas, {}
+        return [
+            {
+                "site_no": site_no,
+                "charger_sn": charger_sn,
+                "resolution": resolution,
+                "bucket_start": start,
+                "samples": int(samples),
+                "power_sum": power_sum,
+                "power_min": power_min,
+                "power_max": power_max,
+                "energy": energy
+            }
+            for (site_no, charger_sn, resolution, start), (samples, power_sum, power_min, power_max, energy)
+            in deltas.items()
+        ]
+
+    def restore(self, rows: List[Dict]):
+        """写库失败时放回增量"""
+        for row in rows:
+            key = (row["site_no"], row["charger_sn"], row["resolution"], row["bucket_start"])
+            delta = self._deltas.get(key)
+            if delta is None:
+                self._deltas[key] = [
+                    row["samples"], row["power_sum"], row["power_min"], row["power_max"], row["energy"]
+                ]
+                continue
+            delta[0] += row["samples"]
+            delta[1] += row["power_sum"]
+            delta[2] = min(delta[2], row["power_min"])
+            delta[3] = max(delta[3], row["power_max"])
+            delta[4] += row["energy"]
+
+    def pending(self, site_no: str, charger_sn: str, resolution: int) -> Dict[datetime, List[float]]:
+        """未落库的增量（查询时与数据库结果合并）"""
+        return {
+            key[3]: delta for key, delta in self._deltas.items()
+            if key[0] == site_no and key[1] == charger_sn and key[2] == resolution
+        }
+
+    def __len__(self):
+        return len(self._deltas)
+
+
+def summarize_buckets(rows: List[Tuple[datetime, int, float, float, float, float]],
+                      demand: Optional[float]) -> Dict:
+    """汇总时间桶为PowerStatistics字段"""
+    data_points = []
+    total_energy = 0.0
+    total_samples, total_power_sum = 0, 0.0
+    max_power, min_power = None, None
+    satisfied = 0
+    for start, samples, power_sum, power_min, power_max, energy in rows:
+        avg_power = power_sum / samples if samples else 0.0
+        data_points.append({
+            "timestamp": (start - _EPOCH).total_seconds(),
+            "avg_power": avg_power,
+            "min_power": power_min,
+            "max_power": power_max,
+            "energy": energy
+        })
+        total_energy += energy
+        total_samples += samples
+        total_power_sum += power_sum
+        max_power = power_max if max_power is None else max(max_power, power_max)
+        min_power = power_min if min_power is None else min(min_power, power_min)
+        if demand is None or power_max <= demand:
+            satisfied += 1
+
+    return {
+        "total_power": total_energy,  # 统计区间内总电量(kWh)
+        "max_power": max_power or 0.0,
+        "min_power": min_power or 0.0,
+        "avg_power": total_power_sum / total_samples if total_samples else 0.0,
+        "demand_satisfaction_rate": satisfied / len(rows) if rows else 1.0,
+        "data_points": data_points
+    }
@@ -0,0 +1,347 @@
+import asyncio
+import heapq
+import itertools
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.utils.logger import logger
+
+# 优化优先级，数值越小越先执行
+PRIORITY_DEMAND = 0  # 需求响应（demand变化），只受较短的需求响应最小间隔限制
+PRIORITY_NORMAL = 1  # 插拔枪、手动触发等
+
+# 优化任务状态，对应OptimizationTask.status
+TASK_PENDING = "PENDING"
+TASK_RUNNING = "RUNNING"
+TASK_DONE = "DONE"
+TASK_FAILED = "FAILED"
+TASK_MERGED = "MERGED"  # 与同一场站的其他任务合并执行
+
+
+class _SiteTask:
+    """场站待执行的优化，执行前的多次触发合并到同一个任务"""
+    __slots__ = ("site_no", "priority", "task_type", "task_id", "submitted", "triggers", "seq", "reclaim")
+
+    def __init__(self, site_no: str, priority: int, task_type: Optional[int], submitted: float):
+        self.site_no = site_no
+        self.priority = priority
+        self.task_type = task_type
+        self.task_id: Optional[int] = None
+        self.submitted = submitted
+        self.triggers = 1
+        self.seq = 0  # 入队版本，队列中版本不一致的条目已失效
+        self.reclaim = False  # 接管其他节点执行中（分片变化前）的任务
+
+
+class OptimizationScheduler:
+    """
+    场站级优化执行器
+    - 固定数量的执行协程，按优先级从队列取任务，需求响应优先执行
+    - 同一场站同时最多一个优化在执行，执行前的触发合并为一次，执行期间的触发在结束后补跑一次
+    - 普通优先级的同一场站两次优化至少间隔interval秒，需求响应至少间隔demand_interval秒（合并连续的需求变化）
+    - 配置store时任务状态写入OptimizationTask，启动时恢复未完成的任务
+    - 场站分片时只执行本节点负责的场站：其他场站的触发只写入任务表，由负责节点定时领取执行
+    - 由runner在执行时读取场站最新状态，返回值写入任务结果
+    """
+
+    def __init__(
+            self,
+            runner: Callable[[str, Optional[int]], Awaitable[Optional[Dict]]],
+            interval: float,
+            workers: int = 4,
+            store=None,
+            shards=None,
+            poll_interval: float = 0,
+            demand_interval: float = 0
+    ):
+        self.runner = runner
+        self.interval = interval
+        self.num_workers = workers
+        self.store = store
+        self.shards = shards  # ShardCoordinator，未分片时为None
+        self.poll_interval = poll_interval
+        self.demand_interval = demand_interval
+        self._pending: Dict[str, _SiteTask] = {}
+        self._running: Dict[str, int] = {}  # 执行中的场站 -> 任务ID
+        self._last_run: Dict[str, float] = {}
+        self._ready: List[Tuple[int, int, str]] = []  # (优先级, 序号, 场站)
+        self._delayed: List[Tuple[float, int, str]] = []  # (可执行时间, 序号, 场站)
+        self._counter = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._workers: List[asyncio.Task] = []
+        self._poll_task: Optional[asyncio.Task] = None
+
+        # 调度指标
+        self.triggered = 0
+        self.executed = 0
+        self.failed = 0
+        self.adopted = 0  # 恢复或领取的任务
+        self.routed = 0  # 转交给其他节点的触发
+        self.skipped = 0  # 已由其他节点领取的任务
+        self.released = 0  # 分片变化后放弃的待执行任务
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.run_total = 0.0
+        self.run_max = 0.0
+
+    async def start(self):
+        """恢复未完成的任务并启动执行协程"""
+        if self.store is not None:
+            try:
+                adopted = await self.adopt(await self.store.get_unfinished_optimization_tasks())
+                if adopted:
+                    logger.info(f"恢复未完成的优化任务: {adopted} 个场站")
+            except Exception as e:
+                logger.error(f"恢复优化任务失败: {str(e)}")
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.num_workers)]
+        if self.store is not None and self.shards is not None and self.poll_interval > 0:
+            self._poll_task = asyncio.create_task(self._poll_loop())
+        logger.info(f"优化执行器已启动，执行协程数: {self.num_workers}")
+
+    async def stop(self):
+        """停止执行协程，未执行的任务保留在OptimizationTask中，下次启动时恢复"""
+        tasks = [*self._workers, self._poll_task] if self._poll_task else self._workers
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._workers = []
+        self._poll_task = None
+        self._pending.clear()
+        self._ready.clear()
+        self._delayed.clear()
+
+    def owns(self, site_no: str) -> bool:
+        return self.shards is None or self.shards.owns(site_no)
+
+    async def schedule(self, site_no: str, priority: int = PRIORITY_NORMAL, task_type: int = None) -> Optional[int]:
+        """提交场站优化触发，返回合并后的任务ID"""
+        if not self.owns(site_no) and self.store is not None:
+            # 其他节点负责的场站：写入任务表，由负责节点领取
+            self.routed += 1
+            return await self.store.create_optimization_task(site_no, priority, task_type)
+
+        self.triggered += 1
+        task = self._pending.get(site_no)
+        if task is not None:
+            # 合并到待执行任务，优先级取高者，算法类型以最新指定为准
+            task.triggers += 1
+            if task_type is not None:
+                task.task_type = task_type
+            if priority < task.priority:
+                task.priority = priority
+                if task.task_id is not None:
+                    self._enqueue(task)
+            return task.task_id or None
+
+        task = _SiteTask(site_no, priority, task_type, asyncio.get_running_loop().time())
+        self._pending[site_no] = task
+        if self.store is not None:
+            try:
+                task.task_id = await self.store.create_optimization_task(site_no, priority, task_type)
+            except Exception as e:
+                logger.error(f"保存优化任务失败: {site_no}, {str(e)}")
+                task.task_id = 0  # 保存失败时仍在内存中执行
+        else:
+            task.task_id = 0
+        if self._pending.get(site_no) is task:
+            self._enqueue(task)
+        return task.task_id or None
+
+    async def adopt(self, rows: List[Dict]) -> int:
+        """
+        接管上次运行未完成或其他节点转交的任务（按任务ID升序）
+        每个场站合并为一个待执行任务，其余任务标记为已合并，返回新增的待执行场站数
+        """
+        loop = asyncio.get_running_loop()
+        known = {task.task_id for task in self._pending.values()} | set(self._running.values())
+        adopted = 0
+        for row in rows:
+            site_no = row["site_no"]
+            if row["task_id"] in known or not self.owns(site_no):
+                continue
+            priority = PRIORITY_NORMAL if row.get("priority") is None else row["priority"]
+            triggers = row.get("triggers") or 1
+            task = self._pending.get(site_no)
+            if task is not None:
+                task.triggers += triggers
+                if task.task_type is None:
+                    task.task_type = row.get("task_type")
+                if priority < task.priority:
+                    task.priority = priority
+                    if task.task_id is not None:
+                        self._enqueue(task)
+                await self._update_row(row["task_id"], status=TASK_MERGED, error=f"合并到任务 {task.task_id}")
+                continue
+
+            task = _SiteTask(site_no, priority, row.get("task_type"), loop.time())
+            task.task_id = row["task_id"]
+            task.triggers = triggers
+            task.reclaim = (
+                self.shards is not None
+                and row.get("status") == TASK_RUNNING
+                and row.get("node_id") != self.shards.node_id
+            )
+            self._pending[site_no] = task
+            known.add(task.task_id)
+            self._enqueue(task)
+            adopted += 1
+        self.adopted += adopted
+        return adopted
+
+    def release(self) -> int:
+        """分片变化后放弃不再负责的场站的待执行任务，任务在任务表中保持待执行，由新节点领取"""
+        released = [site_no for site_no in self._pending if not self.owns(site_no)]
+        for site_no in released:
+            del self._pending[site_no]
+        self.released += len(released)
+        return len(released)
+
+    async def _poll_loop(self):
+        """定时领取转交给本节点的任务，以及分片变化前由其他节点执行、现归本节点负责的任务"""
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                await self.adopt(await self.store.get_unfinished_optimization_tasks())
+            except Exception as e:
+                logger.error(f"领取优化任务失败: {str(e)}")
+
+    def _enqueue(self, task: _SiteTask):
+        """任务入队，执行中的场站在结束后入队"""
+        if task.site_no in self._running:
+            return
+        task.seq = next(self._counter)
+        loop = asyncio.get_running_loop()
+        last_run = self._last_run.get(task.site_no)
+        ready_at = loop.time()
+        if last_run is not None:
+            interval = self.demand_interval if task.priority == PRIORITY_DEMAND else self.interval
+            ready_at = max(ready_at, last_run + interval)
+        if ready_at > loop.time():
+            heapq.heappush(self._delayed, (ready_at, task.seq, task.site_no))
+        else:
+            heapq.heappush(self._ready, (task.priority, task.seq, task.site_no))
+        self._wakeup.set()
+
+    def _next(self) -> Tuple[Optional[_SiteTask], Optional[float]]:
+        """取出下一个可执行任务，没有时返回距最近延迟任务的等待时间"""
+        now = asyncio.get_running_loop().time()
+        while self._delayed and self._delayed[0][0] <= now:
+            _, seq, site_no = heapq.heappop(self._delayed)
+            task = self._pending.get(site_no)
+            if task is not None and task.seq == seq:
+                heapq.heappush(self._ready, (task.priority, seq, site_no))
+        while self._ready:
+            _, seq, site_no = heapq.heappop(self._ready)
+            task = self._pending.get(site_no)
+            if task is not None and task.seq == seq and site_no not in self._running:
+                return task, None
+        while self._delayed:
+            ready_at, seq, site_no = self._delayed[0]
+            task = self._pending.get(site_no)
+            if task is not None and task.seq == seq:
+                return None, ready_at - now
+            heapq.heappop(self._delayed)
+        return None, None
+
+    async def _worker(self):
+        while True:
+            task, timeout = self._next()
+            if task is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._execute(task)
+
+    async def _execute(self, task: _SiteTask):
+        """领取并执行一个场站优化，记录任务状态"""
+        loop = asyncio.get_running_loop()
+        site_no = task.site_no
+        del self._pending[site_no]
+        if not self.owns(site_no):
+            self.released += 1
+            return
+        self._running[site_no] = task.task_id
+        try:
+            if not await self._claim(task):
+                self.skipped += 1
+                logger.info(f"优化任务 {task.task_id} 已由其他节点领取，跳过: {site_no}")
+                return
+
+            start = loop.time()
+            self._last_run[site_no] = start
+            wait = start - task.submitted
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+            try:
+                result = await self.runner(site_no, task.task_type)
+                self.executed += 1
+                await self._update(task, status=TASK_DONE, end_time=datetime.utcnow(), **(result or {}))
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"场站 {site_no} 功率优化失败: {str(e)}")
+                await self._update(task, status=TASK_FAILED, end_time=datetime.utcnow(), error=str(e)[:500])
+            finally:
+                elapsed = loop.time() - start
+                self.run_total += elapsed
+                self.run_max = max(self.run_max, elapsed)
+        finally:
+            self._running.pop(site_no, None)
+            pending = self._pending.get(site_no)
+            if pending is not None and pending.task_id is not None:
+                self._enqueue(pending)
+
+    async def _claim(self, task: _SiteTask) -> bool:
+        """在任务表中领取任务，分片时领取失败的任务不执行"""
+        if self.store is None or not task.task_id:
+            return True
+        try:
+            return await self.store.claim_optimization_task(
+                task.task_id,
+                self.shards.node_id if self.shards else None,
+                task.triggers,
+                task.reclaim
+            )
+        except Exception as e:
+            logger.error(f"领取优化任务失败: {task.task_id}, {str(e)}")
+            # 未分片时仍在本节点执行；分片时保持待执行，由下次领取重试
+            return self.shards is None
+
+    async def _update(self, task: _SiteTask, **values):
+        """写入任务状态，失败时不影响优化执行"""
+        if self.store is None or not task.task_id:
+            return
+        await self._update_row(task.task_id, **values)
+
+    async def _update_row(self, task_id: int, **values):
+        try:
+            await self.store.update_optimization_task(task_id, **values)
+        except Exception as e:
+            logger.error(f"更新优化任务状态失败: {task_id}, {str(e)}")
+
+    def stats(self) -> Dict:
+        """调度指标"""
+        finished = self.executed + self.failed
+        started = finished + len(self._running)
+        return {
+            "workers": self.num_workers,
+            "queue_depth": len(self._pending),
+            "queue_demand": sum(1 for task in self._pending.values() if task.priority == PRIORITY_DEMAND),
+            "running": len(self._running),
+            "triggered": self.triggered,
+            "executed": self.executed,
+            "failed": self.failed,
+            "adopted": self.adopted,
+            "routed": self.routed,
+            "skipped": self.skipped,
+            "released": self.released,
+            "coalesced": (
+                self.triggered + self.adopted - started - self.skipped - self.released - len(self._pending)
+            ),
+            "avg_wait_ms": self.wait_total / started * 1000 if started else 0.0,
+            "max_wait_ms": self.wait_max * 1000,
+            "avg_run_ms": self.run_total / finished * 1000 if finished else 0.0,
+            "max_run_ms": self.run_max * 1000
+        }
@@ -0,0 +1,181 @@
+import asyncio
+import bisect
+import hashlib
+import os
+import socket
+import uuid
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Sequence, Set
+
+from app.core.config import settings
+from app.services.kafka_memory import default_partition
+from app.utils.logger import logger
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], 'big')
+
+
+class HashRing:
+    """
+    一致性哈希环：每个节点映射为virtual_nodes个虚拟节点
+    节点加入或离开时只有相邻区间的场站改变归属
+    """
+
+    def __init__(self, nodes: Sequence[str] = (), virtual_nodes: int = 160):
+        self.virtual_nodes = virtual_nodes
+        self.nodes = sorted(set(nodes))
+        points = sorted(
+            (_hash(f"{node}#{i}"), node)
+            for node in self.nodes
+            for i in range(virtual_nodes)
+        )
+        self._points = [point for point, _ in points]
+        self._owners = [node for _, node in points]
+
+    def owner(self, key: str) -> Optional[str]:
+        """键所属的节点，环为空时返回None"""
+        if not self._points:
+            return None
+        index = bisect.bisect(self._points, _hash(key)) % len(self._points)
+        return self._owners[index]
+
+    def assign(self, keys: Sequence[str]) -> Dict[str, str]:
+        """
+        有界负载分配：每个节点最多分到 ceil(键数/节点数) 个键，超出时顺延到环上的下一个节点
+        键数与节点数接近时（如Kafka分区）避免一致性哈希的负载倾斜，结果只取决于键顺序和节点集合
+        """
+        if not self._points:
+            return {}
+        capacity = -(-len(keys) // len(self.nodes))
+        loads = dict.fromkeys(self.nodes, 0)
+        result = {}
+        for key in keys:
+            index = bisect.bisect(self._points, _hash(key))
+            for step in range(len(self._points)):
+                node = self._owners[(index + step) % len(self._points)]
+                if loads[node] < capacity:
+                    break
+            loads[node] += 1
+            result[key] = node
+        return result
+
+
+@lru_cache(maxsize=65536)
+def site_partition(key: str, num_partitions: int) -> int:
+    """场站（消息key）所在的Kafka分区"""
+    return default_partition(key.encode('utf-8'), num_partitions)
+
+
+class ShardCoordinator:
+    """
+    场站分片：多个工作进程/节点按上行主题的Kafka分区划分场站
+    - 启动时在shard_node表中领取一个空闲或心跳超时的节点编号（shard-0、shard-1...），重启后通常领回原编号
+    - 定时心跳并读取存活节点重建哈希环，把分区按有界负载分配给存活节点，变化时通知监听者重新划分
+    - 上行消息以场站编号为key，场站归属其消息所在分区的负责节点，各节点在共享消费组中只消费自己的分区
+    """
+
+    def __init__(self, db_service, virtual_nodes: int = None, partitions: int = None):
+        self.db_service = db_service
+        self.virtual_nodes = virtual_nodes or settings.SHARD_VIRTUAL_NODES
+        self.partitions = partitions or (
+            settings.KAFKA_MEMORY_PARTITIONS if settings.KAFKA_BACKEND == 'memory'
+            else settings.KAFKA_TOPIC_PARTITIONS
+        )
+        self.token = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.node_id: Optional[str] = None
+        self.ring = HashRing((), self.virtual_nodes)
+        self.owned_partitions: Set[int] = set()
+        self._listeners: List[Callable] = []
+        self._task: Optional[asyncio.Task] = None
+
+        # 分片指标
+        self.rebalances = 0
+        self.heartbeat_failures = 0
+
+    async def start(self):
+        """领取节点编号并加载当前存活节点"""
+        self.node_id = await self.db_service.claim_shard_node(self.token, settings.SHARD_NODE_TTL)
+        await self.refresh()
+        self._task = asyncio.create_task(self._heartbeat_loop())
+        logger.info(f"场站分片已启动: {self.node_id}, 存活节点: {self.ring.nodes}")
+
+    async def stop(self):
+        """停止心跳并释放节点编号，其余节点在下次刷新时接管本节点的场站"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self.node_id is not None:
+            try:
+                await self.db_service.release_shard_node(self.node_id, self.token)
+            except Exception as e:
+                logger.error(f"释放分片节点失败: {str(e)}")
+
+    def add_listener(self, listener: Callable):
+        """注册哈希环变化的回调（无参数的协程函数）"""
+        self._listeners.append(listener)
+
+    def owns(self, key: Optional[str]) -> bool:
+        """场站是否由本节点负责"""
+        if key is None or not self.ring.nodes:
+            return True
+        return self.partition_of(key) in self.owned_partitions
+
+    def partition_of(self, key: str) -> int:
+        """场站所在的分区"""
+        return site_partition(key, self.partitions)
+
+    @property
+    def is_leader(self) -> bool:
+        """编号最小的存活节点负责全局任务"""
+        return not self.ring.nodes or self.ring.nodes[0] == self.node_id
+
+    async def refresh(self):
+        """心跳并按存活节点重建哈希环"""
+        if not await self.db_service.heartbeat_shard_node(self.node_id, self.token):
+            # 心跳超时后编号已被其他进程领取，重新领取
+            logger.warning(f"分片节点 {self.node_id} 已失效，重新领取节点编号")
+            self.node_id = await self.db_service.claim_shard_node(self.token, settings.SHARD_NODE_TTL)
+        nodes = await self.db_service.get_live_shard_nodes(settings.SHARD_NODE_TTL)
+        if self.node_id not in nodes:
+            nodes.append(self.node_id)
+        owned_partitions = self.owned_partitions
+        if sorted(nodes) != self.ring.nodes:
+            self.ring = HashRing(nodes, self.virtual_nodes)
+        assignment = self.ring.assign([f"partition-{p}" for p in range(self.partitions)])
+        self.owned_partitions = {
+            p for p in range(self.partitions)
+            if assignment[f"partition-{p}"] == self.node_id
+        }
+        if self.owned_partitions == owned_partitions:
+            return
+
+        if owned_partitions:
+            self.rebalances += 1
+            logger.info(f"分片节点变化: {self.ring.nodes}，负责分区 {sorted(owned_partitions)} -> {sorted(self.owned_partitions)}")
+        for listener in self._listeners:
+            try:
+                await listener()
+            except Exception as e:
+                logger.error(f"分片重新划分回调失败: {str(e)}")
+
+    async def _heartbeat_loop(self):
+        while True:
+            await asyncio.sleep(settings.SHARD_HEARTBEAT_INTERVAL)
+            try:
+                await self.refresh()
+            except Exception as e:
+                self.heartbeat_failures += 1
+                logger.error(f"分片心跳失败: {str(e)}")
+
+    def stats(self) -> Dict:
+        """分片指标"""
+        return {
+            "node_id": self.node_id,
+            "nodes": self.ring.nodes,
+            "partitions": sorted(self.owned_partitions),
+            "leader": self.is_leader,
+            "rebalances": self.rebalances,
+            "heartbeat_failures": self.heartbeat_failures
+        }
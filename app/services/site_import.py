@@ -0,0 +1,194 @@
+import hashlib
+import json
+from typing import Dict, List, Optional, Tuple, Union
+
+from pydantic import ValidationError
+
+from app.models.entities import Site
+from app.models.schemas import SiteInfoRequest
+from app.utils.logger import logger
+
+# 批量导入结果
+STATUS_CREATED = "created"
+STATUS_UPDATED = "updated"
+STATUS_UNCHANGED = "unchanged"
+STATUS_FAILED = "failed"
+STATUS_DUPLICATE = "duplicate"  # 同一请求中重复的场站，以最后一条为准
+
+
+def payload_digest(data: Union[Dict, SiteInfoRequest]) -> str:
+    """
+    场站信息内容摘要（不含demand），用于识别重复上报的场站信息
+    请求dict与SiteInfoRequest统一按SiteInfoRequest序列化（补齐默认值、数值统一为float），
+    同一场站信息经不同接口上报时摘要一致；不符合SiteInfoRequest的dict按原样序列化
+    """
+    if isinstance(data, dict):
+        try:
+            data = SiteInfoRequest.model_validate(data)
+        except ValidationError:
+            content = {key: value for key, value in data.items() if key != 'demand'}
+    if isinstance(data, SiteInfoRequest):
+        content = data.model_dump(mode='json', exclude={'demand'})
+    encoded = json.dumps(content, sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+
+async def apply_site_info(db_service, algorithm_service, data: Dict) -> Tuple[str, bool]:
+    """
+    接受一次场站信息上报：先保存，再在demand变化时触发功率重新分配
+    返回 (场站编号, 是否写入了拓扑)；内容未变化（含只有demand变化）时不写拓扑，调用方无需通知运维平台
+    """
+    site_no = data['site_no']
+    demand = data.get('demand')
+
+    # 与上次接受的场站信息比较，内容未变化时只处理demand
+    previous = await db_service.get_site_digest(site_no)
+    if previous is not None and previous[0] == payload_digest(data):
+        if previous[1] != demand:
+            logger.info(f"场站 {site_no} 的demand值发生变化，触发功率重新分配")
+            await db_service.update_site_demand(site_no, demand)
+            await algorithm_service.update_site_demand(site_no, demand, data.get('total_power_limit'))
+        return site_no, False
+
+    # 没有摘要（摘要写入前的旧数据或摘要写入失败）时以已保存的场站demand为准
+    if previous is not None:
+        old_demand = previous[1]
+    else:
+        old_site = await db_service.get_site_info(site_no)
+        old_demand = old_site.demand if old_site else None
+
+    site = await db_service.save_site_info(data)
+
+    if old_demand is not None and old_demand != demand:
+        logger.info(f"场站 {site_no} 的demand值发生变化，触发功率重新分配")
+        await algorithm_service.update_site_demand(site_no, demand, data.get('total_power_limit'))
+    return site.site_no, True
+
+
+class SiteImportPlan:
+    """
+    批量导入的变更计划：将请求与已有拓扑逐层比较，只汇总发生变化的行，按表批量写入
+    群组按编号顺序与已有群组对应（与save_site_info一致），请求中未出现的桩、枪不删除
+    """
+
+    def __init__(self):
+        self.results: Dict[str, Dict] = {}
+        self.sites: List[Dict] = []
+        self.group_updates: List[Dict] = []  # group_id, power_limit
+        self.group_inserts: List[Dict] = []  # site_no, power_limit
+        self.piles: List[Tuple[str, Optional[int], Dict]] = []  # (场站, 群组序号, 桩)，新群组的group_id写入后回填
+        self.module_piles: List[str] = []  # 需要替换模块的桩
+        self.modules: List[Dict] = []
+        self.chargers: List[Dict] = []
+
+    @property
+    def changed_sites(self) -> List[str]:
+        return [
+            site_no for site_no, result in self.results.items()
+            if result["status"] != STATUS_UNCHANGED
+        ]
+
+    def add_site(self, data: Dict, existing: Optional[Site]):
+        """比较一个场站的请求与已有拓扑"""
+        site_no = data['site_no']
+        name = data.get('name', existing.name if existing else None)
+        site_row = {
+            "site_no": site_no,
+            "name": name,
+            "demand": data['demand'],
+            "total_power_limit": data['total_power_limit'],
+            "payload_hash": payload_digest(data)
+        }
+        # demand单独比较：只有demand变化时不视为拓扑变化，不清除拓扑缓存也不通知运维平台
+        changed = existing is None or (existing.name, existing.total_power_limit) != (
+            name, data['total_power_limit']
+        )
+        demand_changed = existing is not None and existing.demand != data['demand']
+
+        # 群组
+        existing_groups = sorted(existing.charger_groups, key=lambda g: g.group_id) if existing else []
+        group_index = {}
+        for i, group in enumerate(sorted(data.get('groups', []), key=lambda g: g['group_no'])):
+            group_index[group['group_no']] = i
+            if i >= len(existing_groups):
+                self.group_inserts.append({"site_no": site_no, "power_limit": group['power_limit']})
+                changed = True
+            elif existing_groups[i].power_limit != group['power_limit']:
+                self.group_updates.append({
+                    "group_id": existing_groups[i].group_id,
+                    "power_limit": group['power_limit']
+                })
+                changed = True
+
+        # 桩、模块、枪
+        existing_piles = {pile.pile_sn: pile for group in existing_groups for pile in group.piles}
+        for pile in data.get('piles', []):
+            pile_sn = pile['pile_sn']
+            index = group_index.get(pile.get('group_no'))
+            group_id = existing_groups[index].group_id if index is not None and index < len(existing_groups) else None
+            old = existing_piles.get(pile_sn)
+            new_group = index is not None and group_id is None
+            if new_group or old is None or (old.group_id, old.type, old.rated_power) != (
+                    group_id, pile.get('type'), pile['rated_power']
+            ):
+                self.piles.append((site_no, index, {
+                    "pile_sn": pile_sn,
+                    "group_id": group_id,
+                    "type": pile.get('type'),
+                    "rated_power": pile['rated_power']
+                }))
+                changed = True
+
+            modules = sorted(
+                (module['module_no'], module.get('type'), module['unit_power'])
+                for module in pile.get('modules', [])
+            )
+            old_modules = sorted((m.module_no, m.type, m.unit_power) for m in old.modules) if old else []
+            if modules != old_modules:
+                self.module_piles.append(pile_sn)
+                self.modules.extend(
+                    {"pile_sn": pile_sn, "module_no": module_no, "type": module_type, "unit_power": unit_power}
+                    for module_no, module_type, unit_power in modules
+                )
+                changed = True
+
+            old_chargers = {charger.charger_sn: charger for charger in old.chargers} if old else {}
+            for charger in pile.get('chargers', []):
+                values = (pile_sn, charger.get('status'), charger['max_power'], charger.get('min_power', 0))
+                old_charger = old_chargers.get(charger['charger_sn'])
+                if old_charger is None or (
+                        old_charger.pile_sn, old_charger.status, old_charger.max_power, old_charger.min_power
+                ) != values:
+                    self.chargers.append({
+                        "charger_sn": charger['charger_sn'],
+                        "pile_sn": pile_sn,
+                        "status": values[1],
+                        "max_power": values[2],
+                        "min_power": values[3]
+                    })
+                    changed = True
+
+        # 拓扑或demand有变化、摘要未记录时同时写入最新摘要
+        if changed or demand_changed or existing.payload_hash != site_row["payload_hash"]:
+            self.sites.append(site_row)
+
+        if existing is None:
+            status = STATUS_CREATED
+        else:
+            status = STATUS_UPDATED if changed else STATUS_UNCHANGED
+        self.results[site_no] = {
+            "site_no": site_no,
+            "status": status,
+            "demand_changed": demand_changed
+        }
+
+    def resolve_piles(self, new_group_ids: Dict[str, List[int]]) -> List[Dict]:
+        """回填新建群组的group_id，new_group_ids为各场站按group_id排序的全部群组"""
+        rows = []
+        for site_no, index, row in self.piles:
+            if row["group_id"] is None and index is not None:
+                group_ids = new_group_ids.get(site_no, [])
+                if index < len(group_ids):
+                    row = dict(row, group_id=group_ids[index])
+            rows.append(row)
+        return rows
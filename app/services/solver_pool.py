@@ -0,0 +1,193 @@
+import asyncio
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Optional
+
+import numpy as np
+
+from app.services.allocation import ChargerArrays, ExactAllocator
+from app.utils.logger import logger
+
+# 传给求解进程的数值列，充电枪SN不传入子进程
+_FLOAT_COLUMNS = ('current_power', 'min_power', 'max_power', 'rated_power', 'group_power_limit', 'unit_power')
+
+
+def pack_chargers(chargers: ChargerArrays) -> Dict[str, np.ndarray]:
+    """压缩为只含数组的求解输入：数值列原样传递，桩/群组编码为整数下标（-1表示无）"""
+    packed = {column: getattr(chargers, column) for column in _FLOAT_COLUMNS}
+    for column in ('pile_sn', 'group_id'):
+        values = getattr(chargers, column)
+        codes = {}
+        packed[column] = np.fromiter(
+            (-1 if value is None else codes.setdefault(value, len(codes)) for value in values),
+            dtype=np.int32,
+            count=len(values)
+        )
+    return packed
+
+
+def unpack_chargers(packed: Dict[str, np.ndarray]) -> ChargerArrays:
+    """由求解输入还原ChargerArrays，桩/群组以整数下标代替原始编号"""
+    size = len(packed['current_power'])
+    return ChargerArrays(
+        charger_sn=[None] * size,
+        pile_sn=[None if code < 0 else code for code in packed['pile_sn'].tolist()],
+        group_id=[None if code < 0 else code for code in packed['group_id'].tolist()],
+        **{column: packed[column] for column in _FLOAT_COLUMNS}
+    )
+
+
+def solve_exact(
+        packed: Dict[str, np.ndarray],
+        site_limit: float,
+        time_limit: float,
+        max_decrease: float,
+        min_impact: float
+) -> Optional[np.ndarray]:
+    """在求解进程中执行精确功率分配"""
+    solver = ExactAllocator(time_limit, max_decrease, min_impact)
+    return solver.allocate(unpack_chargers(packed), site_limit)
+
+
+def _warmup() -> bool:
+    """预先启动求解进程并加载求解器"""
+    return True
+
+
+class SolverPool:
+    """
+    功率分配求解进程池
+    - CPU密集的精确求解在子进程中执行，不阻塞处理HTTP和Kafka的事件循环
+    - 输入压缩为数组（不传ORM对象和充电枪SN），结果为与输入顺序一致的功率数组
+    - 进行中的求解达到max_pending（进程池已饱和）或等待超过timeout时返回None，由调用方回退快速分配
+    - 超时时尚未开始的求解被取消；已开始的求解仍在子进程中运行直到求解器时限，占用期间计入进行中数量，
+      因此timeout不应小于求解器时限（配置校验SOLVER_POOL_TIMEOUT >= OPTIMIZATION_TIME_BUDGET）
+    """
+
+    def __init__(self, workers: int, max_pending: int, timeout: float, start_method: str = "spawn"):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.start_method = start_method
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self.in_flight = 0
+
+        # 求解指标
+        self.submitted = 0
+        self.completed = 0
+        self.saturated = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.total_latency = 0.0
+
+    async def start(self):
+        """启动求解进程"""
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context(self.start_method)
+        )
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(self._executor, _warmup) for _ in range(self.workers)))
+        logger.info(f"求解进程池已启动，进程数: {self.workers}")
+
+    async def stop(self):
+        """关闭求解进程，不等待进行中的求解"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        logger.info("求解进程池已关闭")
+
+    async def allocate_exact(
+            self,
+            chargers: ChargerArrays,
+            site_limit: float,
+            solver: ExactAllocator
+    ) -> Optional[np.ndarray]:
+        """在进程池中精确求解，进程池饱和、超时或出错时返回None"""
+        if self._executor is None:
+            raise RuntimeError("求解进程池未启动")
+        if self.in_flight >= self.max_pending:
+            self.saturated += 1
+            return None
+
+        executor = self._executor
+        self.submitted += 1
+        self.in_flight += 1
+        start = time.perf_counter()
+        try:
+            solve = executor.submit(
+                solve_exact,
+                pack_chargers(chargers),
+                site_limit,
+                solver.time_limit,
+                solver.max_decrease,
+                solver.min_impact
+            )
+        except BrokenProcessPool as e:
+            self.in_flight -= 1
+            self.errors += 1
+            logger.error(f"求解进程池不可用，重新创建: {str(e)}")
+            await self._restart(executor)
+            return None
+        # 占用在子进程结束求解时释放（回调在执行器线程中运行，转回事件循环）
+        loop = asyncio.get_running_loop()
+        solve.add_done_callback(lambda _: self._release(loop))
+        future = asyncio.wrap_future(solve)
+        future.add_done_callback(self._discard_exception)
+
+        try:
+            result = await asyncio.wait_for(asyncio.shield(future), self.timeout)
+        except asyncio.TimeoutError:
+            solve.cancel()  # 仍在排队的求解直接取消；已开始的求解无法取消，结束前继续计入进行中数量
+            self.timeouts += 1
+            logger.warning(f"精确功率分配超时({self.timeout}s)，进行中求解数: {self.in_flight}")
+            return None
+        except BrokenProcessPool as e:
+            self.errors += 1
+            logger.error(f"求解进程异常退出，重新创建进程池: {str(e)}")
+            await self._restart(executor)
+            return None
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"进程池精确功率分配失败: {str(e)}")
+            return None
+        self.completed += 1
+        self.total_latency += time.perf_counter() - start
+        return result
+
+    def _release(self, loop: asyncio.AbstractEventLoop):
+        try:
+            loop.call_soon_threadsafe(self._on_done)
+        except RuntimeError:
+            pass  # 事件循环已关闭
+
+    def _on_done(self):
+        # 子进程结束求解时释放占用（包括已超时放弃等待的求解）
+        self.in_flight -= 1
+
+    @staticmethod
+    def _discard_exception(future: asyncio.Future):
+        if not future.cancelled():
+            future.exception()  # 已放弃等待的求解出错时不再报告未获取的异常
+
+    async def _restart(self, executor: ProcessPoolExecutor):
+        """重新创建异常退出的进程池，并发的多次失败只重建一次"""
+        if self._executor is not executor:
+            return
+        executor.shutdown(wait=False, cancel_futures=True)
+        await self.start()
+
+    def stats(self) -> Dict:
+        """求解指标"""
+        return {
+            "workers": self.workers,
+            "in_flight": self.in_flight,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "saturated": self.saturated,
+            "timeouts": self.timeouts,
+            "errors": self.errors,
+            "avg_latency_ms": self.total_latency / self.completed * 1000 if self.completed else 0.0
+        }
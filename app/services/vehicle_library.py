@@ -0,0 +1,84 @@
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sklearn.neighbors import NearestNeighbors
+
+from app.utils.logger import logger
+
+UNKNOWN_MODEL = "default_model"  # 无法匹配时的识别结果
+# 车型标签来源：CONFIRMED为人工确认，INFERRED为本服务识别写入（不用于构建指纹库），空为外部导入
+MODEL_SOURCE_CONFIRMED = "CONFIRMED"
+MODEL_SOURCE_INFERRED = "INFERRED"
+FEATURES = ("max_voltage", "max_current", "max_power", "capacity")  # 对应VehicleData的voltage/current/power/capacity
+
+
+class VehicleFingerprintIndex:
+    """
+    已识别车型的特征指纹库
+    - 特征按库内均值/标准差标准化后建立kNN索引，加载时一次构建
+    - 识别时取k个近邻按距离加权投票，最近邻超过max_distance视为未知车型
+    - 支持一次对一批车辆查询
+    """
+
+    def __init__(self, neighbors: int = 5, max_distance: float = 1.0):
+        self.neighbors = neighbors
+        self.max_distance = max_distance
+        self._index: Optional[NearestNeighbors] = None
+        self._labels: List[str] = []
+        self._codes = np.zeros(0, dtype=np.int64)
+        self._mean = np.zeros(len(FEATURES))
+        self._scale = np.ones(len(FEATURES))
+
+    def __len__(self):
+        return len(self._codes)
+
+    def load(self, rows: Iterable[Tuple[str, float, float, float, float]]) -> int:
+        """
+        加载指纹库
+        rows: (车型, 最大电压, 最大电流, 最大功率, 电池容量)，特征缺失的行忽略
+        """
+        rows = [row for row in rows if row[0] and row[0] != UNKNOWN_MODEL]
+        features = np.array([row[1:] for row in rows], dtype=float).reshape(-1, len(FEATURES))
+        valid = ~np.isnan(features).any(axis=1)
+        features = features[valid]
+        labels = [row[0] for row, keep in zip(rows, valid.tolist()) if keep]
+        if not labels:
+            self._index, self._labels, self._codes = None, [], np.zeros(0, dtype=np.int64)
+            logger.warning("车型指纹库为空，识别结果均为未知车型")
+            return 0
+
+        mean = features.mean(axis=0)
+        scale = features.std(axis=0)
+        scale[scale == 0] = 1.0
+        index = NearestNeighbors(n_neighbors=min(self.neighbors, len(labels)))
+        index.fit((features - mean) / scale)
+
+        unique, codes = np.unique(labels, return_inverse=True)
+        self._index, self._labels, self._codes = index, unique.tolist(), codes
+        self._mean, self._scale = mean, scale
+        logger.info(f"车型指纹库加载完成: {len(labels)} 条记录, {len(unique)} 个车型")
+        return len(labels)
+
+    def classify(self, features: Sequence[Sequence[Optional[float]]]) -> List[str]:
+        """
+        批量识别车型
+        features: 每行为 (电压, 电流, 功率, 电池容量)，缺失值为None
+        """
+        features = np.array(features, dtype=float).reshape(-1, len(FEATURES))
+        result = [UNKNOWN_MODEL] * len(features)
+        valid = np.flatnonzero(~np.isnan(features).any(axis=1))
+        if self._index is None or not len(valid):
+            return result
+
+        distances, neighbors = self._index.kneighbors((features[valid] - self._mean) / self._scale)
+        codes = self._codes[neighbors]
+        weights = np.where(distances <= self.max_distance, 1.0 / (distances + 1e-6), 0.0)
+        # 每个近邻的得票 = 与其车型相同的近邻权重之和，取得票最高的近邻车型
+        votes = ((codes[:, :, None] == codes[:, None, :]) * weights[:, None, :]).sum(axis=2)
+        best = votes.argmax(axis=1)
+        matched = weights.max(axis=1) > 0
+        best_codes = codes[np.arange(len(codes)), best]
+        for i, code, ok in zip(valid.tolist(), best_codes.tolist(), matched.tolist()):
+            if ok:
+                result[i] = self._labels[code]
+        return result
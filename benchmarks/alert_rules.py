@@ -0,0 +1,112 @@
+"""
+告警规则引擎压测：逐枪逐规则判断 vs 按列计算
+
+用法: python -m benchmarks.alert_rules --chargers 100000 --rules 20 --sites 1000
+"""
+import argparse
+import random
+import time
+
+from app.models.schemas import AlertConfig, SiteTopology
+from app.services.alert_rules import RULE_SPECS, SCOPE_CHARGER, SCOPE_SITE, AlertFrame, AlertRuleEngine
+
+
+def make_fleet(chargers: int, sites: int):
+    per_site = chargers // sites
+    topologies, states = [], {}
+    for s in range(sites):
+        site_no = f"S{s:05d}"
+        groups = [{"group_id": s * 4 + g, "power_limit": per_site / 4 * 80.0} for g in range(4)]
+        topologies.append(SiteTopology(
+            site_no=site_no, name=site_no, total_power_limit=per_site * 80.0,
+            demand=per_site * 70.0, groups=groups
+        ))
+        states[site_no] = [
+            {
+                "charger_sn": f"{site_no}C{c:04d}",
+                "group_id": groups[c % 4]["group_id"],
+                "status": "ERROR" if random.random() < 0.001 else "PLUGGED",
+                "rated_power": 120.0,
+                "current_power": random.uniform(0, 121)
+            }
+            for c in range(per_site)
+        ]
+    return topologies, states
+
+
+def make_configs(rules: int):
+    """按告警类型轮流生成不同阈值的全场站配置"""
+    alert_types = list(RULE_SPECS)
+    return [
+        AlertConfig(
+            site_no="*",
+            alert_type=alert_types[i % len(alert_types)],
+            threshold=1.0 + 0.02 * (i // len(alert_types)),
+            description=f"rule {i}"
+        )
+        for i in range(rules)
+    ]
+
+
+def evaluate_loop(topologies, states, configs):
+    """逐枪逐规则的Python实现，作为对照"""
+    alerts = []
+    for site in topologies:
+        chargers = states[site.site_no]
+        site_power = sum(c["current_power"] for c in chargers)
+        group_power = {}
+        for c in chargers:
+            group_power[c["group_id"]] = group_power.get(c["group_id"], 0.0) + c["current_power"]
+        for config in configs:
+            spec = RULE_SPECS[config.alert_type]
+            if spec.scope == SCOPE_CHARGER:
+                for c in chargers:
+                    if config.alert_type == "CHARGER_ERROR":
+                        value = 1.0 if c["status"] == "ERROR" else 0.0
+                    else:
+                        value = c["current_power"] / c["rated_power"]
+                    if value > config.threshold:
+                        alerts.append(spec.message.format(name=c["charger_sn"], value=value, threshold=config.threshold))
+            elif spec.scope == SCOPE_SITE:
+                limit = site.total_power_limit if config.alert_type == "POWER_EXCEED" else site.demand
+                value = site_power / limit
+                if value > config.threshold if spec.above else value < config.threshold:
+                    alerts.append(spec.message.format(name=site.site_no, value=value, threshold=config.threshold))
+            else:
+                for group in site.groups:
+                    value = group_power.get(group["group_id"], 0.0) / group["power_limit"]
+                    if value > config.threshold:
+                        alerts.append(spec.message.format(name=group["group_id"], value=value, threshold=config.threshold))
+    return alerts
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--chargers', type=int, default=100000)
+    parser.add_argument('--rules', type=int, default=20)
+    parser.add_argument('--sites', type=int, default=1000)
+    args = parser.parse_args()
+
+    topologies, states = make_fleet(args.chargers, args.sites)
+    configs = make_configs(args.rules)
+    engine = AlertRuleEngine(configs)
+    print(f"充电枪: {args.chargers}, 场站: {args.sites}, 配置: {len(configs)}, 编译规则: {len(engine.rules)}")
+
+    start = time.perf_counter()
+    loop_alerts = evaluate_loop(topologies, states, configs)
+    loop_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    frame = AlertFrame.build(topologies, states)
+    build_time = time.perf_counter() - start
+    start = time.perf_counter()
+    alerts = engine.evaluate(frame)
+    eval_time = time.perf_counter() - start
+
+    print(f"逐枪循环: {loop_time * 1000:.1f}ms, 告警数: {len(loop_alerts)}")
+    print(f"按列计算: 构建 {build_time * 1000:.1f}ms + 计算 {eval_time * 1000:.1f}ms, 告警数: {len(alerts)}")
+    print(f"加速比(仅计算): {loop_time / eval_time:.1f}x, (含构建): {loop_time / (build_time + eval_time):.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""
+Kafka消息编解码微基准（单核）
+
+用法: python -m benchmarks.kafka_codec --messages 200000
+"""
+import argparse
+import random
+import time
+from datetime import datetime
+
+from app.services.kafka_codec import CODECS, POWER_PREDICTION, PLUG_STATUS
+
+
+def build_messages(count: int):
+    """构造功率预测/插拔枪混合消息（9:1）"""
+    messages = []
+    for i in range(count):
+        charger_sn = f"CHG{i % 5000:06d}"
+        if i % 10:
+            messages.append({
+                'message_type': POWER_PREDICTION,
+                'data': {
+                    'session_id': f"S{i:010d}",
+                    'charger_sn': charger_sn,
+                    'mac_addr': "00:1A:2B:3C:4D:5E",
+                    'site_no': f"SITE{i % 50:03d}",
+                    'soc': random.uniform(10, 95),
+                    'power': random.uniform(20, 240),
+                    'capacity': 80.0,
+                    'curr_output': random.uniform(50, 400),
+                    'vol_output': random.uniform(350, 800),
+                    'curr_demand': random.uniform(50, 400),
+                    'vol_demand': random.uniform(350, 800),
+                    'consumed_energy': random.uniform(0, 80),
+                    'timestamp': datetime.utcnow().isoformat()
+                }
+            })
+        else:
+            messages.append({
+                'message_type': PLUG_STATUS,
+                'data': {
+                    'charger_sn': charger_sn,
+                    'status': 'PLUGGED',
+                    'session_id': f"S{i:010d}",
+                    'site_no': f"SITE{i % 50:03d}",
+                    'timestamp': datetime.utcnow().isoformat()
+                }
+            })
+    return messages
+
+
+def run(count: int):
+    messages = build_messages(count)
+    print(f"{'codec':<8}{'avg bytes':>12}{'encode msgs/s':>18}{'decode msgs/s':>18}")
+    for name, codec_cls in CODECS.items():
+        codec = codec_cls()
+
+        start = time.perf_counter()
+        encoded = [codec.encode(message) for message in messages]
+        encode_elapsed = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for raw in encoded:
+            codec.decode(raw)
+        decode_elapsed = time.perf_counter() - start
+
+        avg_size = sum(len(raw) for raw in encoded) / count
+        print(f"{name:<8}{avg_size:>12.1f}{count / encode_elapsed:>18,.0f}{count / decode_elapsed:>18,.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=200000)
+    args = parser.parse_args()
+    run(args.messages)
@@ -0,0 +1,90 @@
+"""
+Kafka消费管道压测（基于本地内存代理，无需Kafka集群）
+
+用法: python -m benchmarks.kafka_ingest --messages 100000 --chargers 5000 --workers 4
+同时统计事件循环延迟，用于衡量消费期间HTTP接口的响应情况
+"""
+import argparse
+import asyncio
+import time
+
+from app.core.config import settings
+from app.services.charger_state import ChargerStateStore
+from app.services.kafka import KafkaService
+from app.services.kafka_memory import InMemoryBroker
+
+
+class StubAlgorithmService:
+    """只计数的算法服务桩"""
+
+    def __init__(self):
+        self.processed = 0
+        self.state_store = ChargerStateStore()
+        self.shards = None
+
+    async def process_vehicle_data(self, data):
+        self.processed += 1
+
+    async def process_power_data(self, data):
+        self.processed += 1
+
+    async def process_plug_status(self, data):
+        self.processed += 1
+
+
+async def measure_loop_lag(stop: asyncio.Event, samples: list, interval: float = 0.01):
+    """采样事件循环调度延迟"""
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        start = loop.time()
+        await asyncio.sleep(interval)
+        samples.append(loop.time() - start - interval)
+
+
+async def run(messages: int, chargers: int, workers: int):
+    settings.KAFKA_CONSUMER_WORKERS = workers
+    broker = InMemoryBroker(settings.KAFKA_MEMORY_PARTITIONS)
+    algorithm_service = StubAlgorithmService()
+    service = KafkaService(algorithm_service, broker=broker)
+    await service.start()
+
+    stop = asyncio.Event()
+    lag_samples = []
+    lag_task = asyncio.create_task(measure_loop_lag(stop, lag_samples))
+
+    topic = settings.KAFKA_TOPICS['POWER_PREDICTION']
+    producer = service.producer
+    start = time.perf_counter()
+    for i in range(messages):
+        charger_sn = f"CHG{i % chargers:06d}"
+        await producer.send(topic, {
+            'message_type': 2,
+            'data': {'charger_sn': charger_sn, 'power': 60.0, 'soc': 50.0, 'capacity': 80.0}
+        }, key=charger_sn)
+        if i % 1000 == 0:
+            await asyncio.sleep(0)
+
+    while algorithm_service.processed < messages:
+        await asyncio.sleep(0.01)
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    await lag_task
+    await service.stop()
+    offsets = service.get_metrics()['offsets']
+
+    lag_samples.sort()
+    p99 = lag_samples[int(len(lag_samples) * 0.99)] if lag_samples else 0.0
+    print(f"消息数: {messages}, 消费协程数: {workers}")
+    print(f"吞吐: {messages / elapsed:,.0f} msgs/s, 耗时: {elapsed:.2f}s")
+    print(f"offset提交次数: {offsets['commits']}, 平均提交延迟: {offsets['avg_commit_latency_ms']:.3f}ms")
+    print(f"事件循环延迟 p99: {p99 * 1000:.2f}ms, max: {max(lag_samples, default=0) * 1000:.2f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=100000)
+    parser.add_argument("--chargers", type=int, default=5000)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+    asyncio.run(run(args.messages, args.chargers, args.workers))
@@ -0,0 +1,104 @@
+"""
+运维平台通知压测（使用本地桩服务）：
+每次新建客户端 vs 共享连接池逐条发送 vs 按场站合并的通知队列
+
+用法: python -m benchmarks.maintenance_notify --notifications 2000 --sites 50 --latency 0.005
+"""
+import argparse
+import asyncio
+import random
+import time
+
+import httpx
+
+from app.core.config import settings
+from app.services.maintenance import MaintenanceService
+from benchmarks.maintenance_stub import start_stub
+
+
+async def run_per_call_client(url: str, notifications, concurrency: int):
+    """原实现：每次通知新建AsyncClient"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def notify(site_no, pile_sns):
+        async with semaphore:
+            async with httpx.AsyncClient() as client:
+                response = await client.post(f"{url}/notify", json={"site_no": site_no, "pile_sns": pile_sns})
+                response.raise_for_status()
+
+    await asyncio.gather(*(notify(site_no, pile_sns) for site_no, pile_sns in notifications))
+    return len(notifications)
+
+
+async def run_shared_client(service: MaintenanceService, notifications, concurrency: int):
+    """共享连接池，每条通知一次请求"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def notify(site_no, pile_sns):
+        async with semaphore:
+            await service.send(site_no, pile_sns)
+
+    await asyncio.gather(*(notify(site_no, pile_sns) for site_no, pile_sns in notifications))
+    return len(notifications)
+
+
+async def run_queue(service: MaintenanceService, notifications):
+    """通知队列：窗口内按场站合并"""
+    for site_no, pile_sns in notifications:
+        await service.notify_maintenance(site_no, pile_sns)
+    requests = service.requests
+    await service.flush()
+    return service.requests - requests
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--notifications', type=int, default=2000)
+    parser.add_argument('--sites', type=int, default=50)
+    parser.add_argument('--latency', type=float, default=0.005, help='桩服务响应延迟(秒)')
+    parser.add_argument('--failure-rate', type=float, default=0.0)
+    parser.add_argument('--port', type=int, default=9123)
+    args = parser.parse_args()
+
+    server, app = await start_stub(args.port, args.latency, args.failure_rate)
+    url = f"http://127.0.0.1:{args.port}"
+    settings.MAINTENANCE_API_URL = url
+    settings.MAINTENANCE_RETRY_BACKOFF = 0.01
+    settings.MAINTENANCE_NOTIFY_WINDOW = 3600  # 由压测显式flush
+
+    notifications = [
+        (f"S{random.randrange(args.sites):04d}", [f"P{random.randrange(20):02d}" for _ in range(3)])
+        for _ in range(args.notifications)
+    ]
+    print(f"通知: {args.notifications}, 场站: {args.sites}, 桩服务延迟: {args.latency * 1000:.0f}ms, "
+          f"失败率: {args.failure_rate:.0%}")
+
+    service = MaintenanceService()
+    await service.start()
+    scenarios = [
+        ("每次新建客户端", lambda: run_per_call_client(url, notifications, settings.MAINTENANCE_MAX_CONNECTIONS)),
+        ("共享连接池逐条", lambda: run_shared_client(service, notifications, settings.MAINTENANCE_MAX_CONNECTIONS)),
+        ("按场站合并队列", lambda: run_queue(service, notifications)),
+    ]
+    for name, run in scenarios:
+        before = app.state.counters["requests"]
+        start = time.perf_counter()
+        try:
+            requests = await run()
+        except Exception as e:
+            print(f"{name}: 失败 {e!r}")
+            continue
+        elapsed = time.perf_counter() - start
+        print(
+            f"{name}: {elapsed * 1000:.0f}ms, {args.notifications / elapsed:,.0f} 条通知/秒, "
+            f"请求 {requests} (桩服务收到 {app.state.counters['requests'] - before})"
+        )
+    print(f"通知队列指标: {service.stats()}")
+
+    await service.stop()
+    server.should_exit = True
+    await asyncio.sleep(0.5)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,58 @@
+"""
+本地运维平台桩服务：接收 /notify 通知并计数，可模拟响应延迟和失败率
+
+用法: python -m benchmarks.maintenance_stub --port 9000 --latency 0.01 --failure-rate 0.1
+之后将 MAINTENANCE_API_URL 指向 http://127.0.0.1:9000
+"""
+import argparse
+import asyncio
+import random
+from typing import Dict
+
+import uvicorn
+from fastapi import FastAPI, HTTPException
+
+
+def create_app(latency: float = 0.0, failure_rate: float = 0.0) -> FastAPI:
+    app = FastAPI()
+    app.state.counters = {"requests": 0, "failed": 0, "piles": 0}
+    app.state.sites: Dict[str, int] = {}
+
+    @app.post("/notify")
+    async def notify(payload: Dict):
+        counters = app.state.counters
+        counters["requests"] += 1
+        if latency:
+            await asyncio.sleep(latency)
+        if random.random() < failure_rate:
+            counters["failed"] += 1
+            raise HTTPException(status_code=503, detail="stub failure")
+        counters["piles"] += len(payload.get("pile_sns", []))
+        site_no = payload.get("site_no")
+        app.state.sites[site_no] = app.state.sites.get(site_no, 0) + 1
+        return {"status": "success"}
+
+    return app
+
+
+async def start_stub(port: int, latency: float = 0.0, failure_rate: float = 0.0):
+    """在当前事件循环中启动桩服务，返回 (uvicorn.Server, FastAPI应用)"""
+    app = create_app(latency, failure_rate)
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+    return server, app
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--port', type=int, default=9000)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--failure-rate', type=float, default=0.0)
+    args = parser.parse_args()
+    uvicorn.run(create_app(args.latency, args.failure_rate), host="127.0.0.1", port=args.port, log_level="warning")
+
+
+if __name__ == '__main__':
+    main()
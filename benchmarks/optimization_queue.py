@@ -0,0 +1,143 @@
+"""
+优化执行器压测：大量场站触发下的并发上限、同场站串行、需求响应优先和重启恢复
+
+runner以sleep模拟一次优化耗时；任务状态写入内存存储，中途停止执行器后用同一存储重新启动，
+检查未完成的任务被恢复执行
+
+用法: python -m benchmarks.optimization_queue --sites 500 --triggers 5000 --workers 4 --latency 0.005
+"""
+import argparse
+import asyncio
+import random
+import time
+from typing import Dict, List, Optional
+
+from app.services.scheduler import (
+    OptimizationScheduler, PRIORITY_DEMAND, PRIORITY_NORMAL, TASK_DONE, TASK_PENDING, TASK_RUNNING
+)
+
+
+class MemoryTaskStore:
+    """内存中的OptimizationTask，接口与DatabaseService一致"""
+
+    def __init__(self):
+        self.rows: Dict[int, Dict] = {}
+
+    async def create_optimization_task(self, site_no: str, priority: int, task_type: Optional[int]) -> int:
+        task_id = len(self.rows) + 1
+        self.rows[task_id] = {
+            "task_id": task_id, "site_no": site_no, "priority": priority,
+            "task_type": task_type, "triggers": 1, "status": TASK_PENDING
+        }
+        return task_id
+
+    async def update_optimization_task(self, task_id: int, **values):
+        self.rows[task_id].update(values)
+
+    async def claim_optimization_task(
+            self, task_id: int, node_id: Optional[str], triggers: int, reclaim: bool = False) -> bool:
+        row = self.rows[task_id]
+        if row["status"] != TASK_PENDING and not (
+                row["status"] == TASK_RUNNING and (reclaim or row.get("node_id") in (None, node_id))):
+            return False
+        row.update(status=TASK_RUNNING, node_id=node_id, triggers=triggers, start_time=time.perf_counter())
+        return True
+
+    async def get_unfinished_optimization_tasks(self, statuses: List[str] = None) -> List[Dict]:
+        statuses = statuses or (TASK_PENDING, TASK_RUNNING)
+        return [dict(row) for row in self.rows.values() if row["status"] in statuses]
+
+
+class Runner:
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.running = set()
+        self.concurrency = 0
+        self.max_concurrency = 0
+        self.overlaps = 0
+
+    async def __call__(self, site_no: str, task_type: int = None):
+        if site_no in self.running:
+            self.overlaps += 1
+        self.running.add(site_no)
+        self.concurrency += 1
+        self.max_concurrency = max(self.max_concurrency, self.concurrency)
+        try:
+            await asyncio.sleep(self.latency * random.uniform(0.5, 1.5))
+        finally:
+            self.concurrency -= 1
+            self.running.discard(site_no)
+        return {"pile_power_json": {}}
+
+
+async def wait_idle(scheduler: OptimizationScheduler):
+    while scheduler.stats()["queue_depth"] or scheduler.stats()["running"]:
+        await asyncio.sleep(0.001)
+
+
+async def run(args):
+    random.seed(0)
+    store = MemoryTaskStore()
+    runner = Runner(args.latency)
+    sites = [f"SITE{i:04d}" for i in range(args.sites)]
+
+    # 第一轮：突发触发，中途停止模拟重启
+    scheduler = OptimizationScheduler(runner, args.interval, args.workers, store)
+    await scheduler.start()
+    start = time.perf_counter()
+    demand_waits, normal_waits = [], []
+    for i in range(args.triggers):
+        priority = PRIORITY_DEMAND if random.random() < args.demand_ratio else PRIORITY_NORMAL
+        await scheduler.schedule(random.choice(sites), priority)
+        if i == args.triggers // 2:
+            await asyncio.sleep(args.latency * 5)
+    await asyncio.sleep(args.latency * 10)
+    before_stop = scheduler.stats()
+    await scheduler.stop()
+    unfinished = len(await store.get_unfinished_optimization_tasks())
+
+    # 第二轮：同一存储重新启动，恢复未完成的任务
+    scheduler = OptimizationScheduler(runner, args.interval, args.workers, store)
+    await scheduler.start()
+    recovered = scheduler.stats()["adopted"]
+    probe_start = asyncio.get_running_loop().time()
+    # 恢复队列积压时分别提交需求响应和普通触发，比较排队时间
+    for site_no in random.sample(sites, min(50, len(sites))):
+        priority = PRIORITY_DEMAND if len(demand_waits) < 25 else PRIORITY_NORMAL
+        task_id = await scheduler.schedule(f"PROBE_{site_no}", priority)
+        (demand_waits if priority == PRIORITY_DEMAND else normal_waits).append(task_id)
+    await wait_idle(scheduler)
+    elapsed = time.perf_counter() - start
+    after = scheduler.stats()
+    await scheduler.stop()
+
+    def probe_wait(task_ids):
+        # 以任务开始执行的顺序近似排队时间
+        started = [(row["start_time"], task_id) for task_id, row in store.rows.items() if row.get("start_time")]
+        order = [task_id for _, task_id in sorted(started)]
+        return sum(order.index(task_id) for task_id in task_ids) / len(task_ids) if task_ids else 0
+
+    done = sum(1 for row in store.rows.values() if row["status"] == TASK_DONE)
+    print(f"场站: {args.sites}, 触发: {args.triggers}, 执行协程: {args.workers}, 单次优化: {args.latency * 1000:.0f}ms")
+    print(f"停止前: 执行 {before_stop['executed']}, 合并 {before_stop['coalesced']}, 队列 {before_stop['queue_depth']}")
+    print(f"重启: 未完成任务 {unfinished}, 恢复场站 {recovered}")
+    print(f"全部完成: 任务 {len(store.rows)}, DONE {done}, 总耗时 {elapsed:.2f}s")
+    print(f"最大并发: {runner.max_concurrency} (上限 {args.workers}), 同场站重叠执行: {runner.overlaps}")
+    print(f"重启后平均排队: {after['avg_wait_ms']:.1f}ms, 最大 {after['max_wait_ms']:.1f}ms")
+    print(f"探测任务平均执行次序: 需求响应 {probe_wait(demand_waits):.0f}, 普通 {probe_wait(normal_waits):.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sites', type=int, default=500)
+    parser.add_argument('--triggers', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--latency', type=float, default=0.005, help='单次优化耗时(秒)')
+    parser.add_argument('--interval', type=float, default=0.05, help='同一场站最小优化间隔(秒)')
+    parser.add_argument('--demand-ratio', type=float, default=0.1)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""
+功率分配引擎压测：逐枪贪心循环 vs 向量化分配
+
+用法: python -m benchmarks.power_allocation --sizes 10 1000 100000
+"""
+import argparse
+import random
+import time
+
+import numpy as np
+
+from app.services.allocation import ChargerArrays, allocate_greedy
+
+
+def greedy_loop(charger_states, power_reduction):
+    """原逐枪贪心实现，作为结果和性能的对照"""
+    sorted_chargers = sorted(charger_states, key=lambda x: x['current_power'], reverse=True)
+    adjustments = {}
+    remaining_reduction = power_reduction
+    for charger in sorted_chargers:
+        current_power = charger['current_power']
+        min_power = current_power * 0.7
+        if remaining_reduction <= 0:
+            adjustments[charger['charger_sn']] = current_power
+            continue
+        max_adjustment = current_power - min_power
+        actual_adjustment = min(max_adjustment, remaining_reduction)
+        if actual_adjustment / current_power < 0.1:
+            adjustments[charger['charger_sn']] = current_power
+            continue
+        adjustments[charger['charger_sn']] = current_power - actual_adjustment
+        remaining_reduction -= actual_adjustment
+    return adjustments
+
+
+def timed(func, repeat: int):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    return (time.perf_counter() - start) / repeat, result
+
+
+def run(sizes):
+    print(f"{'chargers':>10}{'loop ms':>12}{'arrays ms':>12}{'vector ms':>12}{'speedup':>10}  identical")
+    for size in sizes:
+        states = [
+            {'charger_sn': f"CHG{i:07d}", 'current_power': random.uniform(20, 240)}
+            for i in range(size)
+        ]
+        reduction = sum(state['current_power'] for state in states) * 0.15
+        repeat = max(1, 20000 // size)
+
+        loop_time, expected = timed(lambda: greedy_loop(states, reduction), repeat)
+        convert_time, chargers = timed(lambda: ChargerArrays.from_states(states), repeat)
+        vector_time, new_powers = timed(
+            lambda: allocate_greedy(chargers.current_power, reduction), repeat
+        )
+        identical = np.array_equal(
+            new_powers,
+            np.array([expected[sn] for sn in chargers.charger_sn])
+        )
+        print(
+            f"{size:>10}{loop_time * 1000:>12.3f}{(convert_time + vector_time) * 1000:>12.3f}"
+            f"{vector_time * 1000:>12.3f}{loop_time / vector_time:>10.1f}  {identical}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs='+', default=[10, 1000, 100000])
+    args = parser.parse_args()
+    run(args.sizes)
@@ -0,0 +1,131 @@
+"""
+功率预测压测：固定衰减模型 vs 按车型拟合的充电曲线
+
+以合成车型曲线生成历史充电记录，按会话划分训练/留出集：
+训练集按 (车型, SOC分桶) 聚合后拟合曲线，留出集比较80%/90%SOC点的功率和充电时间误差，
+并比较逐条预测与整站批量预测的吞吐
+
+用法: python -m benchmarks.power_prediction --models 50 --sessions 40 --batch 10000
+"""
+import argparse
+import random
+import time
+
+import numpy as np
+
+from app.services.charging_curve import ChargingCurveModel, SOC_POINTS
+
+TARGETS = [80, 90]
+
+
+def make_curve(knee: float, tail: float) -> np.ndarray:
+    """恒功率到拐点后线性下降到tail（归一化）"""
+    soc = np.arange(SOC_POINTS)
+    return np.where(soc < knee, 1.0, 1.0 - (1.0 - tail) * (soc - knee) / (100 - knee))
+
+
+def simulate_session(curve: np.ndarray, peak: float, capacity: float, start_soc: int, noise: float):
+    """逐1%SOC生成充电记录: (SOC, 功率, 从开始累计的小时数)"""
+    records, hours = [], 0.0
+    for soc in range(start_soc, 100):
+        power = peak * curve[soc] * (1 + random.gauss(0, noise))
+        records.append((soc + random.random(), power, hours))
+        hours += capacity / 100 / (peak * curve[soc])
+    return records
+
+
+def old_predict(soc: float, power: float, capacity: float):
+    """原实现：每10%SOC功率降低5%，充电时间按当前功率恒定计算"""
+    result = []
+    for target in TARGETS:
+        if soc < target:
+            result.append((target, capacity * (target - soc) / 100 / power, power * 0.95 ** ((target - soc) / 10)))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--models', type=int, default=50)
+    parser.add_argument('--sessions', type=int, default=40, help='每个车型的会话数')
+    parser.add_argument('--holdout', type=float, default=0.2)
+    parser.add_argument('--noise', type=float, default=0.03)
+    parser.add_argument('--batch', type=int, default=10000, help='批量预测的会话数')
+    args = parser.parse_args()
+    random.seed(0)
+
+    # 生成车型和历史会话
+    vehicles = {}
+    for m in range(args.models):
+        vehicles[f"VENDOR{m:03d}_{m % 7}_75"] = (
+            make_curve(random.uniform(45, 80), random.uniform(0.1, 0.4)),
+            random.uniform(60, 250),
+            random.uniform(50, 100)
+        )
+    train, holdout = {}, []
+    for model, (curve, peak, capacity) in vehicles.items():
+        for _ in range(args.sessions):
+            session_peak = peak * random.uniform(0.9, 1.1)
+            records = simulate_session(curve, session_peak, capacity, random.randint(5, 40), args.noise)
+            if random.random() < args.holdout:
+                holdout.append((model, capacity, records))
+                continue
+            for soc, power, _ in records:
+                bucket = train.setdefault((model, int(soc)), [0.0, 0])
+                bucket[0] += power
+                bucket[1] += 1
+
+    rows = [(model, soc_bin, total / count, count) for (model, soc_bin), (total, count) in train.items()]
+    curves = ChargingCurveModel(TARGETS)
+    start = time.perf_counter()
+    curves.load(rows, min_samples=3, min_bins=20)
+    print(f"车型: {args.models}, 训练分桶: {len(rows)}, 拟合耗时: {(time.perf_counter() - start) * 1000:.1f}ms")
+
+    # 留出集误差：每个会话取开始后的一条记录作为预测起点
+    starts, actual = [], []
+    for model, capacity, records in holdout:
+        soc, power, hours = records[len(records) // 5]
+        by_soc = {int(r[0]): r for r in records}
+        actual.append([(by_soc[t][1], by_soc[t][2] - hours) for t in TARGETS])
+        starts.append((model, capacity, soc, power))
+    actual = np.array(actual)  # (会话, 目标SOC, (功率, 时间))
+
+    old = np.array([[(p, t) for _, t, p in old_predict(soc, power, capacity)] for _, capacity, soc, power in starts])
+    times, powers = curves.predict_batch(
+        [s[2] for s in starts], [s[3] for s in starts], [s[1] for s in starts], [s[0] for s in starts]
+    )
+    new = np.stack([powers, times], axis=-1)
+    for name, pred in (("固定衰减", old), ("车型曲线", new)):
+        error = np.abs(pred - actual) / actual
+        print(
+            f"{name}: 功率误差 {np.mean(error[..., 0]):.1%}, 充电时间误差 {np.mean(error[..., 1]):.1%} "
+            f"(留出会话 {len(starts)})"
+        )
+
+    # 吞吐
+    models = list(vehicles)
+    soc = np.random.uniform(5, 75, args.batch)
+    power = np.random.uniform(20, 250, args.batch)
+    capacity = np.random.uniform(50, 100, args.batch)
+    keys = [random.choice(models) for _ in range(args.batch)]
+
+    start = time.perf_counter()
+    for i in range(args.batch):
+        old_predict(soc[i], power[i], capacity[i])
+    old_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for i in range(args.batch):
+        curves.predict_one(float(soc[i]), float(power[i]), float(capacity[i]), keys[i])
+    single_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    curves.predict_batch(soc, power, capacity.tolist(), keys)
+    batch_time = time.perf_counter() - start
+
+    print(f"固定衰减逐条: {args.batch / old_time:,.0f} 次/秒")
+    print(f"车型曲线逐条: {args.batch / single_time:,.0f} 次/秒")
+    print(f"车型曲线批量: {args.batch / batch_time:,.0f} 次/秒 ({batch_time * 1000:.1f}ms / {args.batch} 会话)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""
+场站分片压测：一致性哈希环的负载均衡、节点增减时的场站/Kafka分区迁移，以及多节点共享任务表时转交任务只执行一次
+
+每个节点是一个共享内存任务表的OptimizationScheduler，触发随机发往任一节点（模拟多个worker共用端口），
+非本节点负责的场站写入任务表，由负责节点轮询领取
+
+用法: python -m benchmarks.shard_ring --sites 5000 --nodes 4 --triggers 3000
+"""
+import argparse
+import asyncio
+import random
+from collections import Counter
+
+from app.services.scheduler import OptimizationScheduler, TASK_DONE, TASK_MERGED
+from app.services.sharding import HashRing
+from benchmarks.optimization_queue import MemoryTaskStore, wait_idle
+
+
+class StaticShards:
+    """固定节点集合的分片，接口与ShardCoordinator一致"""
+
+    def __init__(self, ring: HashRing, node_id: str):
+        self.ring = ring
+        self.node_id = node_id
+
+    def owns(self, key: str) -> bool:
+        return self.ring.owner(key) == self.node_id
+
+
+def balance(ring: HashRing, sites) -> str:
+    counts = Counter(ring.owner(site_no) for site_no in sites)
+    average = len(sites) / len(ring.nodes)
+    return f"最多 {max(counts.values())}, 最少 {min(counts.values())}, 最大偏差 {max(counts.values()) / average - 1:.1%}"
+
+
+def moved(before: HashRing, after: HashRing, sites) -> int:
+    return sum(1 for site_no in sites if before.owner(site_no) != after.owner(site_no))
+
+
+async def simulate(args, ring: HashRing, sites):
+    store = MemoryTaskStore()
+    runs = Counter()
+    owners = {}
+
+    def make_runner(node_id):
+        async def runner(site_no: str, task_type: int = None):
+            runs[site_no] += 1
+            owners.setdefault(site_no, set()).add(node_id)
+            await asyncio.sleep(args.latency)
+            return {"pile_power_json": {}}
+        return runner
+
+    schedulers = [
+        OptimizationScheduler(make_runner(node_id), 0, 2, store, StaticShards(ring, node_id), 0.01)
+        for node_id in ring.nodes
+    ]
+    for scheduler in schedulers:
+        await scheduler.start()
+    for _ in range(args.triggers):
+        await random.choice(schedulers).schedule(random.choice(sites))
+    # 等待转交的任务全部被领取执行
+    while any(row["status"] not in (TASK_DONE, TASK_MERGED) for row in store.rows.values()):
+        await asyncio.sleep(0.01)
+    for scheduler in schedulers:
+        await wait_idle(scheduler)
+        await scheduler.stop()
+
+    stats = [scheduler.stats() for scheduler in schedulers]
+    statuses = Counter(row["status"] for row in store.rows.values())
+    print(f"模拟 {len(schedulers)} 个节点, 触发 {args.triggers}:")
+    print(f"  转交其他节点: {sum(s['routed'] for s in stats)}, 领取执行: {sum(s['adopted'] for s in stats)}")
+    print(f"  任务表: {dict(statuses)}, 执行 {sum(runs.values())} 次, 涉及场站 {len(runs)}")
+    print(f"  由多个节点执行的场站: {sum(1 for nodes in owners.values() if len(nodes) > 1)}")
+    print(f"  错误归属执行: {sum(1 for site_no, nodes in owners.items() if nodes != {ring.owner(site_no)})}")
+
+
+async def run(args):
+    random.seed(0)
+    sites = [f"SITE{i:05d}" for i in range(args.sites)]
+    nodes = [f"shard-{i}" for i in range(args.nodes)]
+
+    ring = HashRing(nodes, args.virtual_nodes)
+    print(f"场站: {args.sites}, 节点: {args.nodes}, 虚拟节点: {args.virtual_nodes}")
+    print(f"负载: {balance(ring, sites)}")
+
+    grown = HashRing(nodes + [f"shard-{args.nodes}"], args.virtual_nodes)
+    print(f"加入1个节点: 迁移场站 {moved(ring, grown, sites)} (理想 {args.sites // (args.nodes + 1)})")
+    shrunk = HashRing(nodes[:-1], args.virtual_nodes)
+    print(f"移除1个节点: 迁移场站 {moved(ring, shrunk, sites)} (理想 {args.sites // args.nodes})")
+
+    keys = [f"partition-{p}" for p in range(args.partitions)]
+    assignment = ring.assign(keys)
+    counts = Counter(assignment.values())
+    grown_assignment = grown.assign(keys)
+    print(f"分区: {args.partitions}, 每节点 {min(counts.values())}~{max(counts.values())} 个, "
+          f"加入1个节点迁移 {sum(1 for key in keys if assignment[key] != grown_assignment[key])} 个")
+
+    await simulate(args, ring, sites[:args.active_sites])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sites', type=int, default=5000)
+    parser.add_argument('--nodes', type=int, default=4)
+    parser.add_argument('--virtual-nodes', type=int, default=160)
+    parser.add_argument('--partitions', type=int, default=64, help='上行主题分区数')
+    parser.add_argument('--triggers', type=int, default=3000)
+    parser.add_argument('--active-sites', type=int, default=300, help='模拟中被触发的场站数')
+    parser.add_argument('--latency', type=float, default=0.001, help='单次优化耗时(秒)')
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+"""
+求解进程池压测：智能分配在事件循环内求解 vs 进程池求解时的事件循环延迟
+
+多个场站并发优化的同时运行一个每1ms唤醒一次的协程，记录其最大唤醒延迟（即事件循环被阻塞的时间）；
+比较两种方式的受影响充电枪数量（求解器有时限，最优解不唯一时具体功率可能不同），并统计突发请求超过进程池上限时回退快速分配的次数
+
+用法: python -m benchmarks.solver_pool --sites 8 --chargers 200 --workers 2 --max-pending 4
+"""
+import argparse
+import asyncio
+import random
+import time
+
+import numpy as np
+
+from app.services.algorithm import PowerOptimization
+from app.services.allocation import TASK_TYPE_INTELLIGENT, count_affected
+from app.services.solver_pool import SolverPool
+
+
+def make_site(site_no: str, chargers: int):
+    """两枪一桩、每20枪一个群组、部分桩按模块粒度分配的场站"""
+    states = []
+    for i in range(chargers):
+        pile = i // 2
+        states.append({
+            'charger_sn': f"{site_no}_CHG{i:05d}",
+            'current_power': random.uniform(40, 240),
+            'min_power': 0,
+            'max_power': 250,
+            'pile_sn': f"{site_no}_PILE{pile:05d}",
+            'rated_power': 360,
+            'group_id': pile // 10,
+            'group_power_limit': 3000,
+            'unit_power': 20 if pile % 3 == 0 else 0
+        })
+    total = sum(state['current_power'] for state in states)
+    return {'site_no': site_no, 'demand': total * 0.85, 'total_power_limit': None}, states
+
+
+async def measure(optimization: PowerOptimization, sites, concurrent: bool):
+    """并发优化全部场站，返回 (耗时, 事件循环最大阻塞ms, 结果)"""
+    lag = 0.0
+    stop = False
+
+    async def ticker():
+        nonlocal lag
+        loop = asyncio.get_running_loop()
+        while not stop:
+            start = loop.time()
+            await asyncio.sleep(0.001)
+            lag = max(lag, loop.time() - start - 0.001)
+
+    tick = asyncio.create_task(ticker())
+    await asyncio.sleep(0.01)
+    start = time.perf_counter()
+    calls = [optimization.optimize_async(site, states, TASK_TYPE_INTELLIGENT) for site, states in sites]
+    if concurrent:
+        results = await asyncio.gather(*calls)
+    else:
+        results = [await call for call in calls]
+    elapsed = time.perf_counter() - start
+    stop = True
+    await tick
+    return elapsed, lag * 1000, results
+
+
+def affected(sites, results) -> int:
+    """全部场站的受影响充电枪数量"""
+    total = 0
+    for (_, states), profiles in zip(sites, results):
+        new_powers = {profile['charger_sn']: profile.get('power', profile.get('current_power')) for profile in profiles}
+        total += count_affected(
+            np.array([state['current_power'] for state in states]),
+            np.array([new_powers[state['charger_sn']] for state in states])
+        )
+    return total
+
+
+async def run(args):
+    random.seed(0)
+    sites = [make_site(f"SITE{i:03d}", args.chargers) for i in range(args.sites)]
+
+    inline = PowerOptimization()
+    inline_time, inline_lag, inline_results = await measure(inline, sites, concurrent=False)
+    print(f"场站: {args.sites}, 每站充电枪: {args.chargers}")
+    print(
+        f"事件循环内求解: 耗时 {inline_time:.2f}s, 事件循环最大阻塞 {inline_lag:.1f}ms, "
+        f"受影响充电枪 {affected(sites, inline_results)}"
+    )
+
+    pool = SolverPool(args.workers, args.sites, args.timeout)
+    await pool.start()
+    offloaded = PowerOptimization(pool)
+    pool_time, pool_lag, pool_results = await measure(offloaded, sites, concurrent=True)
+    print(
+        f"进程池求解({args.workers}进程): 耗时 {pool_time:.2f}s, 事件循环最大阻塞 {pool_lag:.1f}ms, "
+        f"受影响充电枪 {affected(sites, pool_results)}"
+    )
+
+    # 突发请求超过进程池上限时回退快速分配
+    pool.max_pending = args.max_pending
+    burst_time, burst_lag, _ = await measure(offloaded, sites * 3, concurrent=True)
+    stats = pool.stats()
+    await pool.stop()
+    print(
+        f"突发 {len(sites) * 3} 次(上限 {args.max_pending}): 耗时 {burst_time:.2f}s, "
+        f"事件循环最大阻塞 {burst_lag:.1f}ms, 回退快速分配 {stats['saturated']} 次"
+    )
+    print(f"进程池指标: {stats}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sites', type=int, default=8)
+    parser.add_argument('--chargers', type=int, default=200)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--max-pending', type=int, default=4)
+    parser.add_argument('--timeout', type=float, default=10.0)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    main()
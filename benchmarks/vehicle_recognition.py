@@ -0,0 +1,82 @@
+"""
+车型识别压测：指纹库kNN识别的准确率，逐条识别 vs 批量识别 vs mac缓存命中的吞吐
+
+用法: python -m benchmarks.vehicle_recognition --models 300 --library 50000 --batch 5000
+"""
+import argparse
+import random
+import time
+
+import numpy as np
+
+from app.services.algorithm import VehicleRecognition
+
+
+def make_models(count: int):
+    """车型特征中心: (最大电压, 最大电流, 最大功率, 电池容量)"""
+    models = {}
+    for m in range(count):
+        voltage = random.choice([400, 800]) * random.uniform(0.9, 1.05)
+        current = random.uniform(100, 500)
+        capacity = random.uniform(40, 120)
+        models[f"VENDOR{m % 40:02d}_MODEL{m:03d}_{capacity:.0f}"] = (
+            voltage, current, min(voltage * current / 1000, 350), capacity
+        )
+    return models
+
+
+def sample(center, noise: float):
+    return [value * (1 + random.gauss(0, noise)) for value in center]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--models', type=int, default=300)
+    parser.add_argument('--library', type=int, default=50000)
+    parser.add_argument('--batch', type=int, default=5000)
+    parser.add_argument('--noise', type=float, default=0.01)
+    args = parser.parse_args()
+    random.seed(0)
+
+    models = make_models(args.models)
+    names = list(models)
+    library = []
+    for _ in range(args.library):
+        name = random.choice(names)
+        library.append((name, *sample(models[name], args.noise)))
+
+    recognition = VehicleRecognition()
+    start = time.perf_counter()
+    recognition.library.load(library)
+    print(f"车型: {args.models}, 指纹库: {args.library}, 构建索引: {(time.perf_counter() - start) * 1000:.1f}ms")
+
+    truth = [random.choice(names) for _ in range(args.batch)]
+    vehicles = []
+    for i, name in enumerate(truth):
+        voltage, current, power, capacity = sample(models[name], args.noise)
+        vehicles.append({
+            'mac_addr': f"MAC{i:06d}", 'voltage': voltage, 'current': current, 'power': power, 'capacity': capacity
+        })
+
+    start = time.perf_counter()
+    for vehicle in vehicles:
+        recognition.library.classify([[vehicle['voltage'], vehicle['current'], vehicle['power'], vehicle['capacity']]])
+    single_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    result = recognition.recognize_batch(vehicles)
+    batch_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    recognition.recognize_batch(vehicles)
+    cached_time = time.perf_counter() - start
+
+    accuracy = np.mean([model == name for model, name in zip(result, truth)])
+    print(f"准确率: {accuracy:.1%}")
+    print(f"逐条识别: {args.batch / single_time:,.0f} 辆/秒")
+    print(f"批量识别: {args.batch / batch_time:,.0f} 辆/秒 ({batch_time * 1000:.1f}ms / {args.batch} 辆)")
+    print(f"mac缓存命中: {args.batch / cached_time:,.0f} 辆/秒")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,26 @@
+import os
+import tempfile
+
+# 测试不读取部署环境的.env，日志也写入临时目录
+os.chdir(tempfile.mkdtemp(prefix="charging_tests_"))
+
+import pytest_asyncio  # noqa: E402
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+from sqlalchemy.pool import StaticPool  # noqa: E402
+
+from app.models.entities import Base  # noqa: E402
+from app.services.database import DatabaseService  # noqa: E402
+
+
+@pytest_asyncio.fixture
+async def db_service():
+    """使用内存SQLite的DatabaseService（不启动后台写入和定时任务）"""
+    service = DatabaseService()
+    await service.engine.dispose()
+    service.engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+    service.async_session = sessionmaker(service.engine, class_=AsyncSession, expire_on_commit=False)
+    async with service.engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield service
+    await service.engine.dispose()
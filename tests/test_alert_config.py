@@ -0,0 +1,29 @@
+import pytest
+from sqlalchemy import insert
+
+from app.models.entities import AlertConfiguration
+from app.models.schemas import AlertConfig
+
+
+@pytest.mark.asyncio
+async def test_alert_config_round_trip(db_service):
+    # 新插入的配置description和updated_at为空
+    async with db_service.async_session() as session:
+        async with session.begin():
+            await session.execute(insert(AlertConfiguration).values(
+                site_no="SITE1", alert_type="POWER_OVER_LIMIT", threshold=0.95
+            ))
+
+    configs = await db_service.get_alert_configs("SITE1")
+    assert len(configs) == 1
+    assert configs[0].threshold == 0.95
+    assert configs[0].description is None
+    assert configs[0].updated_at is None
+    assert configs[0].created_at is not None
+
+
+@pytest.mark.asyncio
+async def test_saved_alert_config_round_trip(db_service):
+    await db_service.save_alert_config(AlertConfig(site_no="*", alert_type="OFFLINE", threshold=300))
+    configs = await db_service.get_alert_configs()
+    assert [(config.site_no, config.alert_type, config.threshold) for config in configs] == [("*", "OFFLINE", 300)]
@@ -0,0 +1,85 @@
+from datetime import datetime, timedelta
+
+from app.services.alert_rules import TriggeredAlert
+from app.services.alert_tracker import STATUS_ACTIVE, STATUS_RESOLVED, AlertTracker
+
+T0 = datetime(2024, 1, 1, 8, 0, 0)
+ALERT = TriggeredAlert("SITE1", "over_power", "CHG1", "HIGH", "功率超限")
+
+
+def at(seconds):
+    return T0 + timedelta(seconds=seconds)
+
+
+def make_tracker():
+    return AlertTracker(resolve_after=90, update_interval=300, suppress_window=300)
+
+
+def test_repeated_firing_is_deduplicated():
+    tracker = make_tracker()
+    rows = tracker.observe([ALERT], at(0))
+    assert [row["status"] for row in rows] == [STATUS_ACTIVE]
+    key = rows[0]["alert_key"]
+
+    # 写库间隔内重复触发只累计次数，不写库
+    for second in range(10, 300, 10):
+        assert tracker.observe([ALERT._replace(message="功率仍超限")], at(second)) == []
+    tracked = tracker.active[("SITE1", "over_power", "CHG1")]
+    assert tracked.occurrences == 30
+    assert tracked.message == "功率仍超限"
+
+    # 超过写库间隔后同一告警更新一次
+    rows = tracker.observe([ALERT], at(300))
+    assert [(row["alert_key"], row["occurrences"]) for row in rows] == [(key, 31)]
+    assert tracker.stats() == {"active": 1, "opened": 1, "reopened": 0, "resolved": 0, "suppressed": 30}
+
+
+def test_other_targets_are_tracked_separately():
+    tracker = make_tracker()
+    rows = tracker.observe([ALERT, ALERT._replace(target="CHG2")], at(0))
+    assert len({row["alert_key"] for row in rows}) == 2
+    assert tracker.stats()["opened"] == 2
+
+
+def test_resolve_then_refire_reopens_same_alert():
+    tracker = make_tracker()
+    key = tracker.observe([ALERT], at(0))[0]["alert_key"]
+    assert tracker.resolve_stale(at(60)) == []
+
+    rows = tracker.resolve_stale(at(90))
+    assert [(row["alert_key"], row["status"], row["resolved_at"]) for row in rows] == [
+        (key, STATUS_RESOLVED, at(90))
+    ]
+    assert tracker.active == {}
+
+    # 抑制窗口内再次触发：重新打开原告警而不是新建
+    rows = tracker.observe([ALERT], at(200))
+    assert [(row["alert_key"], row["status"], row["occurrences"]) for row in rows] == [(key, STATUS_ACTIVE, 2)]
+    assert rows[0]["resolved_at"] is None
+    assert tracker.stats()["reopened"] == 1 and tracker.stats()["opened"] == 1
+
+
+def test_refire_after_suppression_window_opens_new_alert():
+    tracker = make_tracker()
+    key = tracker.observe([ALERT], at(0))[0]["alert_key"]
+    tracker.resolve_stale(at(90))
+
+    # 抑制窗口过期后清理已恢复告警，再次触发时新建告警
+    tracker.resolve_stale(at(391))
+    rows = tracker.observe([ALERT], at(400))
+    assert [row["occurrences"] for row in rows] == [1]
+    assert rows[0]["alert_key"] != key
+    assert tracker.stats()["opened"] == 2 and tracker.stats()["reopened"] == 0
+
+
+def test_refire_at_window_boundary_without_cleanup():
+    tracker = make_tracker()
+    key = tracker.observe([ALERT], at(0))[0]["alert_key"]
+    tracker.resolve_stale(at(90))
+    # 未经过清理时按恢复时间判断：窗口边界内重新打开，超出后新建
+    assert tracker.observe([ALERT], at(390))[0]["alert_key"] == key
+
+    tracker = make_tracker()
+    tracker.observe([ALERT], at(0))
+    tracker.resolve_stale(at(90))
+    assert tracker.observe([ALERT], at(391))[0]["alert_key"] != key
@@ -0,0 +1,92 @@
+import numpy as np
+import pytest
+
+from app.services import allocation
+from app.services.allocation import ChargerArrays, ExactAllocator
+
+
+def make_chargers(count: int = 20) -> ChargerArrays:
+    rng = np.random.default_rng(0)
+    return ChargerArrays(
+        charger_sn=[f"CHG{i:03d}" for i in range(count)],
+        current_power=rng.uniform(40, 240, count),
+        max_power=np.full(count, 250.0),
+        unit_power=np.where(np.arange(count) % 3 == 0, 20.0, 0.0)
+    )
+
+
+def test_exact_respects_site_limit():
+    chargers = make_chargers()
+    limit = chargers.current_power.sum() * 0.85
+    powers = ExactAllocator(time_limit=5, max_decrease=0.3, min_impact=0.1).allocate(chargers, limit)
+    assert powers is not None
+    assert powers.sum() <= limit + 1e-6
+
+
+def test_exact_keeps_incumbent_on_time_limit(monkeypatch):
+    milp = allocation.milp
+
+    def time_limited(*args, **kwargs):
+        result = milp(*args, **kwargs)
+        result.status = 1  # 模拟求解达到时限，返回当前可行解
+        return result
+
+    monkeypatch.setattr(allocation, 'milp', time_limited)
+    chargers = make_chargers()
+    limit = chargers.current_power.sum() * 0.85
+    powers = ExactAllocator(time_limit=5, max_decrease=0.3, min_impact=0.1).allocate(chargers, limit)
+    assert powers is not None
+    assert powers.sum() <= limit + 1e-6
+
+
+def test_exact_infeasible_returns_none():
+    chargers = make_chargers()
+    # 单枪最多下调30%，总功率上限为现有一半时无可行解
+    limit = chargers.current_power.sum() * 0.5
+    assert ExactAllocator(time_limit=5, max_decrease=0.3, min_impact=0.1).allocate(chargers, limit) is None
+
+
+def test_exact_is_silent(capfd):
+    chargers = make_chargers()
+    ExactAllocator(time_limit=5, max_decrease=0.3, min_impact=0.1).allocate(chargers, chargers.current_power.sum() * 0.9)
+    assert 'HiGHS' not in capfd.readouterr().out
+
+
+def greedy_reference(current_power, power_reduction, min_power, max_decrease, min_impact):
+    """向量化之前逐个充电枪的贪心循环（增加了充电枪下限）"""
+    order = sorted(range(len(current_power)), key=lambda i: current_power[i], reverse=True)
+    new_power = list(current_power)
+    remaining = power_reduction
+    for i in order:
+        power = current_power[i]
+        if remaining <= 0 or power <= 0:
+            continue
+        floor = power * (1 - max_decrease)
+        if min_power is not None:
+            floor = max(floor, min_power[i])
+        actual = min(max(power - floor, 0.0), remaining)
+        if actual / power < min_impact:
+            continue
+        new_power[i] = power - actual
+        remaining -= actual
+    return np.array(new_power)
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_greedy_matches_reference_loop(seed):
+    rng = np.random.default_rng(seed)
+    count = int(rng.integers(1, 40))
+    # 取整到5kW制造大量功率相同的充电枪，部分为0功率
+    current_power = np.round(rng.uniform(0, 250, count) / 5) * 5
+    min_power = rng.choice([0.0, 30.0, 120.0], count) if seed % 2 else None
+    total = current_power.sum()
+    demand = rng.choice([0.0, total * rng.uniform(0.5, 1.0), total * 1.1])
+    max_decrease = float(rng.choice([0.1, 0.3, 0.5]))
+    min_impact = float(rng.choice([0.0, 0.05, 0.1]))
+
+    expected = greedy_reference(
+        current_power.tolist(), total - demand,
+        None if min_power is None else min_power.tolist(), max_decrease, min_impact
+    )
+    actual = allocation.allocate_greedy(current_power, total - demand, min_power, max_decrease, min_impact)
+    np.testing.assert_array_equal(actual, expected)
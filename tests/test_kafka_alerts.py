@@ -0,0 +1,45 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app.services.charger_state import ChargerStateStore
+from app.services.kafka import KafkaService
+from app.services.kafka_codec import POWER_PREDICTION
+from app.services.kafka_memory import InMemoryBroker
+from app.utils.cache import TTLCache
+
+
+class FakeAlgorithm:
+    def __init__(self):
+        self.state_store = ChargerStateStore()
+        self.shards = None
+        self.processed = []
+
+    async def process_power_data(self, data):
+        self.processed.append(data.charger_sn)
+
+
+class FailingAlertStream:
+    async def on_power_data(self, data, site_no):
+        raise RuntimeError("rule engine error")
+
+
+@pytest.mark.asyncio
+async def test_alert_failure_does_not_drop_power_update():
+    algorithm = FakeAlgorithm()
+    service = KafkaService(algorithm, InMemoryBroker(2))
+    service.alert_stream = FailingAlertStream()
+    raw = service.codec.encode({
+        'message_type': POWER_PREDICTION,
+        'data': {'charger_sn': 'CHG1', 'site_no': 'SITE1', 'soc': 50, 'power': 60}
+    })
+    await service._handle_message(SimpleNamespace(value=raw))
+    assert algorithm.processed == ['CHG1']
+
+
+def test_peek_does_not_count():
+    cache = TTLCache(10, 60)
+    cache.put('SITE1', 'topology')
+    assert cache.peek('SITE1') == 'topology'
+    assert cache.peek('SITE2') is None
+    assert (cache.hits, cache.misses) == (0, 0)
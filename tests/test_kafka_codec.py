@@ -0,0 +1,50 @@
+from datetime import datetime
+
+import pytest
+from pydantic import ValidationError
+
+from app.services.kafka_codec import (
+    BinaryCodec, FastJsonCodec, JsonCodec, PLUG_STATUS, POWER_PREDICTION, VEHICLE_RECOGNITION
+)
+
+CODECS = [JsonCodec(), FastJsonCodec(), BinaryCodec()]
+
+POWER = {
+    'charger_sn': 'CHG0001', 'session_id': 'S' * 300, 'mac_addr': '00:11:22:33:44:55',
+    'site_no': '场站' * 100, 'soc': 55.0, 'power': 120.5, 'capacity': 80.0,
+    'timestamp': datetime(2024, 1, 1, 8, 30, 0)
+}
+PLUG = {'charger_sn': 'CHG0001', 'status': 'PLUGGED', 'power': 60.0, 'site_no': 'SITE001'}
+VEHICLE = {
+    'session_id': 'S1', 'charger_sn': 'CHG0001', 'mac_addr': '00:11', 'voltage': 400.0,
+    'current': 100.0, 'power': 40.0, 'capacity': 60.0
+}
+
+
+@pytest.mark.parametrize('codec', CODECS, ids=lambda codec: codec.name)
+@pytest.mark.parametrize('message_type,data', [
+    (POWER_PREDICTION, POWER), (PLUG_STATUS, PLUG), (VEHICLE_RECOGNITION, VEHICLE)
+])
+def test_round_trip(codec, message_type, data):
+    decoded = codec.decode(codec.encode({'message_type': message_type, 'data': data}))
+    assert decoded.message_type == message_type
+    for field, value in data.items():
+        assert getattr(decoded.data, field) == value
+
+
+@pytest.mark.parametrize('codec', CODECS, ids=lambda codec: codec.name)
+def test_unknown_type_returns_raw_data(codec):
+    decoded = codec.decode(codec.encode({'message_type': 99, 'data': {'charger_sn': 'CHG0001'}}))
+    assert decoded == (99, {'charger_sn': 'CHG0001'})
+
+
+@pytest.mark.parametrize('codec', CODECS, ids=lambda codec: codec.name)
+def test_invalid_known_type_raises(codec):
+    raw = JsonCodec().encode({'message_type': POWER_PREDICTION, 'data': {'charger_sn': 'CHG0001'}})
+    with pytest.raises(ValidationError):
+        codec.decode(raw)
+
+
+def test_binary_rejects_oversized_string():
+    with pytest.raises(ValueError):
+        BinaryCodec().encode({'message_type': PLUG_STATUS, 'data': {**PLUG, 'session_id': 'S' * 70000}})
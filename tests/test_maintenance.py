@@ -0,0 +1,69 @@
+import httpx
+import pytest
+
+from app.core.config import settings
+from app.services.maintenance import MaintenanceService
+
+
+def make_service(monkeypatch, handler):
+    monkeypatch.setattr(settings, "MAINTENANCE_NOTIFY_WINDOW", 3600)
+    monkeypatch.setattr(settings, "MAINTENANCE_RETRY_ATTEMPTS", 1)
+    monkeypatch.setattr(settings, "MAINTENANCE_REQUEUE_LIMIT", 3)
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return MaintenanceService(client)
+
+
+@pytest.mark.asyncio
+async def test_failed_notifications_are_requeued_then_dropped(monkeypatch):
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(503)
+
+    service = make_service(monkeypatch, handler)
+    await service.start()
+    try:
+        await service.notify_maintenance("SITE1", ["PILE1"])
+        assert await service.flush() == 0
+        assert service.stats()["pending_sites"] == 1
+
+        # 窗口内新到的通知与放回的通知合并
+        await service.notify_maintenance("SITE1", ["PILE2"])
+        assert await service.flush() == 0
+        assert b'"PILE2"' in requests[-1].content and b'"PILE1"' in requests[-1].content
+
+        # 第3个窗口仍失败：丢弃，不再重发
+        assert await service.flush() == 0
+        assert service.stats()["pending_sites"] == 0
+        assert service.dropped == 1
+        assert await service.flush() == 0
+        assert len(requests) == 3
+    finally:
+        await service.stop()
+
+
+@pytest.mark.asyncio
+async def test_success_resets_failure_count(monkeypatch):
+    responses = iter([503, 503, 200, 503, 503])
+
+    def handler(request):
+        return httpx.Response(next(responses), json={})
+
+    service = make_service(monkeypatch, handler)
+    await service.start()
+    try:
+        await service.notify_maintenance("SITE1", ["PILE1"])
+        for _ in range(3):
+            await service.flush()
+        assert service.stats()["pending_sites"] == 0
+
+        await service.notify_maintenance("SITE1", ["PILE1"])
+        await service.flush()
+        await service.flush()
+        # 成功后重新计数，两次失败未达到上限
+        assert service.dropped == 0
+        assert service.stats()["pending_sites"] == 1
+    finally:
+        service._pending.clear()
+        await service.stop()
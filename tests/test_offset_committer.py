@@ -0,0 +1,47 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app.services.kafka import OffsetCommitter
+from app.services.kafka_memory import TopicPartition
+
+
+class FlakyConsumer:
+    def __init__(self):
+        self.fail = False
+        self.commits = []
+
+    async def commit(self, offsets):
+        if self.fail:
+            raise RuntimeError("commit failed")
+        self.commits.append(dict(offsets))
+
+
+def record(partition, offset):
+    return SimpleNamespace(topic="power", partition=partition, offset=offset)
+
+
+@pytest.mark.asyncio
+async def test_discard_drops_backlog_of_revoked_partitions():
+    consumer = FlakyConsumer()
+    committer = OffsetCommitter(consumer, batch_size=100, interval_ms=1000)
+    for offset in range(3):
+        committer.mark_processed(record(0, offset))
+    committer.mark_processed(record(1, 0))
+
+    # 提交失败后放回，计数保持按分区
+    consumer.fail = True
+    await committer.commit()
+    assert committer.stats()["pending_messages"] == 4
+
+    committer.discard([TopicPartition("power", 0)])
+    assert committer.stats()["pending_messages"] == 1
+
+    committer.discard([TopicPartition("power", 1)])
+    stats = committer.stats()
+    assert stats["pending_messages"] == 0
+    assert stats["commit_lag_seconds"] == 0.0
+
+    consumer.fail = False
+    await committer.commit()
+    assert consumer.commits == []
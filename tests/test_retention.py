@@ -0,0 +1,53 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import func, select
+
+from app.core.config import settings
+from app.models.entities import ChargingRecord, OptimizationTask
+
+
+@pytest.mark.asyncio
+async def test_cleanup_continues_after_table_failure(db_service, monkeypatch):
+    now = datetime.utcnow()
+    async with db_service.async_session() as session:
+        session.add_all([
+            ChargingRecord(charger_sn="CHG1", created_at=now - timedelta(days=100)),
+            ChargingRecord(charger_sn="CHG1", created_at=now),
+            # 待执行任务没有start_time，按created_at清理
+            OptimizationTask(status="PENDING", created_at=now - timedelta(days=40)),
+            OptimizationTask(status="DONE", created_at=now, start_time=now),
+        ])
+        await session.commit()
+
+    delete_expired_rows = db_service._delete_expired_rows
+
+    async def failing(table_name, cutoff):
+        if table_name == "power_prediction":
+            raise RuntimeError("lock wait timeout")
+        return await delete_expired_rows(table_name, cutoff)
+
+    monkeypatch.setattr(db_service, "_delete_expired_rows", failing)
+    monkeypatch.setattr(settings, "RETENTION_CHUNK_PAUSE", 0)
+    results = await db_service.cleanup_old_data()
+
+    assert results["power_prediction"]["error"] == "lock wait timeout"
+    assert results["charging_record"]["deleted"] == 1
+    assert results["optimization_task"]["deleted"] == 1
+    async with db_service.async_session() as session:
+        assert await session.scalar(select(func.count()).select_from(OptimizationTask)) == 1
+
+
+@pytest.mark.asyncio
+async def test_delete_expired_rows_tolerates_out_of_order_chunks(db_service, monkeypatch):
+    now = datetime.utcnow()
+    async with db_service.async_session() as session:
+        # 第一块混有未过期数据，之后仍有过期数据
+        ages = [100, 1, 100, 100, 1, 1]
+        session.add_all([ChargingRecord(charger_sn="CHG1", created_at=now - timedelta(days=age)) for age in ages])
+        await session.commit()
+
+    monkeypatch.setattr(settings, "RETENTION_CHUNK_SIZE", 2)
+    monkeypatch.setattr(settings, "RETENTION_CHUNK_PAUSE", 0)
+    result = await db_service._delete_expired_rows("charging_record", now - timedelta(days=90))
+    assert result["deleted"] == 3
@@ -0,0 +1,62 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.models.schemas import PowerData
+from app.services.rollup import PowerRollupAggregator, SITE_TOTAL
+
+T0 = datetime(2024, 1, 1, 8, 0, 0)
+
+
+def site_rows(aggregator, resolution):
+    return {
+        row["bucket_start"]: row for row in aggregator.drain()
+        if row["charger_sn"] == SITE_TOTAL and row["resolution"] == resolution
+    }
+
+
+def test_site_average_independent_of_report_rate():
+    aggregator = PowerRollupAggregator(resolutions=(60,), max_gap=60)
+    aggregator.add("SITE1", "B", 100.0, T0)
+    # A前30秒每秒上报，后30秒每10秒上报；B在第30秒降为0
+    for second in range(0, 30):
+        aggregator.add("SITE1", "A", 10.0, T0 + timedelta(seconds=second))
+    aggregator.add("SITE1", "B", 0.0, T0 + timedelta(seconds=30))
+    for second in range(30, 61, 10):
+        aggregator.add("SITE1", "A", 10.0, T0 + timedelta(seconds=second))
+
+    row = site_rows(aggregator, 60)[T0]
+    assert row["samples"] == 60
+    assert abs(row["power_sum"] / row["samples"] - 60.0) < 1e-6
+    assert row["power_max"] == 110.0
+    assert abs(row["energy"] - (110 * 30 + 10 * 30) / 3600) < 1e-6
+
+
+def test_site_total_split_across_buckets_and_capped_by_gap():
+    aggregator = PowerRollupAggregator(resolutions=(60,), max_gap=60)
+    aggregator.add("SITE1", "A", 50.0, T0 + timedelta(seconds=50))
+    # 间隔超过max_gap，只按60秒计入
+    aggregator.add("SITE1", "A", 50.0, T0 + timedelta(seconds=300))
+    rows = site_rows(aggregator, 60)
+    assert rows[T0]["samples"] == 10
+    assert rows[T0 + timedelta(seconds=60)]["samples"] == 50
+    assert sum(row["samples"] for row in rows.values()) == 60
+
+
+def test_charger_rows_only_at_charger_resolution():
+    aggregator = PowerRollupAggregator(resolutions=(60, 900, 3600), charger_resolutions=(3600,))
+    for second in range(0, 600, 5):
+        aggregator.add("SITE1", "A", 20.0, T0 + timedelta(seconds=second))
+    rows = [row for row in aggregator.drain() if row["charger_sn"] == "A"]
+    assert {row["resolution"] for row in rows} == {3600}
+    assert len(rows) == 1
+
+
+@pytest.mark.asyncio
+async def test_records_without_site_are_not_rolled_up(db_service):
+    await db_service.add_charging_record(PowerData(charger_sn="CHG1", soc=50, power=60, timestamp=T0))
+    assert db_service.power_rollup.drain() == []
+
+    # 场站由调用方按充电枪实时状态解析
+    await db_service.add_charging_record(PowerData(charger_sn="CHG1", soc=50, power=60, timestamp=T0), "SITE1")
+    assert {row["site_no"] for row in db_service.power_rollup.drain()} == {"SITE1"}
@@ -0,0 +1,44 @@
+import asyncio
+
+import pytest
+
+from app.services.scheduler import OptimizationScheduler, PRIORITY_DEMAND
+
+
+class CountingRunner:
+    def __init__(self):
+        self.runs = 0
+
+    async def __call__(self, site_no, task_type=None):
+        self.runs += 1
+        await asyncio.sleep(0.01)
+
+
+@pytest.mark.asyncio
+async def test_demand_burst_is_coalesced():
+    runner = CountingRunner()
+    scheduler = OptimizationScheduler(runner, 10, 2, demand_interval=0.2)
+    await scheduler.start()
+    try:
+        # 0.4秒内20次需求变化
+        for _ in range(20):
+            await scheduler.schedule("SITE1", PRIORITY_DEMAND)
+            await asyncio.sleep(0.02)
+        await asyncio.sleep(0.3)
+        assert 2 <= runner.runs <= 4
+        assert scheduler.stats()["queue_depth"] == 0
+    finally:
+        await scheduler.stop()
+
+
+@pytest.mark.asyncio
+async def test_first_demand_runs_immediately():
+    runner = CountingRunner()
+    scheduler = OptimizationScheduler(runner, 10, 2, demand_interval=5)
+    await scheduler.start()
+    try:
+        await scheduler.schedule("SITE1", PRIORITY_DEMAND)
+        await asyncio.sleep(0.05)
+        assert runner.runs == 1
+    finally:
+        await scheduler.stop()
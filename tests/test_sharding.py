@@ -0,0 +1,205 @@
+import asyncio
+from collections import Counter
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.models.entities import OptimizationTask, ShardNode
+from app.services.charger_state import ChargerStateStore
+from app.services.kafka import KafkaService
+from app.services.kafka_codec import POWER_PREDICTION
+from app.services.kafka_memory import InMemoryBroker, TopicPartition
+from app.services.scheduler import TASK_PENDING, TASK_RUNNING
+from app.services.sharding import HashRing, ShardCoordinator
+
+SITES = [f"SITE{i:05d}" for i in range(5000)]
+PARTITIONS = [f"partition-{p}" for p in range(64)]
+
+
+def test_ring_is_deterministic_and_balanced():
+    nodes = [f"shard-{i}" for i in range(4)]
+    ring, reordered = HashRing(nodes), HashRing(reversed(nodes))
+    assert all(ring.owner(site) == reordered.owner(site) for site in SITES)
+    counts = Counter(ring.owner(site) for site in SITES)
+    assert max(counts.values()) < len(SITES) / len(nodes) * 1.25
+
+
+def test_ring_join_moves_about_one_nth():
+    nodes = [f"shard-{i}" for i in range(4)]
+    before, after = HashRing(nodes), HashRing(nodes + ["shard-4"])
+    moved = [site for site in SITES if before.owner(site) != after.owner(site)]
+    # 只有迁移到新节点的场站改变归属
+    assert all(after.owner(site) == "shard-4" for site in moved)
+    assert len(moved) < len(SITES) / 5 * 1.5
+
+
+def test_assign_bounds_load_and_limits_movement():
+    nodes = [f"shard-{i}" for i in range(5)]
+    before = HashRing(nodes[:4]).assign(PARTITIONS)
+    after = HashRing(nodes).assign(PARTITIONS)
+    assert max(Counter(after.values()).values()) == 13
+    assert after == HashRing(reversed(nodes)).assign(PARTITIONS)
+    moved = sum(1 for key in PARTITIONS if before[key] != after[key])
+    assert moved <= len(PARTITIONS) / 5 * 2
+
+
+class FakeShardStore:
+    def __init__(self, nodes):
+        self.nodes = nodes
+
+    async def heartbeat_shard_node(self, node_id, token):
+        return True
+
+    async def get_live_shard_nodes(self, ttl):
+        return list(self.nodes)
+
+
+async def make_coordinators(nodes, partitions=8):
+    store = FakeShardStore(nodes)
+    coordinators = []
+    for node_id in nodes:
+        coordinator = ShardCoordinator(store, partitions=partitions)
+        coordinator.node_id = node_id
+        await coordinator.refresh()
+        coordinators.append(coordinator)
+    return store, coordinators
+
+
+@pytest.mark.asyncio
+async def test_each_site_owned_by_one_node():
+    _, coordinators = await make_coordinators(["shard-0", "shard-1", "shard-2"])
+    partitions = [c.owned_partitions for c in coordinators]
+    assert set().union(*partitions) == set(range(8))
+    assert sum(len(p) for p in partitions) == 8
+    for site in SITES[:500]:
+        assert sum(c.owns(site) for c in coordinators) == 1
+
+
+@pytest.mark.asyncio
+async def test_refresh_notifies_only_when_partitions_change():
+    store, (coordinator,) = await make_coordinators(["shard-0"])
+    calls = []
+
+    async def listener():
+        calls.append(set(coordinator.owned_partitions))
+
+    coordinator.add_listener(listener)
+    await coordinator.refresh()
+    assert calls == []
+    store.nodes = ["shard-0", "shard-1"]
+    await coordinator.refresh()
+    assert len(calls) == 1 and 0 < len(calls[0]) < 8
+    assert coordinator.rebalances == 1
+
+
+async def create_task(db_service, **values) -> int:
+    async with db_service.async_session() as session:
+        async with session.begin():
+            task = OptimizationTask(site_no="SITE1", priority=1, triggers=1, **values)
+            session.add(task)
+        return task.task_id
+
+
+async def add_node(db_service, node_id, heartbeat_at):
+    async with db_service.async_session() as session:
+        async with session.begin():
+            session.add(ShardNode(node_id=node_id, token=node_id, heartbeat_at=heartbeat_at))
+
+
+@pytest.mark.asyncio
+async def test_claim_pending_task_is_exclusive(db_service):
+    await add_node(db_service, "shard-0", datetime.utcnow())
+    await add_node(db_service, "shard-1", datetime.utcnow())
+    task_id = await create_task(db_service, status=TASK_PENDING)
+    assert await db_service.claim_optimization_task(task_id, "shard-0", 1)
+    assert not await db_service.claim_optimization_task(task_id, "shard-1", 1)
+
+
+@pytest.mark.asyncio
+async def test_running_task_of_dead_node_can_be_reclaimed(db_service):
+    await add_node(db_service, "shard-0", datetime.utcnow() - timedelta(hours=1))
+    task_id = await create_task(db_service, status=TASK_RUNNING, node_id="shard-0")
+    assert await db_service.claim_optimization_task(task_id, "shard-1", 1)
+
+
+@pytest.mark.asyncio
+async def test_running_task_of_live_node_needs_site_ownership(db_service):
+    await add_node(db_service, "shard-0", datetime.utcnow())
+    await add_node(db_service, "shard-1", datetime.utcnow())
+    task_id = await create_task(db_service, status=TASK_RUNNING, node_id="shard-0")
+    assert not await db_service.claim_optimization_task(task_id, "shard-1", 1)
+    assert await db_service.claim_optimization_task(task_id, "shard-0", 1)
+    assert await db_service.claim_optimization_task(task_id, "shard-1", 1, reclaim=True)
+
+
+class FakeAlgorithm:
+    def __init__(self, shards):
+        self.state_store = ChargerStateStore()
+        self.shards = shards
+        self.processed = []
+
+    async def process_power_data(self, data):
+        self.processed.append(data.site_no)
+
+
+async def produce(service, broker, sites):
+    topic = service.topics[0]
+    for site_no in sites:
+        broker.append(topic, service.codec.encode({
+            'message_type': POWER_PREDICTION,
+            'data': {'charger_sn': f"CHG-{site_no}", 'site_no': site_no, 'soc': 50, 'power': 60}
+        }), key=site_no.encode())
+
+
+async def wait_processed(algorithms, count):
+    for _ in range(500):
+        if sum(len(a.processed) for a in algorithms) >= count:
+            return
+        await asyncio.sleep(0.01)
+
+
+@pytest.mark.asyncio
+async def test_shared_group_consumes_each_partition_once():
+    broker = InMemoryBroker(8)
+    _, coordinators = await make_coordinators(["shard-0", "shard-1"])
+    algorithms = [FakeAlgorithm(c) for c in coordinators]
+    services = [KafkaService(a, broker) for a in algorithms]
+    for service in services:
+        await service.start()
+    try:
+        assert len({service.group_id for service in services}) == 1
+        await produce(services[0], broker, SITES[:200])
+        await wait_processed(algorithms, 200)
+        assert sorted(site for a in algorithms for site in a.processed) == sorted(SITES[:200])
+        for algorithm, coordinator in zip(algorithms, coordinators):
+            assert all(coordinator.owns(site) for site in algorithm.processed)
+        assert all(service.misrouted_messages == 0 for service in services)
+    finally:
+        for service in services:
+            await service.stop()
+
+
+@pytest.mark.asyncio
+async def test_rebalance_commits_revoked_partitions_before_handover():
+    broker = InMemoryBroker(8)
+    store, (coordinator,) = await make_coordinators(["shard-0"])
+    algorithm = FakeAlgorithm(coordinator)
+    service = KafkaService(algorithm, broker)
+    await service.start()
+    try:
+        await produce(service, broker, SITES[:100])
+        await wait_processed([algorithm], 100)
+        store.nodes = ["shard-0", "shard-1"]
+        await coordinator.refresh()
+        for _ in range(500):
+            if len(service.consumer.assignment()) < len(service.topics) * 8:
+                break
+            await asyncio.sleep(0.01)
+        assigned = {tp.partition for tp in service.consumer.assignment()}
+        assert assigned == coordinator.owned_partitions
+        topic = service.topics[0]
+        for partition in set(range(8)) - assigned:
+            tp = TopicPartition(topic, partition)
+            assert (broker.committed(service.group_id, tp) or 0) == broker.end_offset(tp)
+    finally:
+        await service.stop()
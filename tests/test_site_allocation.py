@@ -0,0 +1,128 @@
+import numpy as np
+import pytest
+
+from app.models.schemas import PlugStatus
+from app.services.algorithm import AlgorithmService
+from app.services.allocation import ChargerArrays, SiteAllocation, allocate_greedy
+
+MAX_DECREASE = 0.3
+MIN_IMPACT = 0.1
+
+
+def make_state(i, rng):
+    return {
+        'charger_sn': f"CHG{i:03d}",
+        'current_power': float(rng.uniform(40, 240)),
+        'max_power': 250.0,
+        'min_power': 20.0
+    }
+
+
+def full_allocation(states, site_limit):
+    """全量重新分配（贪心）的结果"""
+    chargers = ChargerArrays.from_states(states)
+    power = np.minimum(chargers.current_power, chargers.max_power)
+    return allocate_greedy(power, power.sum() - site_limit, chargers.min_power, MAX_DECREASE, MIN_IMPACT)
+
+
+def check(allocation, before, changes):
+    chargers = allocation.chargers
+    power = chargers.current_power
+    upper = np.minimum(power, chargers.max_power)
+    floor = np.maximum(power * (1 - MAX_DECREASE), chargers.min_power)
+    assert allocation.allocated.sum() <= allocation.site_limit + 1e-6
+    assert (allocation.allocated <= upper + 1e-9).all()
+    assert (allocation.allocated >= floor - 1e-6).all()
+    # 只下发变化的充电枪，合并到上次结果后与当前分配一致
+    merged = {**before, **changes}
+    assert [merged.get(sn) for sn in chargers.charger_sn] == allocation.allocated.tolist()
+
+
+@pytest.mark.parametrize("seed", range(30))
+def test_incremental_matches_full_reallocation(seed):
+    rng = np.random.default_rng(seed)
+    states = [make_state(i, rng) for i in range(12)]
+    site_limit = sum(s['current_power'] for s in states) * 0.85
+    full = full_allocation(states, site_limit)
+    allocation = SiteAllocation.from_result(
+        states, dict(zip([s['charger_sn'] for s in states], full.tolist())), site_limit
+    )
+
+    next_id = len(states)
+    for step in range(20):
+        action = rng.choice(['add', 'remove', 'demand'])
+        if action == 'add':
+            state = make_state(next_id, rng)
+            next_id += 1
+            states.append(state)
+            allocation.add_charger(state)
+        elif action == 'remove' and len(states) > 1:
+            state = states.pop(int(rng.integers(len(states))))
+            allocation.remove_charger(state['charger_sn'])
+        else:
+            site_limit = sum(s['current_power'] for s in states) * rng.uniform(0.75, 1.1)
+
+        # 插入的枪按请求功率运行，视为已下发
+        before = dict(zip(allocation.chargers.charger_sn, allocation.allocated.tolist()))
+        changes = allocation.rebalance(site_limit, MAX_DECREASE, MIN_IMPACT)
+        full = full_allocation(states, site_limit)
+        if changes is None:
+            # 增量无解时全量重算也无法满足场站上限
+            assert full.sum() > site_limit - 1e-6 or allocation.allocated.sum() > site_limit
+            allocation = SiteAllocation.from_result(
+                states, dict(zip([s['charger_sn'] for s in states], full.tolist())), site_limit
+            )
+            continue
+        check(allocation, before, changes)
+        # 与全量重新分配输出的总功率一致：都用足场站上限（或全部满足请求）
+        upper = np.minimum([s['current_power'] for s in states], 250.0).sum()
+        assert allocation.allocated.sum() == pytest.approx(min(site_limit, upper), abs=1e-6)
+        if full.sum() <= site_limit + 1e-6:
+            assert allocation.allocated.sum() >= full.sum() - 1e-6
+
+
+def test_rebalance_refuses_infeasible_limit():
+    states = [{'charger_sn': f"CHG{i}", 'current_power': 100.0} for i in range(4)]
+    allocation = SiteAllocation.from_result(states, {}, 400)
+    assert allocation.rebalance(250, MAX_DECREASE, MIN_IMPACT) is None
+    assert allocation.allocated.tolist() == [100.0] * 4
+
+
+def test_rebalance_respects_pile_limit():
+    states = [
+        {'charger_sn': "A", 'current_power': 100.0, 'pile_sn': "P1", 'rated_power': 180.0},
+        {'charger_sn': "B", 'current_power': 80.0, 'pile_sn': "P1", 'rated_power': 180.0},
+    ]
+    allocation = SiteAllocation.from_result(states, {}, 1000)
+    allocation.add_charger({'charger_sn': "C", 'current_power': 50.0, 'pile_sn': "P1", 'rated_power': 180.0})
+    # 加入后超过桩额定功率，增量结果不满足时交由全量重算
+    assert allocation.rebalance(1000, MAX_DECREASE, MIN_IMPACT) is None
+
+
+class FakeKafka:
+    def __init__(self):
+        self.published = []
+
+    async def publish_batch_profiles(self, profiles, site_no=None):
+        self.published.append({p['charger_sn']: p['power'] for p in profiles})
+
+
+@pytest.mark.asyncio
+async def test_plug_events_publish_only_changes(db_service):
+    kafka = FakeKafka()
+    service = AlgorithmService(db_service, kafka)
+    states = [{'charger_sn': f"CHG{i}", 'current_power': 100.0} for i in range(4)]
+    service.allocations["SITE1"] = SiteAllocation.from_result(
+        states, {f"CHG{i}": 90.0 for i in range(4)}, 360
+    )
+
+    # 拔枪释放余量：其余枪恢复到请求功率
+    await service.process_plug_status(PlugStatus(charger_sn="CHG3", status="UNPLUGGED", site_no="SITE1"))
+    assert kafka.published[-1] == {"CHG0": 100.0, "CHG1": 100.0, "CHG2": 100.0}
+
+    # 插枪超限：只下调到上限，不触发全量优化
+    await service.process_plug_status(PlugStatus(charger_sn="CHG9", status="PLUGGED", power=100, site_no="SITE1"))
+    allocation = service.allocations["SITE1"]
+    assert allocation.allocated.sum() <= 360 + 1e-6
+    assert set(kafka.published[-1]) <= set(allocation.chargers.charger_sn)
+    assert service.scheduler.stats()["queue_depth"] == 0
@@ -0,0 +1,122 @@
+import json
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from app.api.endpoints.site import SiteEndpoints
+from app.core.config import settings
+from app.services.site_import import (
+    STATUS_CREATED, STATUS_DUPLICATE, STATUS_FAILED, STATUS_UNCHANGED, STATUS_UPDATED
+)
+
+
+def site_payload(i, demand=500, rated_power=360):
+    return {
+        "site_no": f"SITE{i}",
+        "name": f"{i}号站",
+        "demand": demand,
+        "total_power_limit": 1000,
+        "groups": [{"group_no": 1, "power_limit": 600}],
+        "piles": [{
+            "pile_sn": f"PILE{i}", "group_no": 1, "rated_power": rated_power,
+            "chargers": [{"charger_sn": f"CHG{i}", "max_power": 250}]
+        }]
+    }
+
+
+def make_request(body: bytes, content_type="application/json") -> Request:
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+    return Request({"type": "http", "method": "POST", "headers": [(b"content-type", content_type.encode())]}, receive)
+
+
+class FakeAlgorithm:
+    def __init__(self):
+        self.demands = []
+
+    async def update_site_demand(self, site_no, demand, total_power_limit):
+        self.demands.append((site_no, demand))
+
+
+class FakeMaintenance:
+    def __init__(self):
+        self.notified = []
+
+    async def notify_maintenance(self, site_no, pile_sns):
+        self.notified.append(site_no)
+
+
+@pytest.fixture
+def endpoints(db_service):
+    return SiteEndpoints(db_service, FakeAlgorithm(), FakeMaintenance())
+
+
+@pytest.mark.asyncio
+async def test_json_array_reports_invalid_items(endpoints):
+    body = json.dumps([site_payload(1), {"name": "缺少场站编号"}, site_payload(2)]).encode()
+    response = await endpoints.handle_site_info_bulk(make_request(body))
+    assert (response.total, response.created, response.failed) == (3, 2, 1)
+    assert [r.status for r in response.results] == [STATUS_CREATED, STATUS_FAILED, STATUS_CREATED]
+    assert [r.site_no for r in response.results] == ["SITE1", None, "SITE2"]
+    assert endpoints.maintenance_service.notified == ["SITE1", "SITE2"]
+
+
+@pytest.mark.asyncio
+async def test_ndjson_reports_bad_lines(endpoints):
+    lines = [json.dumps(site_payload(1)), "", "{不是JSON", json.dumps(site_payload(2))]
+    response = await endpoints.handle_site_info_bulk(
+        make_request("\n".join(lines).encode(), "application/x-ndjson")
+    )
+    assert [r.status for r in response.results] == [STATUS_CREATED, STATUS_FAILED, STATUS_CREATED]
+    assert "第3行" in response.results[1].error
+
+
+@pytest.mark.asyncio
+async def test_body_must_be_array(endpoints):
+    for body in (b"{not json", json.dumps(site_payload(1)).encode()):
+        with pytest.raises(HTTPException) as exc:
+            await endpoints.handle_site_info_bulk(make_request(body))
+        assert exc.value.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_reimport_across_chunks(endpoints, monkeypatch):
+    monkeypatch.setattr(settings, "SITE_BULK_CHUNK_SIZE", 2)
+    monkeypatch.setattr(settings, "SITE_BULK_STATEMENT_ROWS", 1)
+    sites = [site_payload(i) for i in range(5)]
+    response = await endpoints.handle_site_info_bulk(make_request(json.dumps(sites).encode()))
+    assert response.created == 5
+
+    # 再次导入：仅需量变化的场站更新需量，拓扑变化的场站为updated，其余不变
+    sites[1] = site_payload(1, demand=800)
+    sites[3] = site_payload(3, rated_power=480)
+    response = await endpoints.handle_site_info_bulk(make_request(json.dumps(sites).encode()))
+    assert [r.status for r in response.results] == [
+        STATUS_UNCHANGED, STATUS_UNCHANGED, STATUS_UNCHANGED, STATUS_UPDATED, STATUS_UNCHANGED
+    ]
+    assert endpoints.algorithm_service.demands == [("SITE1", 800)]
+    assert endpoints.maintenance_service.notified[5:] == ["SITE3"]
+    assert (await endpoints.db_service.get_site_info("SITE1")).demand == 800
+
+
+@pytest.mark.asyncio
+async def test_save_sites_bulk_isolates_failed_site(db_service, monkeypatch):
+    monkeypatch.setattr(settings, "SITE_BULK_CHUNK_SIZE", 3)
+    save_chunk = db_service._save_site_chunk
+
+    async def failing_chunk(chunk):
+        if any(data["site_no"] == "SITE1" for data in chunk):
+            raise RuntimeError("写入失败")
+        return await save_chunk(chunk)
+
+    monkeypatch.setattr(db_service, "_save_site_chunk", failing_chunk)
+    sites = [site_payload(i) for i in range(4)] + [site_payload(2, demand=800)]
+    results = await db_service.save_sites_bulk(sites)
+    assert [r["status"] for r in results] == [
+        STATUS_CREATED, STATUS_FAILED, STATUS_DUPLICATE, STATUS_CREATED, STATUS_CREATED
+    ]
+    assert results[1]["error"] == "写入失败"
+    # 同一请求中重复的场站以最后一条为准
+    assert (await db_service.get_site_info("SITE2")).demand == 800
+    assert await db_service.get_site_info("SITE1") is None
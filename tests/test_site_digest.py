@@ -0,0 +1,109 @@
+import pytest
+from sqlalchemy import update
+
+from app.models.entities import Site
+from app.models.schemas import SiteInfoRequest
+from app.services.site_import import (
+    STATUS_UNCHANGED, STATUS_UPDATED, SiteImportPlan, apply_site_info, payload_digest
+)
+
+PAYLOAD = {
+    "site_no": "SITE1",
+    "name": "一号站",
+    "demand": 500,
+    "total_power_limit": 1000,
+    "groups": [{"group_no": 1, "power_limit": 600}],
+    "piles": [{
+        "pile_sn": "PILE1", "group_no": 1, "rated_power": 360,
+        "chargers": [{"charger_sn": "CHG1", "max_power": 250}]
+    }]
+}
+
+
+def test_digest_is_canonical_across_endpoints():
+    # 原始dict（缺省字段、整数）与SiteInfoRequest.model_dump()得到相同摘要，demand不参与
+    request = SiteInfoRequest.model_validate(PAYLOAD)
+    assert payload_digest(PAYLOAD) == payload_digest(request) == payload_digest(request.model_dump())
+    assert payload_digest(PAYLOAD) == payload_digest({**PAYLOAD, "demand": 800})
+    assert payload_digest(PAYLOAD) != payload_digest({**PAYLOAD, "total_power_limit": 900})
+
+
+def test_demand_only_change_is_not_a_topology_update():
+    existing = Site(
+        site_no="SITE1", name="一号站", demand=500, total_power_limit=1000,
+        payload_hash=payload_digest(PAYLOAD), charger_groups=[]
+    )
+    plan = SiteImportPlan()
+    plan.add_site({**PAYLOAD, "groups": [], "piles": [], "demand": 800}, existing)
+    assert plan.results["SITE1"]["status"] != STATUS_UPDATED
+    assert plan.results["SITE1"]["demand_changed"]
+    assert [row["demand"] for row in plan.sites] == [800]
+
+    plan = SiteImportPlan()
+    plan.add_site({**PAYLOAD, "groups": [], "piles": [], "total_power_limit": 900}, existing)
+    assert plan.results["SITE1"]["status"] == STATUS_UPDATED
+
+
+def test_unchanged_payload_is_unchanged():
+    existing = Site(
+        site_no="SITE1", name="一号站", demand=500, total_power_limit=1000,
+        payload_hash=payload_digest({**PAYLOAD, "groups": [], "piles": []}), charger_groups=[]
+    )
+    plan = SiteImportPlan()
+    plan.add_site({**PAYLOAD, "groups": [], "piles": []}, existing)
+    assert plan.results["SITE1"]["status"] == STATUS_UNCHANGED
+    assert plan.sites == []
+
+
+@pytest.mark.asyncio
+async def test_charger_profile_change_resets_site_digest(db_service):
+    await db_service.save_site_info(PAYLOAD)
+    assert (await db_service.get_site_digest("SITE1"))[0] == payload_digest(PAYLOAD)
+
+    await db_service.save_charger_profile({"charger_sn": "CHG1", "pile_sn": "PILE1", "max_power": 120})
+    assert await db_service.get_site_digest("SITE1") is None
+
+    # 再次上报相同的场站信息时完整写入并恢复摘要
+    await db_service.save_site_info(PAYLOAD)
+    assert (await db_service.get_site_digest("SITE1"))[0] == payload_digest(PAYLOAD)
+
+
+class RecordingAlgorithm:
+    """记录demand触发，并记录触发时数据库中的demand"""
+
+    def __init__(self, db_service):
+        self.db_service = db_service
+        self.triggers = []
+
+    async def update_site_demand(self, site_no, demand, total_power_limit):
+        stored = await self.db_service.get_site_info(site_no)
+        self.triggers.append((demand, stored.demand))
+
+
+@pytest.mark.asyncio
+async def test_site_info_is_saved_before_reallocation(db_service):
+    algorithm = RecordingAlgorithm(db_service)
+    assert await apply_site_info(db_service, algorithm, PAYLOAD) == ("SITE1", True)
+    assert algorithm.triggers == []
+
+    # 拓扑与demand同时变化：先保存再触发，触发时已能读到新的拓扑和demand
+    changed = {**PAYLOAD, "demand": 800, "total_power_limit": 900}
+    assert await apply_site_info(db_service, algorithm, changed) == ("SITE1", True)
+    assert algorithm.triggers == [(800, 800)]
+
+    # 只有demand变化：不写拓扑
+    assert await apply_site_info(db_service, algorithm, {**changed, "demand": 600}) == ("SITE1", False)
+    assert algorithm.triggers[-1] == (600, 600)
+
+
+@pytest.mark.asyncio
+async def test_missing_digest_falls_back_to_stored_demand(db_service):
+    await db_service.save_site_info(PAYLOAD)
+    async with db_service.async_session() as session:
+        async with session.begin():
+            await session.execute(update(Site).values(payload_hash=None))
+    db_service.site_digests.clear()
+
+    algorithm = RecordingAlgorithm(db_service)
+    await apply_site_info(db_service, algorithm, {**PAYLOAD, "demand": 800})
+    assert algorithm.triggers == [(800, 800)]
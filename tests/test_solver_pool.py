@@ -0,0 +1,105 @@
+import asyncio
+import os
+import signal
+import time
+
+import numpy as np
+import pytest
+from pydantic import ValidationError
+
+from app.core.config import Settings
+from app.services.allocation import ChargerArrays, ExactAllocator
+from app.services import solver_pool
+from app.services.solver_pool import SolverPool, pack_chargers, unpack_chargers
+
+
+def make_chargers(count: int = 12) -> ChargerArrays:
+    rng = np.random.default_rng(1)
+    return ChargerArrays(
+        charger_sn=[f"CHG{i:03d}" for i in range(count)],
+        current_power=rng.uniform(40, 240, count),
+        max_power=np.full(count, 250.0),
+        rated_power=np.full(count, 360.0),
+        pile_sn=[f"PILE{i // 2}" for i in range(count)],
+        group_id=[None if i < 4 else i // 4 for i in range(count)],
+        group_power_limit=np.where(np.arange(count) < 4, np.inf, 600.0),
+        unit_power=np.where(np.arange(count) % 3 == 0, 20.0, 0.0)
+    )
+
+
+def test_pack_unpack_round_trip():
+    chargers = make_chargers()
+    restored = unpack_chargers(pack_chargers(chargers))
+    for column in ('current_power', 'min_power', 'max_power', 'rated_power', 'group_power_limit', 'unit_power'):
+        np.testing.assert_array_equal(getattr(restored, column), getattr(chargers, column))
+
+    # 桩/群组编码为整数后，分组关系与原始编号一致
+    def same_partition(codes, values):
+        mapping = {}
+        return all(mapping.setdefault(code, value) == value for code, value in zip(codes, values))
+
+    assert same_partition(restored.pile_sn, chargers.pile_sn)
+    assert same_partition(restored.group_id, chargers.group_id)
+    assert [code is None for code in restored.group_id] == [value is None for value in chargers.group_id]
+    assert restored.charger_sn == [None] * len(chargers)
+
+
+def test_timeout_below_time_budget_rejected():
+    with pytest.raises(ValidationError):
+        Settings(OPTIMIZATION_EXECUTOR="process", SOLVER_POOL_TIMEOUT=1.0, OPTIMIZATION_TIME_BUDGET=2.0)
+    # 未使用进程池时不校验
+    Settings(OPTIMIZATION_EXECUTOR="inline", SOLVER_POOL_TIMEOUT=1.0, OPTIMIZATION_TIME_BUDGET=2.0)
+
+
+def slow_solve(*args):
+    time.sleep(1.0)
+    return None
+
+
+@pytest.mark.asyncio
+async def test_started_solve_counts_in_flight_until_finished(monkeypatch):
+    monkeypatch.setattr(solver_pool, "solve_exact", slow_solve)
+    chargers = make_chargers()
+    solver = ExactAllocator(time_limit=5, max_decrease=0.3, min_impact=0.1)
+    pool = SolverPool(1, 1, 0.3, "fork")
+    await pool.start()
+    try:
+        assert await pool.allocate_exact(chargers, 1000.0, solver) is None
+        assert pool.timeouts == 1
+        # 超时放弃等待后求解仍在子进程中运行，继续占用进程池
+        await asyncio.sleep(0.1)
+        assert pool.in_flight == 1
+        assert await pool.allocate_exact(chargers, 1000.0, solver) is None
+        assert pool.saturated == 1
+        for _ in range(50):
+            if pool.in_flight == 0:
+                break
+            await asyncio.sleep(0.1)
+        assert pool.in_flight == 0
+    finally:
+        await pool.stop()
+
+
+@pytest.mark.asyncio
+async def test_broken_pool_is_restarted():
+    chargers = make_chargers()
+    limit = chargers.current_power.sum() * 0.9
+    solver = ExactAllocator(time_limit=5, max_decrease=0.3, min_impact=0.1)
+    pool = SolverPool(1, 2, 30, "fork")
+    await pool.start()
+    try:
+        assert await pool.allocate_exact(chargers, limit, solver) is not None
+
+        # 求解进程异常退出：本次回退（返回None）并重建进程池
+        broken = pool._executor
+        for process in list(broken._processes.values()):
+            os.kill(process.pid, signal.SIGKILL)
+        assert await pool.allocate_exact(chargers, limit, solver) is None
+        assert pool.errors == 1
+        assert pool._executor is not broken
+
+        powers = await pool.allocate_exact(chargers, limit, solver)
+        assert powers is not None and powers.sum() <= limit + 1e-6
+        assert pool.in_flight == 0
+    finally:
+        await pool.stop()
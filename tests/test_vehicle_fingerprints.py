@@ -0,0 +1,23 @@
+import pytest
+
+from app.models.entities import EVModel
+from app.services.vehicle_library import MODEL_SOURCE_CONFIRMED, MODEL_SOURCE_INFERRED
+
+
+@pytest.mark.asyncio
+async def test_fingerprints_exclude_inferred_labels(db_service):
+    async with db_service.async_session() as session:
+        session.add_all([
+            EVModel(session_id="S1", mac_addr="M1", vendor_model_capacity="BYD_60", max_voltage=400,
+                    max_current=150, max_power=60, capacity=60),
+            EVModel(session_id="S2", mac_addr="M2", vendor_model_capacity="TESLA_75", max_voltage=400,
+                    max_current=250, max_power=100, capacity=75, model_source=MODEL_SOURCE_CONFIRMED),
+            EVModel(session_id="S3", mac_addr="M3", vendor_model_capacity="BYD_60", max_voltage=410,
+                    max_current=150, max_power=61, capacity=60, model_source=MODEL_SOURCE_INFERRED),
+            EVModel(session_id="S4", mac_addr="M4", max_voltage=400, max_current=150, max_power=60, capacity=60),
+        ])
+        await session.commit()
+
+    rows = await db_service.get_vehicle_fingerprints(100)
+    assert sorted(row[0] for row in rows) == ["BYD_60", "TESLA_75"]
+    assert all(row[1] != 410 for row in rows)